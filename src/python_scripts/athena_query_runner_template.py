@@ -1,11 +1,10 @@
 
-import boto3
 import time
 import json
 import os
 
-# --- AWS Client Initialization (Conceptual - credentials managed by Lambda execution role) ---
-# athena_client = boto3.client('athena')
+# --- AWS Client Initialization (shared per container, see aws_clients.py) ---
+# from aws_clients import get_client # Needed by the commented-out get_client(...) calls below
 
 # --- Configuration ---
 # These should be configured, e.g., via Lambda environment variables
@@ -17,7 +16,7 @@ def execute_athena_query(query_string, database=ATHENA_DATABASE, s3_output=S3_OU
     Starts an Athena query execution and returns the execution ID.
     """
     print(f"Starting Athena query in database '{database}':\n{query_string[:200]}...") # Log truncated query
-    # response = athena_client.start_query_execution(
+    # response = get_client('athena').start_query_execution(
     #     QueryString=query_string,
     #     QueryExecutionContext={'Database': database},
     #     ResultConfiguration={'OutputLocation': s3_output}
@@ -38,7 +37,7 @@ def poll_query_status(query_execution_id, poll_interval_seconds=1, timeout_secon
     """
     elapsed_time = 0
     while elapsed_time < timeout_seconds:
-        # query_status_response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
+        # query_status_response = get_client('athena').get_query_execution(QueryExecutionId=query_execution_id)
         # status = query_status_response['QueryExecution']['Status']['State']
         # reason = query_status_response['QueryExecution']['Status'].get('StateChangeReason', '')
         
@@ -72,7 +71,7 @@ def get_query_results(query_execution_id):
     Handles pagination.
     """
     print(f"Fetching results for Athena query ID: {query_execution_id}")
-    # results_paginator = athena_client.get_paginator('get_query_results')
+    # results_paginator = get_client('athena').get_paginator('get_query_results')
     # results_iter = results_paginator.paginate(
     #     QueryExecutionId=query_execution_id,
     #     PaginationConfig={'PageSize': 1000} # Adjust as needed
@@ -195,5 +194,3 @@ if __name__ == "__main__":
         print(result['body'])
     except TypeError: # If body is not a string (e.g. already a dict if local test doesn't stringify)
         print(json.dumps(result['body'], indent=2))
-
-```
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import threading
+
+# Shared AWS client factory for all python_scripts modules.
+# boto3 clients are expensive to create (credential resolution, endpoint and TLS setup), and each
+# one owns its own connection pool. Creating them ad hoc per call site means paying that setup
+# repeatedly. Here clients and resources are cached per (service, region) for the lifetime of the
+# container, with a larger connection pool, TCP keep-alive and adaptive retries.
+#
+# For offline use (IDE simulation, tests) local stand-ins can be returned instead of real clients.
+# They are opt-in, so a deployed Lambda always talks to AWS: the __main__ demos call
+# use_local_stand_ins(), or set HVAC_IDE_USE_LOCAL_STAND_INS=true.
+
+USE_LOCAL_STAND_INS = os.environ.get('HVAC_IDE_USE_LOCAL_STAND_INS', 'false').lower() == 'true'
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_CLIENT_MAX_POOL_CONNECTIONS', '50')) # botocore default is 10
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 30
+RETRY_MAX_ATTEMPTS = 10
+
+_clients = {}     # (kind, service_name, region_name) -> client or resource
+_overrides = {}   # (kind, service_name, region_name or None) -> injected client or resource
+_lock = threading.Lock()
+
+
+def _default_region():
+    return os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+
+
+def _client_config():
+    """Connection pooling, keep-alive and adaptive retry settings shared by all clients."""
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+        read_timeout=READ_TIMEOUT_SECONDS,
+        retries={'mode': 'adaptive', 'max_attempts': RETRY_MAX_ATTEMPTS},
+    )
+
+
+def _local_stand_in(kind, service_name):
+    """Builds the offline stand-in for a service (imported lazily to keep this module light)."""
+    if kind == 'client' and service_name == 'logs':
+        from cloudwatch_log_search import LocalLogsClientStandIn
+        return LocalLogsClientStandIn()
+    if kind == 'client' and service_name == 'sns':
+        from sns_alert_dispatcher import LocalSnsTopicStandIn
+        return LocalSnsTopicStandIn()
+    if kind == 'resource' and service_name == 'dynamodb':
+        from dynamodb_bulk_writer import LocalDynamoDBTableStandIn
+        return LocalDynamoDBTableStandIn()
+    return None
+
+
+def _get(kind, service_name, region_name):
+    region_name = region_name or _default_region()
+    override = _overrides.get((kind, service_name, region_name))
+    if override is None:
+        override = _overrides.get((kind, service_name, None))
+    if override is not None:
+        return override
+
+    key = (kind, service_name, region_name)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+    with _lock:
+        cached = _clients.get(key)
+        if cached is None:
+            cached = _local_stand_in(kind, service_name) if USE_LOCAL_STAND_INS else None
+            if cached is None:
+                import boto3
+                factory = boto3.client if kind == 'client' else boto3.resource
+                cached = factory(service_name, region_name=region_name, config=_client_config())
+            _clients[key] = cached
+    return cached
+
+
+def get_client(service_name, region_name=None):
+    """
+    Returns the container-wide client for a service and region, creating it on first use.
+
+    :param service_name: boto3 service name, e.g. 's3', 'logs', 'sns', 'athena', 'cloudwatch'.
+    :param region_name: Optional region; defaults to AWS_REGION / AWS_DEFAULT_REGION.
+    """
+    return _get('client', service_name, region_name)
+
+
+def get_resource(service_name, region_name=None):
+    """Returns the container-wide boto3 resource (e.g. 'dynamodb'), creating it on first use."""
+    return _get('resource', service_name, region_name)
+
+
+def set_client(service_name, client, region_name=None, kind='client'):
+    """
+    Injects a client (or resource, with kind='resource') for a service, e.g. a local stand-in in
+    tests. Without a region, the override applies to all regions.
+    """
+    _overrides[(kind, service_name, region_name)] = client
+
+
+def use_local_stand_ins(enabled=True):
+    """Switches get_client/get_resource to the offline stand-ins (or back), dropping cached clients."""
+    global USE_LOCAL_STAND_INS
+    with _lock:
+        USE_LOCAL_STAND_INS = enabled
+        _clients.clear()
+
+
+def using_local_stand_ins():
+    """Whether offline stand-ins are in use (read at call time, so use_local_stand_ins() takes effect)."""
+    return USE_LOCAL_STAND_INS
+
+
+def reset_clients():
+    """Drops all cached clients and injected overrides (e.g. between tests)."""
+    with _lock:
+        _clients.clear()
+        _overrides.clear()
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Shared AWS Client Factory ---")
+    use_local_stand_ins()
+    print(f"Using local stand-ins: {USE_LOCAL_STAND_INS}")
+    logs_client = get_client('logs')
+    print(f"logs client: {type(logs_client).__name__}, reused: {get_client('logs') is logs_client}")
+    print(f"dynamodb resource: {type(get_resource('dynamodb')).__name__}")
+
+    class RecordingSns:
+        def __init__(self):
+            self.published = []
+        def publish(self, **kwargs):
+            self.published.append(kwargs)
+            return {'MessageId': 'test-1'}
+
+    set_client('sns', RecordingSns())
+    print(f"Injected sns client: {type(get_client('sns')).__name__}")
+    reset_clients()
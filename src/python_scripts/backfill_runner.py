@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from s3_data_processor_template import load_data_from_s3, preprocess_timeseries_data
+
+# Local backfill runner for the preprocessing pipeline. Re-processing a year of raw files through
+# lambda_handler means one serial invocation per key. Here the work is sharded across a
+# ProcessPoolExecutor (pandas preprocessing is CPU-bound and holds the GIL, so threads don't help):
+#   - run_key_backfill: each worker loads, preprocesses and writes its own keys. Only key names go
+#     to the workers and only small stats come back.
+#   - run_sensor_backfill: the parent loads one large frame (e.g. a history export), sorts it by
+#     sensor once and publishes its columns in shared memory. Workers attach to the buffers and
+#     slice out their sensor groups (a contiguous row range each), so no DataFrame is pickled
+#     between processes. Each sensor's full history lands in one worker, so the streaming outlier
+#     detector sees it in order.
+# Workers write Hive-style date partitions (dt=YYYY-MM-DD) directly and return a per-shard report.
+
+DEFAULT_BACKFILL_OUTPUT_DIR = os.environ.get('BACKFILL_OUTPUT_DIR', os.path.join('backfill_output', 'processed'))
+DEFAULT_SENSORS_PER_SHARD = 16
+
+
+def write_partitions(df, output_dir, shard_name, partition_column='timestamp'):
+    """Writes a processed frame as Parquet, one file per date partition. Returns the written paths."""
+    if df.empty:
+        return []
+    paths = []
+    dates = pd.to_datetime(df[partition_column], utc=True).dt.strftime('%Y-%m-%d')
+    for partition_date, partition_df in df.groupby(dates, sort=True):
+        partition_dir = os.path.join(output_dir, f"dt={partition_date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"{shard_name}.parquet")
+        partition_df.to_parquet(path, index=False)
+        # In AWS, upload instead: aws_clients.get_client('s3').upload_file(path, S3_PROCESSED_BUCKET, f"processed/dt={partition_date}/{shard_name}.parquet")
+        paths.append(path)
+    return paths
+
+
+def _process_keys(keys, bucket, output_dir, shard_name, loader):
+    """Worker: loads, preprocesses and writes one shard of raw keys."""
+    start, cpu_start = time.perf_counter(), time.process_time()
+    frames = [loader(bucket, key) for key in keys]
+    frames = [frame for frame in frames if not frame.empty]
+    rows_in = sum(len(frame) for frame in frames)
+    processed = preprocess_timeseries_data(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
+    paths = write_partitions(processed, output_dir, shard_name)
+    return {"shard": shard_name, "pid": os.getpid(), "rows_in": rows_in, "rows_out": len(processed),
+            "files": len(paths), "seconds": time.perf_counter() - start, "cpu_seconds": time.process_time() - cpu_start}
+
+
+# --- Shared-memory column transport (run_sensor_backfill) ---
+
+def _attach(name):
+    """
+    Attaches to a segment created by the parent. Pool workers share the parent's resource tracker,
+    so the segment stays owned (and is unlinked) by the parent.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def share_columns(df):
+    """
+    Copies each column of `df` into its own shared-memory segment, once.
+    Strings are dictionary-encoded (int32 codes + labels), datetimes are stored as int64 ns.
+
+    :return: (segments, layout) - keep `segments` alive and unlink them when done; `layout`
+             is a small picklable description the workers use to attach.
+    """
+    segments, layout = [], []
+    for column in df.columns:
+        series = df[column]
+        labels, tz = None, None
+        if pd.api.types.is_datetime64_any_dtype(series):
+            tz = str(series.dt.tz) if series.dt.tz is not None else None
+            array = pd.DatetimeIndex(series).as_unit('ns').asi8
+            kind = 'datetime'
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            array = series.to_numpy()
+            kind = 'numeric'
+        else:
+            codes, uniques = pd.factorize(series)
+            array, labels, kind = codes.astype(np.int32), list(uniques), 'category'
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+        segments.append(segment)
+        layout.append({"column": column, "name": segment.name, "dtype": array.dtype.str, "length": len(array),
+                       "kind": kind, "labels": labels, "tz": tz})
+    return segments, layout
+
+
+def _frame_from_shared(layout, start, stop):
+    """Worker: builds a DataFrame for rows [start, stop) from shared-memory columns."""
+    columns, segments = {}, []
+    try:
+        for spec in layout:
+            segment = _attach(spec["name"])
+            segments.append(segment)
+            view = np.ndarray((spec["length"],), dtype=np.dtype(spec["dtype"]), buffer=segment.buf)[start:stop]
+            if spec["kind"] == 'datetime':
+                values = pd.to_datetime(view.copy(), unit='ns', utc=spec["tz"] is not None)
+                columns[spec["column"]] = values.tz_convert(spec["tz"]) if spec["tz"] else values
+            elif spec["kind"] == 'category':
+                columns[spec["column"]] = pd.Categorical.from_codes(view.copy(), categories=spec["labels"]).astype(object)
+            else:
+                columns[spec["column"]] = view.copy() # Copies only this shard's slice, out of the segment
+        return pd.DataFrame(columns)
+    finally:
+        for segment in segments:
+            segment.close()
+
+
+def _process_sensor_range(layout, start, stop, output_dir, shard_name):
+    """Worker: preprocesses one contiguous sensor range of the shared frame and writes it."""
+    from streaming_outlier_detector import StreamingOutlierDetector
+
+    begin, cpu_start = time.perf_counter(), time.process_time()
+    df = _frame_from_shared(layout, start, stop)
+    # The shard holds each of its sensors' complete history, so it can be filtered in time order
+    processed = preprocess_timeseries_data(df, outlier_detector=StreamingOutlierDetector())
+    paths = write_partitions(processed, output_dir, shard_name)
+    return {"shard": shard_name, "pid": os.getpid(), "rows_in": stop - start, "rows_out": len(processed),
+            "files": len(paths), "seconds": time.perf_counter() - begin, "cpu_seconds": time.process_time() - cpu_start}
+
+
+def _sensor_ranges(sensor_ids, sensors_per_shard):
+    """Row ranges [start, stop) of consecutive groups of sensors in a sensor-sorted column."""
+    codes = pd.factorize(sensor_ids)[0]
+    boundaries = np.r_[np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]), len(codes)]
+    group_starts = boundaries[:-1:sensors_per_shard]
+    return list(zip(group_starts.tolist(), np.r_[group_starts[1:], len(codes)].tolist()))
+
+
+def _report(mode, shard_reports, seconds, workers):
+    rows_in = sum(r["rows_in"] for r in shard_reports)
+    rows_out = sum(r["rows_out"] for r in shard_reports)
+    busy = sum(r["cpu_seconds"] for r in shard_reports) # CPU time, so oversubscribed cores don't count as busy
+    report = {
+        "mode": mode,
+        "workers": workers,
+        "shards": len(shard_reports),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "files_written": sum(r["files"] for r in shard_reports),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_in / seconds, 1) if seconds > 0 else None,
+        "parallel_efficiency": round(busy / (seconds * workers), 2) if seconds > 0 else None,
+        "shard_reports": shard_reports,
+    }
+    print(f"Backfill ({mode}): {rows_in:,} rows in -> {rows_out:,} rows out, {report['files_written']} files, "
+          f"{report['seconds']}s, {report['rows_per_second']:,} rows/s with {workers} workers "
+          f"(efficiency {report['parallel_efficiency']})")
+    return report
+
+
+def run_key_backfill(bucket, keys, output_dir=DEFAULT_BACKFILL_OUTPUT_DIR, max_workers=None, keys_per_shard=8,
+                     loader=load_data_from_s3):
+    """
+    Backfills raw keys in parallel, `keys_per_shard` keys per task.
+
+    :param loader: Picklable function (bucket, key) -> raw DataFrame; defaults to load_data_from_s3.
+    :return: Throughput report dict (see _report).
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    shards = [keys[i:i + keys_per_shard] for i in range(0, len(keys), keys_per_shard)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_process_keys, shard, bucket, output_dir, f"keys-{i:05d}", loader)
+                   for i, shard in enumerate(shards)]
+        shard_reports = [future.result() for future in futures]
+    return _report('keys', shard_reports, time.perf_counter() - start, max_workers)
+
+
+def run_sensor_backfill(df, output_dir=DEFAULT_BACKFILL_OUTPUT_DIR, max_workers=None,
+                        sensors_per_shard=DEFAULT_SENSORS_PER_SHARD, sensor_column='sensor_id'):
+    """
+    Backfills one large frame, sharded by sensor groups over shared memory.
+
+    :return: Throughput report dict (see _report).
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    df = df.sort_values(sensor_column, kind='stable', ignore_index=True)
+    ranges = _sensor_ranges(df[sensor_column].to_numpy(), sensors_per_shard)
+    segments, layout = share_columns(df)
+    del df # The parent no longer needs its own copy; workers read the segments
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_process_sensor_range, layout, lo, hi, output_dir, f"sensors-{i:05d}")
+                       for i, (lo, hi) in enumerate(ranges)]
+            shard_reports = [future.result() for future in futures]
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+    return _report('sensors', shard_reports, time.perf_counter() - start, max_workers)
+
+
+def synthetic_raw_file(bucket, key, rows=20000, sensors=20):
+    """Deterministic synthetic raw file (a minute of readings per row block) for benchmarks."""
+    rng = np.random.default_rng(zlib.crc32(key.encode())) # Not hash(): str hashes change with PYTHONHASHSEED
+    per_sensor = rows // sensors
+    day = int(key.split('day=')[-1].split('/')[0]) if 'day=' in key else 0
+    start = pd.Timestamp('2023-01-01', tz='UTC') + pd.Timedelta(days=day)
+    values = 22.0 + rng.normal(0, 0.5, per_sensor * sensors)
+    values[rng.random(len(values)) < 0.01] = np.nan
+    return pd.DataFrame({
+        'timestamp': np.tile(pd.date_range(start, periods=per_sensor, freq='min'), sensors),
+        'sensor_id': np.repeat([f"{key.rsplit('/', 1)[-1].split('.')[0]}_{i:03d}" for i in range(sensors)], per_sensor),
+        'value': values,
+        'unit': 'C',
+        'zone': 'A',
+    })
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else (os.cpu_count() or 1)
+    n_keys = 64
+    print(f"--- Parallel Backfill Simulation ({workers} workers, {os.cpu_count()} CPUs) ---")
+    keys = [f"raw/day={i % 32:02d}/building_{i:03d}.json" for i in range(n_keys)]
+    loader = partial(synthetic_raw_file, rows=20000, sensors=20)
+    output_root = tempfile.mkdtemp(prefix='hvac-backfill-')
+    try:
+        serial = run_key_backfill('mock-hvac-data-bucket', keys, os.path.join(output_root, 'serial'),
+                                  max_workers=1, loader=loader)
+        parallel = run_key_backfill('mock-hvac-data-bucket', keys, os.path.join(output_root, 'keys'),
+                                    max_workers=workers, loader=loader)
+        print(f"Key sharding speedup with {workers} workers: {serial['seconds'] / parallel['seconds']:.2f}x")
+
+        history = pd.concat([loader('mock-hvac-data-bucket', key) for key in keys[:16]], ignore_index=True)
+        run_sensor_backfill(history, os.path.join(output_root, 'sensors'), max_workers=workers)
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
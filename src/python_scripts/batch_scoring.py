@@ -0,0 +1,430 @@
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import compute_features, max_lookback, source_columns
+from local_trainer import load_local_model
+
+# Offline batch transform: energy predictions for every zone of every site from the processed
+# Parquet history (Hive-style dt=YYYY-MM-DD partitions, as written by backfill_runner), instead
+# of one predict_hvac_control_sagemaker_endpoint call per sequence.
+# The job works one output date partition at a time. It reads that day plus enough preceding days
+# to fill the model's input window (sequence_length + feature lookback). All zones of the slice
+# are laid out as one array, sorted by zone and time on a regular grid. Missing readings are
+# interpolated within each zone. Features are computed over the whole array at once; the first
+# `lookback` rows of each zone are masked, so lags and rolling windows never mix zones. Windows are
+# a strided view and are scored in large batches (one matrix product per layer per batch) with a
+# model written by local_trainer.
+# Each finished partition is written atomically and then marked done under _checkpoints/. A re-run
+# (e.g. after an interruption) skips every partition already done with the same model. A partition
+# whose context days are not all in the history yet is written but not marked done, so it is scored
+# again once the history is backfilled.
+# Scoring history partitions gives backcasts. run_next_day_forecast scores the day after the history
+# instead: it builds that day's grid for every zone from a separate forecast input (weather
+# forecast, occupancy schedule; same dt= layout) and validates that each zone has every step and
+# every model input before scoring.
+
+DEFAULT_SCORING_OUTPUT_DIR = os.environ.get('SCORING_OUTPUT_DIR', os.path.join('scoring_output', 'predictions'))
+DEFAULT_FORECAST_OUTPUT_DIR = os.environ.get('FORECAST_OUTPUT_DIR', os.path.join('scoring_output', 'forecasts'))
+DEFAULT_SCORING_BATCH_SIZE = 65536
+DEFAULT_ZONE_COLUMNS = ('site_id', 'zone_id')
+
+_worker_model = None # (model_artifacts, LocalHvacModel) in each process
+
+
+def _model(model_artifacts):
+    global _worker_model
+    if _worker_model is None or _worker_model[0] != model_artifacts:
+        _worker_model = (model_artifacts, load_local_model(model_artifacts))
+    return _worker_model[1]
+
+
+def list_partitions(history_dir):
+    """Dates of the dt=YYYY-MM-DD partitions under history_dir, sorted."""
+    return sorted(os.path.basename(path)[3:] for path in glob.glob(os.path.join(history_dir, 'dt=*')) if os.path.isdir(path))
+
+
+def read_partitions(history_dir, dates, columns=None):
+    """All Parquet files of the given date partitions as one frame (empty if none exist)."""
+    files = [path for date in dates for path in sorted(glob.glob(os.path.join(history_dir, f"dt={date}", '*.parquet')))]
+    if not files:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(path, columns=columns) for path in files], ignore_index=True)
+
+
+def wide_readings(readings, signals, zone_columns=DEFAULT_ZONE_COLUMNS, freq='1h', signal_column='signal',
+                  value_column='value_interpolated'):
+    """
+    One row per zone and `freq` step (UTC-naive timestamps) with one column per signal.
+    Accepts wide readings (signals as columns) or long readings (`signal_column` + `value_column`).
+    """
+    zone_columns = list(zone_columns)
+    readings = readings.assign(timestamp=pd.to_datetime(readings['timestamp'], utc=True).dt.tz_convert(None).dt.floor(freq))
+    if not set(signals) <= set(readings.columns):
+        readings = readings[readings[signal_column].isin(signals)]
+        readings = readings.pivot_table(index=zone_columns + ['timestamp'], columns=signal_column, values=value_column,
+                                        aggfunc='mean', observed=True).reset_index()
+    wide = readings.reindex(columns=zone_columns + ['timestamp'] + list(signals))
+    return wide.groupby(zone_columns + ['timestamp'], sort=False, observed=True)[list(signals)].mean().reset_index()
+
+
+def zone_grid(readings, signals, zone_columns=DEFAULT_ZONE_COLUMNS, freq='1h', signal_column='signal',
+              value_column='value_interpolated'):
+    """
+    Wide frame (zone columns, timestamp, one column per signal) sorted by zone and time, with every
+    zone on a complete `freq` grid from its first to its last reading (missing steps are NaN).
+    Accepts wide or long readings, as wide_readings.
+    """
+    zone_columns = list(zone_columns)
+    wide = wide_readings(readings, signals, zone_columns, freq, signal_column, value_column)
+
+    # Complete grid per zone, built with array arithmetic (no per-zone loop)
+    zone_codes, zone_keys = pd.factorize(pd.MultiIndex.from_frame(wide[zone_columns]), sort=True)
+    times = wide['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    step = pd.Timedelta(freq).value
+    starts = np.full(len(zone_keys), np.iinfo(np.int64).max)
+    ends = np.full(len(zone_keys), np.iinfo(np.int64).min)
+    np.minimum.at(starts, zone_codes, times)
+    np.maximum.at(ends, zone_codes, times)
+    counts = (ends - starts) // step + 1
+    grid_codes = np.repeat(np.arange(len(zone_keys)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid_times = np.repeat(starts, counts) + offsets * step
+    rows = np.full(len(grid_codes), -1)
+    grid_position = (np.cumsum(counts) - counts)[zone_codes] + (times - starts[zone_codes]) // step
+    rows[grid_position] = np.arange(len(wide))
+    grid = pd.DataFrame({name: zone_keys.get_level_values(i)[grid_codes] for i, name in enumerate(zone_columns)})
+    grid['timestamp'] = grid_times.astype('datetime64[ns]')
+    present = rows >= 0
+    for signal in signals:
+        values = np.full(len(grid), np.nan)
+        values[present] = wide[signal].to_numpy(dtype=float)[rows[present]]
+        grid[signal] = values
+    grid['_zone'] = grid_codes
+    grid['_position'] = offsets
+    return grid
+
+
+def _fill_within_zones(values, zone_codes):
+    """Linear interpolation inside each zone's valid range, then edge fill within the zone (as build_sequences)."""
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return values
+    positions = np.arange(len(values))
+    filled = np.interp(positions, positions[valid], values[valid])
+    first = pd.Series(positions[valid]).groupby(zone_codes[valid]).min()
+    last = pd.Series(positions[valid]).groupby(zone_codes[valid]).max()
+    first = first.reindex(range(zone_codes.max() + 1)).to_numpy()
+    last = last.reindex(range(zone_codes.max() + 1)).to_numpy()
+    inside = (positions >= first[zone_codes]) & (positions <= last[zone_codes]) # NaN bounds (no data) compare False
+    filled[~inside] = np.nan
+    return pd.Series(filled).groupby(zone_codes).bfill().groupby(zone_codes).ffill().to_numpy()
+
+
+def score_grid(model, grid, batch_size=DEFAULT_SCORING_BATCH_SIZE, score_mask=None):
+    """
+    Predictions for every grid row whose input window is complete.
+
+    :param grid: zone_grid output with the model's input signals.
+    :param score_mask: Optional boolean array; only these rows are scored (e.g. one date partition).
+    :return: (row indices into grid, predictions in target units).
+    """
+    metadata = model.metadata
+    L, spec = model.sequence_length, metadata["feature_spec"] or []
+    zone_codes = grid['_zone'].to_numpy()
+    signals = sorted(set(metadata["base_features"]) | set(source_columns(spec)))
+    columns = {signal: _fill_within_zones(grid[signal].to_numpy(dtype=float), zone_codes) for signal in signals}
+
+    # Inputs in the scaler's column order: base features, then the spec's engineered features
+    feature_names = model.scalers[0]["features"]
+    matrix = np.empty((len(grid), len(feature_names)))
+    position = {name: i for i, name in enumerate(feature_names)}
+    for name in metadata["base_features"]:
+        matrix[:, position[name]] = columns[name]
+    if spec:
+        names, engineered = compute_features(grid['timestamp'].to_numpy(), columns, spec)
+        for i, name in enumerate(names):
+            matrix[:, position[name]] = engineered[:, i]
+    matrix = matrix * np.asarray(model.scalers[0]["scale_"]) + np.asarray(model.scalers[0]["min_"])
+
+    # Row r is scored from rows r-L..r-1 of its zone: all must be past the lookback and complete
+    lookback = max_lookback(spec) if spec else 0
+    incomplete = np.concatenate(([0], np.cumsum(np.isnan(matrix).any(axis=1))))
+    candidates = np.flatnonzero(grid['_position'].to_numpy() >= L + lookback)
+    candidates = candidates[incomplete[candidates] - incomplete[candidates - L] == 0]
+    if score_mask is not None:
+        candidates = candidates[score_mask[candidates]]
+    windows = np.lib.stride_tricks.sliding_window_view(matrix.astype(np.float32), L, axis=0).transpose(0, 2, 1)
+    predictions = np.empty(len(candidates))
+    for start in range(0, len(candidates), batch_size):
+        rows = candidates[start:start + batch_size]
+        predictions[start:start + batch_size] = model.predict_kwh(windows[rows - L])
+    return candidates, predictions
+
+
+def _input_signals(model):
+    """Columns the model reads: its base features and the feature spec's source columns."""
+    return sorted(set(model.metadata["base_features"]) | set(source_columns(model.metadata["feature_spec"] or [])))
+
+
+def _score_date(model, readings, date, zone_columns, freq, batch_size):
+    """Predictions for the grid rows dated `date`: zone columns, timestamp, predicted_<target>, model."""
+    grid = zone_grid(readings, _input_signals(model), zone_columns, freq)
+    in_partition = grid['timestamp'].dt.strftime('%Y-%m-%d').to_numpy() == date
+    rows, predictions = score_grid(model, grid, batch_size, score_mask=in_partition)
+    output = grid.iloc[rows][list(zone_columns) + ['timestamp']].reset_index(drop=True)
+    output[f"predicted_{model.metadata['target']}"] = predictions
+    output['model'] = model.metadata["training_job_name"]
+    return output
+
+
+def _write_predictions(output_dir, date, output):
+    partition_dir = os.path.join(output_dir, f"dt={date}")
+    os.makedirs(partition_dir, exist_ok=True)
+    path = os.path.join(partition_dir, 'predictions.parquet')
+    output.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path) # In AWS, upload instead: aws_clients.get_client('s3').upload_file(path, bucket, f"predictions/dt={date}/predictions.parquet")
+    return path
+
+
+def _score_partition(history_dir, date, context_dates, complete, model_artifacts, output_dir, zone_columns, freq, batch_size):
+    """
+    Scores one date partition (reading its context days too) and writes it. It is marked done only
+    if all of its context days were available (`complete`).
+    """
+    start, cpu_start = time.perf_counter(), time.process_time()
+    model = _model(model_artifacts)
+    readings = read_partitions(history_dir, context_dates + [date])
+    report = {"date": date, "pid": os.getpid(), "rows_in": len(readings), "predictions": 0, "path": None, "complete": complete}
+    if not readings.empty:
+        output = _score_date(model, readings, date, zone_columns, freq, batch_size)
+        report.update(predictions=len(output), path=_write_predictions(output_dir, date, output))
+    report.update(seconds=time.perf_counter() - start, cpu_seconds=time.process_time() - cpu_start)
+    if complete:
+        _mark_done(output_dir, date, model_artifacts, report)
+    return report
+
+
+def _checkpoint_path(output_dir, date):
+    return os.path.join(output_dir, '_checkpoints', f"dt={date}.json")
+
+
+def _mark_done(output_dir, date, model_artifacts, report):
+    path = _checkpoint_path(output_dir, date)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(dict(report, model_artifacts=model_artifacts), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _is_done(output_dir, date, model_artifacts):
+    try:
+        with open(_checkpoint_path(output_dir, date)) as f:
+            return json.load(f).get("model_artifacts") == model_artifacts
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def _context_days(model, freq):
+    """Whole days of history before a date that its first rows' input windows reach into."""
+    spec = model.metadata["feature_spec"] or []
+    history_steps = model.sequence_length + (max_lookback(spec) if spec else 0)
+    return int(np.ceil(history_steps * pd.Timedelta(freq) / pd.Timedelta(days=1)))
+
+
+def _context_dates(date, available, context_days):
+    day = pd.Timestamp(date)
+    wanted = {(day - pd.Timedelta(days=k)).strftime('%Y-%m-%d') for k in range(1, context_days + 1)}
+    return [d for d in available if d in wanted]
+
+
+def run_batch_scoring(history_dir, model_artifacts, output_dir=DEFAULT_SCORING_OUTPUT_DIR, dates=None, max_workers=1,
+                      batch_size=DEFAULT_SCORING_BATCH_SIZE, zone_columns=DEFAULT_ZONE_COLUMNS, freq='1h'):
+    """
+    Scores every zone for each date partition of the history, resuming after interruptions.
+
+    :param history_dir: Processed history root with dt=YYYY-MM-DD partitions (wide or long readings).
+    :param model_artifacts: model.tar.gz from local_trainer.train_hvac_model_local.
+    :param dates: Output partitions to produce (default: every history partition).
+    :param max_workers: Processes scoring partitions in parallel (1: in-process; each worker's BLAS
+                        is multi-threaded already).
+    :return: Report dict with per-partition reports, skipped (already done) dates, dates scored
+             without their full context (not checkpointed) and throughput.
+    """
+    context_days = _context_days(_model(model_artifacts), freq)
+    available = list_partitions(history_dir)
+    dates = available if dates is None else list(dates)
+    skipped = [date for date in dates if _is_done(output_dir, date, model_artifacts)]
+    pending = [date for date in dates if date not in set(skipped)]
+
+    start = time.perf_counter()
+    args = []
+    for date in pending:
+        context_dates = _context_dates(date, available, context_days)
+        args.append((history_dir, date, context_dates, len(context_dates) == context_days, model_artifacts, output_dir,
+                     tuple(zone_columns), freq, batch_size))
+    if max_workers == 1:
+        reports = [_score_partition(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            reports = [future.result() for future in [executor.submit(_score_partition, *arg) for arg in args]]
+    seconds = time.perf_counter() - start
+    predictions = sum(report["predictions"] for report in reports)
+    report = {
+        "partitions_scored": len(reports),
+        "partitions_skipped": skipped,
+        "partitions_incomplete": [report["date"] for report in reports if not report["complete"]],
+        "predictions": predictions,
+        "seconds": round(seconds, 3),
+        "predictions_per_second": round(predictions / seconds, 1) if seconds > 0 else None,
+        "partition_reports": reports,
+    }
+    print(f"Batch scoring: {len(reports)} partitions scored ({len(skipped)} already done, "
+          f"{len(report['partitions_incomplete'])} without full context and not checkpointed), {predictions:,} predictions "
+          f"in {report['seconds']}s ({report['predictions_per_second']:,} predictions/s)")
+    return report
+
+
+def validate_forecast_inputs(forecast, history, date, signals, zone_columns=DEFAULT_ZONE_COLUMNS, freq='1h'):
+    """
+    Raises ValueError unless every zone of the history has every `freq` step of `date` in the
+    forecast inputs with all `signals` present (both frames as returned by wide_readings).
+    """
+    zone_columns = list(zone_columns)
+    steps = pd.date_range(date, periods=int(pd.Timedelta(days=1) / pd.Timedelta(freq)), freq=freq)
+    expected = history[zone_columns].drop_duplicates().merge(pd.DataFrame({'timestamp': steps}), how='cross')
+    merged = expected.merge(forecast, on=zone_columns + ['timestamp'], how='left')
+    missing = merged[list(signals)].isna()
+    if missing.values.any():
+        first = merged[missing.any(axis=1)].iloc[0]
+        raise ValueError(f"Forecast inputs for {date} are incomplete: {int(missing.any(axis=1).sum()):,} of {len(merged):,} "
+                         f"zone steps lack {', '.join(signal for signal in signals if missing[signal].any())} "
+                         f"(first: {', '.join(str(first[column]) for column in zone_columns)} at {first['timestamp']}).")
+
+
+def run_next_day_forecast(history_dir, forecast_dir, model_artifacts, output_dir=DEFAULT_FORECAST_OUTPUT_DIR, forecast_date=None,
+                          batch_size=DEFAULT_SCORING_BATCH_SIZE, zone_columns=DEFAULT_ZONE_COLUMNS, freq='1h'):
+    """
+    Forecasts every zone of the history for the day after it.
+
+    :param forecast_dir: dt=YYYY-MM-DD partitions with the forecast day's model inputs per zone and step
+                         (e.g. weather forecast, occupancy schedule), wide or long as the history.
+    :param forecast_date: Day to forecast (default: the day after the last history partition).
+    :return: Report dict with the forecast date, prediction count and output path.
+    :raises ValueError: If the model reads its own target (unknown for that day), the history lacks
+                        context days, or the forecast inputs are incomplete.
+    """
+    model = _model(model_artifacts)
+    signals, target = _input_signals(model), model.metadata["target"]
+    if target in signals:
+        raise ValueError(f"The model reads its target {target!r} as an input, which is unknown on the forecast day; "
+                         f"train it on forecastable inputs (weather, schedules, calendar features).")
+    available = list_partitions(history_dir)
+    if not available:
+        raise ValueError(f"No history partitions under {history_dir}.")
+    forecast_date = forecast_date or (pd.Timestamp(available[-1]) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    context_days = _context_days(model, freq)
+    context_dates = _context_dates(forecast_date, available, context_days)
+    if len(context_dates) < context_days:
+        raise ValueError(f"Forecast for {forecast_date} needs the {context_days} preceding history partitions; found {context_dates}.")
+
+    start = time.perf_counter()
+    history = wide_readings(read_partitions(history_dir, context_dates), signals, zone_columns, freq)
+    forecast_readings = read_partitions(forecast_dir, [forecast_date])
+    if forecast_readings.empty:
+        raise ValueError(f"No forecast inputs under {forecast_dir} for dt={forecast_date}.")
+    forecast = wide_readings(forecast_readings, signals, zone_columns, freq)
+    validate_forecast_inputs(forecast, history, forecast_date, signals, zone_columns, freq)
+
+    output = _score_date(model, pd.concat([history, forecast], ignore_index=True), forecast_date, zone_columns, freq, batch_size)
+    path = _write_predictions(output_dir, forecast_date, output)
+    report = {"date": forecast_date, "predictions": len(output), "path": path, "seconds": round(time.perf_counter() - start, 3)}
+    print(f"Next-day forecast for {forecast_date}: {len(output):,} predictions in {report['seconds']}s -> {path}")
+    return report
+
+
+def write_synthetic_history(history_dir, n_sites=4, zones_per_site=25, days=14, seed=0):
+    """Wide processed history (site_id, zone_id, timestamp, signals) as daily partitions, for the demo."""
+    from local_trainer import synthetic_training_frame
+    frames = []
+    for site in range(n_sites):
+        for zone in range(zones_per_site):
+            frame = synthetic_training_frame(24 * days, seed=seed + site * zones_per_site + zone)
+            frames.append(frame.assign(site_id=f"site_{site:02d}", zone_id=f"zone_{zone:03d}"))
+    history = pd.concat(frames, ignore_index=True)
+    history.loc[np.random.default_rng(seed).random(len(history)) < 0.01, 'temperature'] = np.nan # A few dropped readings
+    for date, partition in history.groupby(history['timestamp'].dt.strftime('%Y-%m-%d')):
+        os.makedirs(os.path.join(history_dir, f"dt={date}"), exist_ok=True)
+        partition.to_parquet(os.path.join(history_dir, f"dt={date}", 'history.parquet'), index=False)
+    return history
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    from aws_clients import use_local_stand_ins
+    from local_trainer import _resolve, describe_local_training_job, synthetic_training_frame, train_hvac_model_local
+
+    use_local_stand_ins() # Training data and artifacts under LOCAL_ML_DIR instead of S3
+
+    n_sites = int(sys.argv[sys.argv.index('--sites') + 1]) if '--sites' in sys.argv else 4
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else 1
+    print(f"--- Batch Scoring ({n_sites} sites x 25 zones, {workers} workers) ---")
+    root = tempfile.mkdtemp(prefix='hvac-scoring-')
+    try:
+        train_dir = _resolve('s3://hvac-ml-data/training/')
+        os.makedirs(train_dir, exist_ok=True)
+        synthetic_training_frame(24 * 180).to_parquet(os.path.join(train_dir, 'history.parquet'), index=False)
+        job = train_hvac_model_local('s3://hvac-ml-data/training/', None, 's3://hvac-ml-models/hvac_mlp_local/',
+                                     {'epochs': '10', 'feature_spec': json.dumps([{"type": "cyclic", "unit": "hour"}])})
+        artifacts = describe_local_training_job(job)["ModelArtifacts"]["S3ModelArtifacts"]
+
+        history_dir, output_dir = os.path.join(root, 'processed'), os.path.join(root, 'predictions')
+        history = write_synthetic_history(history_dir, n_sites=n_sites)
+        all_dates = list_partitions(history_dir)
+        run_batch_scoring(history_dir, artifacts, output_dir, dates=all_dates[:5], max_workers=workers) # "Interrupted" run
+        result = run_batch_scoring(history_dir, artifacts, output_dir, max_workers=workers) # Resumes
+
+        # Spot check against the per-sequence path (build_sequences + the same model) for one zone
+        from ml_model_template import build_sequences
+        scored = read_partitions(output_dir, all_dates)
+        zone = history[(history['site_id'] == 'site_00') & (history['zone_id'] == 'zone_000')].set_index('timestamp')
+        local_model = load_local_model(artifacts)
+        X_zone, _, _, _ = build_sequences(zone[['temperature', 'occupancy', 'energy_consumption']], local_model.sequence_length,
+                                          local_model.metadata["base_features"], 'energy_consumption',
+                                          feature_spec=local_model.metadata["feature_spec"], feature_cache_dir=None,
+                                          scalers=local_model.scalers)
+        expected = local_model.predict_kwh(X_zone)[-24:]
+        actual = scored[(scored['site_id'] == 'site_00') & (scored['zone_id'] == 'zone_000')].sort_values('timestamp')
+        print(f"Last day of site_00/zone_000 matches per-sequence scoring: "
+              f"{np.allclose(actual['predicted_energy_consumption'].to_numpy()[-24:], expected, atol=1e-3)}")
+        print(f"Without full context, not checkpointed (rescored on the next run): {result['partitions_incomplete']}")
+
+        # Next-day forecast, replayed for the last history day: its inputs (temperature, occupancy; no energy)
+        # come from a separate forecast partition, and the result must equal the backcast for that day
+        forecast_dir, last_day = os.path.join(root, 'forecast_inputs'), all_dates[-1]
+        inputs = history.drop(columns='energy_consumption')
+        inputs['temperature'] = inputs.groupby(['site_id', 'zone_id'])['temperature'].transform(lambda s: s.interpolate(limit_direction='both'))
+        inputs = inputs[inputs['timestamp'].dt.strftime('%Y-%m-%d') == last_day]
+        os.makedirs(os.path.join(forecast_dir, f"dt={last_day}"))
+        inputs.iloc[5:].to_parquet(os.path.join(forecast_dir, f"dt={last_day}", 'forecast.parquet'), index=False)
+        try:
+            run_next_day_forecast(history_dir, forecast_dir, artifacts, os.path.join(root, 'forecasts'), forecast_date=last_day)
+        except ValueError as e:
+            print(f"Rejected: {e}")
+        inputs.to_parquet(os.path.join(forecast_dir, f"dt={last_day}", 'forecast.parquet'), index=False)
+        forecast = run_next_day_forecast(history_dir, forecast_dir, artifacts, os.path.join(root, 'forecasts'), forecast_date=last_day)
+        key = ['site_id', 'zone_id', 'timestamp']
+        compared = pd.read_parquet(forecast["path"]).merge(read_partitions(output_dir, [last_day]), on=key, suffixes=('', '_backcast'))
+        print(f"Forecast for {last_day} covers {len(compared):,} zone hours and matches the backcast: "
+              f"{np.allclose(compared['predicted_energy_consumption'], compared['predicted_energy_consumption_backcast'], atol=1e-2)}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
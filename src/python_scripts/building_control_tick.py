@@ -0,0 +1,270 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from rules_registry import NO_ACTION, CompiledRulePlan, compile_rules
+
+# Building-level heuristic control tick.
+# heuristic_control_algorithm decides for one zone's sensor snapshot, so a building tick was one
+# call per zone, each re-walking the rule list in Python. Here the snapshot is one wide table (one
+# row per zone, one column per sensor). Zones are grouped by compiled plan (zones whose rule set
+# keys resolve to the same content share one group), and each group is evaluated rule by rule as
+# NumPy masks over the group's rows: a rule costs one comparison per condition for all zones at
+# once, and evaluation stops as soon as every zone in the group has an action.
+# The result is index arrays (plan and rule per zone); action ids, rule ids and parameters are looked
+# up per plan only when asked for, since building object columns costs more than the masks.
+# Semantics match CompiledRulePlan.evaluate: rules in priority order, the first match wins, and a
+# missing sensor column or a missing (NaN/None) reading makes the condition false. The tick keeps no
+# window state, so plans with windowed conditions are rejected unless the snapshot already carries
+# their derived readings (from SensorWindows.update) as columns.
+
+
+def _condition_mask(column, compare, value):
+    """Vectorized condition over one sensor column; missing readings never match."""
+    if column.dtype.kind in 'biuf':
+        with np.errstate(invalid='ignore'):
+            mask = compare(column, value)
+        if column.dtype.kind == 'f':
+            mask &= ~np.isnan(column)
+        return mask
+    valid = ~pd.isna(column)
+    mask = np.zeros(len(column), dtype=bool)
+    if valid.any():
+        mask[valid] = np.asarray(compare(column[valid], value), dtype=bool)
+    return mask
+
+
+def first_matching_rule(plan, columns, n_rows):
+    """
+    Index into plan.rules of the first rule matching each row, -1 where none matches.
+
+    :param columns: {sensor: NumPy array of length n_rows}; sensors absent from it count as missing.
+    """
+    chosen = np.full(n_rows, -1, dtype=np.int32)
+    undecided = np.ones(n_rows, dtype=bool)
+    for index, rule in enumerate(plan.rules):
+        mask = None
+        for sensor, compare, value in rule.conditions:
+            column = columns.get(sensor)
+            condition = np.zeros(n_rows, dtype=bool) if column is None else _condition_mask(column, compare, value)
+            if mask is None:
+                mask = condition
+            elif rule.match_all:
+                mask &= condition
+            else:
+                mask |= condition
+        mask &= undecided
+        if mask.any():
+            chosen[mask] = index
+            undecided &= ~mask
+            if not undecided.any():
+                break
+    return chosen
+
+
+class TickDecisions:
+    """
+    The decisions of one building tick as index arrays, in snapshot order. Actions are looked up
+    per plan only when asked for, so a tick costs the rule masks and not the output objects.
+
+    :ivar zone_ids: Zone ids from the snapshot.
+    :ivar plans: Distinct CompiledRulePlans of the tick (by content).
+    :ivar plan_index: Index into `plans` per zone; -1 for zones without a rule set.
+    :ivar rule_index: Index into that plan's rules per zone; -1 for NO_ACTION.
+    """
+
+    def __init__(self, zone_ids, plans, plan_index, rule_index):
+        self.zone_ids = zone_ids
+        self.plans = plans
+        self.plan_index = plan_index
+        self.rule_index = rule_index
+
+    def __len__(self):
+        return len(self.zone_ids)
+
+    def action(self, row):
+        """Action of the zone at `row`, as CompiledRulePlan.evaluate returns it."""
+        plan, rule = self.plan_index[row], self.rule_index[row]
+        if plan < 0 or rule < 0:
+            return dict(NO_ACTION, parameters={})
+        rule = self.plans[plan].rules[rule]
+        return {"action_id": rule.action["action_id"], "parameters": dict(rule.action["parameters"]), "rule_id": rule.rule_id}
+
+    def _lookup(self, values_of):
+        """Object array of values_of(rule) per zone (None for NO_ACTION), built with one take per plan."""
+        out = np.full(len(self), None, dtype=object)
+        for index, plan in enumerate(self.plans):
+            rows = np.flatnonzero((self.plan_index == index) & (self.rule_index >= 0))
+            table = np.empty(len(plan.rules), dtype=object)
+            table[:] = [values_of(rule) for rule in plan.rules]
+            out[rows] = table[self.rule_index[rows]]
+        return out
+
+    def action_ids(self):
+        action_ids = self._lookup(lambda rule: rule.action["action_id"])
+        action_ids[self.rule_index < 0] = NO_ACTION["action_id"]
+        return action_ids
+
+    def rule_ids(self):
+        return self._lookup(lambda rule: rule.rule_id)
+
+    def to_frame(self):
+        """
+        DataFrame with zone_id, action_id, rule_id (None for NO_ACTION) and parameters. `parameters`
+        dicts are shared with the plans and must not be modified.
+        """
+        parameters = self._lookup(lambda rule: rule.action["parameters"])
+        for row in np.flatnonzero(self.rule_index < 0):
+            parameters[row] = {}
+        return pd.DataFrame({'zone_id': self.zone_ids, 'action_id': self.action_ids(), 'rule_id': self.rule_ids(),
+                             'parameters': parameters})
+
+
+def building_control_tick(snapshot, zone_rule_sets, registry=None, zone_column='zone_id', default_rule_set=None):
+    """
+    Decides the action of every zone in a building for one tick.
+
+    :param snapshot: DataFrame with one row per zone: `zone_column` plus one column per sensor. Plans
+                     with windowed conditions need their derived readings (WindowSpec keys, e.g.
+                     from SensorWindows.update per zone) as columns too.
+    :param zone_rule_sets: {zone_id: rule set}, where a rule set is a CompiledRulePlan, a rules_config
+                           dict or a key resolved through `registry`.
+    :param registry: RulesRegistry for rule set keys (hot-reloaded plans).
+    :param default_rule_set: Rule set for zones missing from `zone_rule_sets`; such zones get
+                             NO_ACTION when it is None.
+    :return: TickDecisions (use .to_frame() for a per-zone action table).
+    :raises ValueError: For a rule set key without a registry, or a windowed plan whose derived
+                        readings are not snapshot columns (the tick keeps no window state).
+    """
+    zones = snapshot[zone_column].to_numpy()
+    n_zones = len(zones)
+
+    # Resolve each distinct rule set once (by identity), then group zones by plan content
+    rule_set_codes = np.empty(n_zones, dtype=np.int32)
+    code_of_rule_set = {}
+    rule_sets = []
+    for row, zone in enumerate(zones):
+        rule_set = zone_rule_sets.get(zone, default_rule_set)
+        code = code_of_rule_set.get(id(rule_set))
+        if code is None:
+            code = code_of_rule_set[id(rule_set)] = len(rule_sets)
+            rule_sets.append((rule_set, zone))
+        rule_set_codes[row] = code
+    plans = []
+    group_index = {}
+    group_of_code = np.empty(len(rule_sets) + 1, dtype=np.int32) # Trailing -1 for an empty snapshot
+    group_of_code[-1] = -1
+    for code, (rule_set, zone) in enumerate(rule_sets):
+        if rule_set is None:
+            group_of_code[code] = -1
+            continue
+        if isinstance(rule_set, CompiledRulePlan):
+            plan = rule_set
+        elif isinstance(rule_set, dict):
+            plan = compile_rules(rule_set)
+        else:
+            if registry is None:
+                raise ValueError(f"Zone '{zone}' uses rule set key '{rule_set}' but no registry was given.")
+            plan = registry.get_plan(rule_set)
+        missing = [spec.key for spec in plan.windows if spec.key not in snapshot.columns]
+        if missing:
+            raise ValueError(f"Zone '{zone}' uses windowed conditions {missing} that are not snapshot columns; "
+                             f"compute them per zone with SensorWindows.update first.")
+        group = group_index.get(plan.content_hash)
+        if group is None:
+            group = group_index[plan.content_hash] = len(plans)
+            plans.append(plan)
+        group_of_code[code] = group
+    plan_index = group_of_code[rule_set_codes]
+
+    rule_index = np.full(n_zones, -1, dtype=np.int32)
+    sensor_arrays = {}
+    for group, plan in enumerate(plans):
+        rows = None if len(plans) == 1 and plan_index.min() == 0 else np.flatnonzero(plan_index == group)
+        columns = {}
+        for sensor in plan.sensors:
+            if sensor in snapshot.columns:
+                if sensor not in sensor_arrays:
+                    sensor_arrays[sensor] = snapshot[sensor].to_numpy()
+                columns[sensor] = sensor_arrays[sensor] if rows is None else sensor_arrays[sensor][rows]
+        if rows is None:
+            rule_index = first_matching_rule(plan, columns, n_zones)
+        else:
+            rule_index[rows] = first_matching_rule(plan, columns, len(rows))
+
+    return TickDecisions(zones, plans, plan_index, rule_index)
+
+
+def _make_benchmark_building(n_zones, n_rule_sets=4, seed=0):
+    """Synthetic building: wide sensor snapshot plus zone -> rule set mapping (a few NaN readings)."""
+    rng = np.random.default_rng(seed)
+    snapshot = pd.DataFrame({
+        'zone_id': [f"zone_{i:04d}" for i in range(n_zones)],
+        'temperature': np.round(rng.normal(24.0, 2.0, n_zones), 1),
+        'occupancy': rng.integers(0, 2, n_zones),
+        'co2_level': rng.integers(400, 1200, n_zones).astype(float),
+        'humidity': np.round(rng.uniform(30, 70, n_zones), 1),
+    })
+    snapshot.loc[rng.random(n_zones) < 0.01, 'co2_level'] = np.nan
+    rule_sets = []
+    for variant in range(n_rule_sets):
+        offset = 0.5 * variant
+        rule_sets.append({"rules": [
+            {"id": "hot_occupied_high_co2", "priority": 1, "conditions_operator": "AND",
+             "conditions": [{"sensor": "temperature", "operator": ">", "value": 25.0 + offset},
+                            {"sensor": "occupancy", "operator": "==", "value": 1},
+                            {"sensor": "co2_level", "operator": ">", "value": 800}],
+             "action": "SET_HVAC_PROFILE", "parameters": {"profile_name": "MAX_COOL_VENT"}},
+            {"id": "warm_occupied", "priority": 2, "conditions_operator": "AND",
+             "conditions": [{"sensor": "temperature", "operator": ">", "value": 24.0 + offset},
+                            {"sensor": "occupancy", "operator": "==", "value": 1}],
+             "action": "ACTIVATE_STANDARD_COOLING", "parameters": {"target_temp_celsius": 23.0}},
+            {"id": "humid_or_stuffy", "priority": 3, "conditions_operator": "OR",
+             "conditions": [{"sensor": "humidity", "operator": ">=", "value": 65.0},
+                            {"sensor": "co2_level", "operator": ">", "value": 1100}],
+             "action": "INCREASE_VENTILATION", "parameters": {"fan_speed": "MEDIUM"}},
+            {"id": "empty_warm_standby", "priority": 4, "conditions_operator": "AND",
+             "conditions": [{"sensor": "temperature", "operator": ">", "value": 26.0},
+                            {"sensor": "occupancy", "operator": "==", "value": 0}],
+             "action": "SET_STANDBY_MODE", "parameters": {"standby_temp_celsius": 25.0}},
+        ]})
+    plans = [compile_rules(rule_set) for rule_set in rule_sets]
+    zone_rule_sets = {zone: plans[i % n_rule_sets] for i, zone in enumerate(snapshot['zone_id'])}
+    return snapshot, zone_rule_sets
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Building Control Tick ---")
+    snapshot, zone_rule_sets = _make_benchmark_building(8)
+    print(building_control_tick(snapshot, zone_rule_sets).to_frame().to_string())
+
+    if "--benchmark" in sys.argv:
+        n_zones = int(sys.argv[sys.argv.index('--zones') + 1]) if '--zones' in sys.argv else 1000
+        snapshot, zone_rule_sets = _make_benchmark_building(n_zones)
+        records = snapshot.drop(columns='zone_id').to_dict('records')
+
+        def per_zone_loop():
+            actions = []
+            for zone, readings in zip(snapshot['zone_id'], records):
+                readings = {sensor: value for sensor, value in readings.items() if value == value} # NaN -> missing
+                actions.append(zone_rule_sets[zone].evaluate(readings)["action_id"])
+            return actions
+
+        def median_ms(function, repeats=50):
+            function() # Warm-up
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                function()
+                timings.append((time.perf_counter() - start) * 1000)
+            return np.median(timings)
+
+        identical = building_control_tick(snapshot, zone_rule_sets).action_ids().tolist() == per_zone_loop()
+        print(f"{n_zones:,} zones (median of 50): per-zone loop {median_ms(per_zone_loop):.2f} ms, "
+              f"tick {median_ms(lambda: building_control_tick(snapshot, zone_rule_sets)):.2f} ms, "
+              f"tick + action ids {median_ms(lambda: building_control_tick(snapshot, zone_rule_sets).action_ids()):.2f} ms, "
+              f"tick + to_frame {median_ms(lambda: building_control_tick(snapshot, zone_rule_sets).to_frame()):.2f} ms, "
+              f"identical: {identical}")
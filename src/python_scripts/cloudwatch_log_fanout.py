@@ -0,0 +1,195 @@
+import heapq
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from aws_clients import get_client
+from cloudwatch_log_search import LocalLogsClientStandIn, iter_log_events, parse_log_event, to_epoch_millis
+
+# This module fetches a busy log group stream-by-stream in parallel instead of through one serial
+# filter_log_events scan. Active streams in the window are discovered with describe_log_streams,
+# pages are pulled concurrently with a bounded thread pool, and a heap k-way merges the streams
+# into a single time-ordered iterator. The merge needs the current page of every stream, but
+# prefetching is capped: at most max_workers pages are requested ahead (in flight or fetched but
+# not yet consumed) across all streams. A free slot goes to the stream that will run dry first,
+# i.e. the one whose last buffered event is oldest, since the merge consumes in timestamp order;
+# a stream that runs dry without a prefetch fetches its next page on demand. Memory is streams x
+# one page plus max_workers pages, however many streams there are. The first merged events are
+# available once every stream's first page has arrived; first pages go through the same window.
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_STREAM_PAGE_SIZE = 500
+
+
+def discover_active_streams(log_group_name, start_time, end_time, logs_client, max_streams=None):
+    """
+    Lists log streams that have events inside [start_time, end_time].
+
+    Streams are requested newest-activity first, so listing stops at the first stream whose last
+    event predates the window.
+
+    :return: List of stream names.
+    """
+    start_ms, end_ms = to_epoch_millis(start_time), to_epoch_millis(end_time)
+    active = []
+    request = {"logGroupName": log_group_name, "orderBy": "LastEventTime", "descending": True}
+    while True:
+        response = logs_client.describe_log_streams(**request)
+        for stream in response.get("logStreams", []):
+            if stream.get("lastEventTimestamp", 0) < start_ms:
+                return active
+            if stream.get("firstEventTimestamp", 0) <= end_ms:
+                active.append(stream["logStreamName"])
+                if max_streams is not None and len(active) >= max_streams:
+                    return active
+        if not response.get("nextToken"):
+            return active
+        request["nextToken"] = response["nextToken"]
+
+
+class _StreamCursor:
+    """Read position in one log stream: a buffered page, the next token and at most one requested-ahead page."""
+    __slots__ = ("stream_name", "buffer", "next_token", "pending", "exhausted", "pages")
+
+    def __init__(self, stream_name):
+        self.stream_name = stream_name
+        self.buffer = deque()
+        self.next_token = None
+        self.pending = None
+        self.exhausted = False
+        self.pages = 0
+
+
+def _fetch_page(logs_client, log_group_name, stream_name, start_ms, end_ms, page_size, token):
+    request = {"logGroupName": log_group_name, "logStreamName": stream_name, "startTime": start_ms,
+               "endTime": end_ms, "limit": page_size, "startFromHead": True}
+    if token:
+        request["nextToken"] = token
+    response = logs_client.get_log_events(**request)
+    return response.get("events", []), response.get("nextForwardToken")
+
+
+def iter_merged_log_events(log_group_name, start_time, end_time, logs_client=None, max_workers=DEFAULT_MAX_WORKERS,
+                           page_size=DEFAULT_STREAM_PAGE_SIZE, max_streams=None, parse=False):
+    """
+    Yields all events of a log group in the window, merged across streams in timestamp order.
+
+    :param logs_client: boto3 'logs' client; defaults to aws_clients.get_client('logs').
+    :param max_workers: Upper bound on concurrent get_log_events calls and on pages requested ahead.
+    :param page_size: Events per get_log_events page (per-stream memory bound).
+    :param max_streams: Optional cap on the number of (most recently active) streams read.
+    :param parse: Yield parsed records (cloudwatch_log_search.parse_log_event) instead of raw events.
+    """
+    logs_client = logs_client if logs_client is not None else get_client('logs')
+    start_ms, end_ms = to_epoch_millis(start_time), to_epoch_millis(end_time)
+    stream_names = discover_active_streams(log_group_name, start_ms, end_ms, logs_client, max_streams)
+    if not stream_names:
+        return
+
+    window = min(max_workers, len(stream_names))
+    executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="log-fanout")
+    in_flight = 0 # Pages requested and not yet buffered, across all streams
+    waiting = []  # (last buffered timestamp, index, pages) of streams without a page requested ahead
+
+    def request_next_page(cursor):
+        nonlocal in_flight
+        cursor.pending = executor.submit(_fetch_page, logs_client, log_group_name, cursor.stream_name,
+                                         start_ms, end_ms, page_size, cursor.next_token)
+        in_flight += 1
+
+    def prefetch(cursor):
+        if cursor.pending is None and not cursor.exhausted and in_flight < window:
+            request_next_page(cursor)
+
+    def fill_window():
+        """Gives free prefetch slots to the streams that will run dry first."""
+        while waiting and in_flight < window:
+            _, index, pages = heapq.heappop(waiting)
+            cursor = cursors[index]
+            if cursor.pages == pages: # Otherwise stale: the stream has buffered another page since
+                prefetch(cursor)
+
+    def refill(cursor, index):
+        """Buffers the stream's next page, waiting on its prefetch or fetching it now."""
+        nonlocal in_flight
+        while not cursor.buffer and not cursor.exhausted:
+            if cursor.pending is None:
+                request_next_page(cursor)
+            events, token = cursor.pending.result()
+            cursor.pending = None
+            in_flight -= 1
+            if token is None or token == cursor.next_token:
+                cursor.exhausted = True # The forward token repeats once a stream has no more events; empty pages can come before that
+            cursor.next_token = token
+            cursor.buffer.extend(events)
+            cursor.pages += 1
+        if cursor.buffer and not cursor.exhausted:
+            heapq.heappush(waiting, (cursor.buffer[-1]["timestamp"], index, cursor.pages))
+
+    try:
+        cursors = [_StreamCursor(name) for name in stream_names]
+        for cursor in cursors[:window]:
+            request_next_page(cursor)
+
+        heap = []
+        for index, cursor in enumerate(cursors):
+            refill(cursor, index)
+            for upcoming in cursors[index + 1:index + 1 + window]: # Keep the window full of first pages
+                prefetch(upcoming)
+            if cursor.buffer:
+                heap.append((cursor.buffer[0]["timestamp"], index))
+        heapq.heapify(heap)
+        fill_window()
+
+        while heap:
+            _, index = heap[0]
+            cursor = cursors[index]
+            event = cursor.buffer.popleft()
+            if "logStreamName" not in event:
+                event = dict(event, logStreamName=cursor.stream_name)
+            if not cursor.buffer:
+                refill(cursor, index)
+            fill_window()
+            if cursor.buffer:
+                heapq.heapreplace(heap, (cursor.buffer[0]["timestamp"], index))
+            else:
+                heapq.heappop(heap)
+            yield parse_log_event(event) if parse else event
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    class SlowLogsClient(LocalLogsClientStandIn):
+        """Adds per-call latency to the stand-in, as seen against the real API."""
+        def get_log_events(self, **kwargs):
+            time.sleep(0.02)
+            return super().get_log_events(**kwargs)
+
+        def filter_log_events(self, **kwargs):
+            time.sleep(0.02)
+            return super().filter_log_events(**kwargs)
+
+    print("--- Parallel Log Stream Fan-out Simulation ---")
+    client = SlowLogsClient(streams_per_group=32, events_per_minute=30)
+    log_group = "/aws/lambda/control-algo-heuristic"
+    end = client.end_time
+    start = end - timedelta(minutes=30)
+
+    t0 = time.perf_counter()
+    merged = iter_merged_log_events(log_group, start, end, logs_client=client, max_workers=16, page_size=200)
+    first = next(merged)
+    first_ms = (time.perf_counter() - t0) * 1000
+    count, previous_ts, ordered = 1, first["timestamp"], True
+    for event in merged:
+        ordered &= event["timestamp"] >= previous_ts
+        previous_ts = event["timestamp"]
+        count += 1
+    fanout_s = time.perf_counter() - t0
+    print(f"Fan-out: first event after {first_ms:.0f} ms, {count} events in {fanout_s:.2f}s, time-ordered: {ordered}")
+
+    t0 = time.perf_counter()
+    serial_count = sum(1 for _ in iter_log_events(log_group, start, end, page_size=200, logs_client=client))
+    print(f"Serial filter_log_events: {serial_count} events in {time.perf_counter() - t0:.2f}s")
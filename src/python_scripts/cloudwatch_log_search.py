@@ -0,0 +1,434 @@
+import heapq
+import re
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from aws_clients import get_client
+
+# This module adds a streaming, indexed log search on top of CloudWatch Logs for the IDE.
+# ide_lambda_monitoring_utils.get_recent_cloudwatch_logs returns one capped page of raw strings.
+# Here, events are paged lazily (nextToken), parsed into structured records (level, timestamp,
+# request id) and kept in a local inverted index for the recent window, so repeated IDE searches
+# over the same hour are answered locally and only the new tail of the log group is fetched.
+
+DEFAULT_PAGE_SIZE = 1000         # filter_log_events accepts up to 10,000 events per page
+DEFAULT_INDEX_WINDOW_MINUTES = 60
+# CloudWatch can ingest events late, with timestamps that are already covered. Events older than
+# this behind a refresh's end are treated as settled; at most once per overlap, a refresh re-reads
+# everything since the last settled point. Re-read events are skipped by event id.
+DEFAULT_INGESTION_OVERLAP_MINUTES = 5
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARN", "WARNING", "ERROR", "CRITICAL", "FATAL")
+
+# Python Lambda runtime format: "[LEVEL]\t2023-01-01T10:00:00.123Z\t<request-id>\tmessage"
+LAMBDA_RUNTIME_LINE = re.compile(r"^\[(?P<level>[A-Z]+)\]\t(?P<timestamp>\S+)\t(?P<request_id>[0-9a-fA-F-]{36})\t(?P<message>.*)", re.S)
+# Lambda platform lines: "START RequestId: <id> ...", "END RequestId: <id>", "REPORT RequestId: <id>\tDuration: ..."
+LAMBDA_PLATFORM_LINE = re.compile(r"^(?P<type>START|END|REPORT) RequestId: (?P<request_id>[0-9a-fA-F-]{36})")
+# Simulated/app format used in the IDE mocks: "[2023-01-01T10:00:00] [INFO] message"
+BRACKETED_LINE = re.compile(r"^\[(?P<timestamp>[^\]]+)\]\s*\[(?P<level>[A-Z]+)\]\s*(?P<message>.*)", re.S)
+REQUEST_ID_ANYWHERE = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I)
+LEVEL_ANYWHERE = re.compile(r"\b(" + "|".join(LOG_LEVELS) + r")\b")
+TOKEN = re.compile(r"[a-z0-9][a-z0-9_\-]*")
+
+
+def to_epoch_millis(timestamp):
+    """Epoch milliseconds for a datetime or epoch ms; naive datetimes are UTC (as from datetime.utcnow())."""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def tokenize(text):
+    """Lower-cases text and splits it into index tokens (request ids and hyphenated words stay whole)."""
+    return TOKEN.findall(text.lower())
+
+
+def parse_log_event(event):
+    """
+    Parses a CloudWatch log event into a structured record.
+
+    :param event: An event dict from filter_log_events / get_log_events
+                  ({'timestamp': ms, 'message': str, 'logStreamName': str, ...}).
+    :return: Dict with timestamp (epoch ms), level, request_id, type, message, log_stream and event_id.
+    """
+    message = event.get("message", "").rstrip("\n")
+    record = {
+        "timestamp": event.get("timestamp"),
+        "level": None,
+        "request_id": None,
+        "type": "LOG",
+        "message": message,
+        "log_stream": event.get("logStreamName"),
+        "event_id": event.get("eventId"),
+    }
+
+    match = LAMBDA_RUNTIME_LINE.match(message)
+    if match:
+        record["level"] = match.group("level")
+        record["request_id"] = match.group("request_id").lower()
+    else:
+        match = LAMBDA_PLATFORM_LINE.match(message)
+        if match:
+            record["type"] = match.group("type")
+            record["level"] = "INFO"
+            record["request_id"] = match.group("request_id").lower()
+        else:
+            match = BRACKETED_LINE.match(message)
+            if match:
+                record["level"] = match.group("level")
+                if record["timestamp"] is None:
+                    try:
+                        record["timestamp"] = to_epoch_millis(datetime.fromisoformat(match.group("timestamp").replace('Z', '+00:00')))
+                    except ValueError:
+                        pass
+
+    if record["level"] is None:
+        level_match = LEVEL_ANYWHERE.search(message)
+        record["level"] = level_match.group(1) if level_match else "INFO"
+    if record["level"] == "WARNING":
+        record["level"] = "WARN"
+    if record["request_id"] is None:
+        id_match = REQUEST_ID_ANYWHERE.search(message)
+        if id_match:
+            record["request_id"] = id_match.group(0).lower()
+    if record["timestamp"] is None:
+        record["timestamp"] = event.get("ingestionTime", 0)
+    return record
+
+
+class LocalLogsClientStandIn:
+    """
+    Offline stand-in for the CloudWatch Logs client. Generates deterministic Lambda-style log
+    streams and implements the paginated calls used here (filter_log_events, describe_log_streams,
+    get_log_events), so the reader and index can be exercised in the IDE without AWS.
+
+    :param streams_per_group: Number of log streams (Lambda containers) per log group.
+    :param events_per_minute: Log events per stream per minute.
+    """
+
+    def __init__(self, streams_per_group=4, events_per_minute=20, end_time=None):
+        self.streams_per_group = streams_per_group
+        self.events_per_minute = events_per_minute
+        self.end_time = end_time or datetime.utcnow().replace(tzinfo=timezone.utc)
+        self.calls = {"filter_log_events": 0, "describe_log_streams": 0, "get_log_events": 0}
+        self._groups = {}
+        self._last_query_key = None
+        self._last_query_events = []
+
+    def _events_for_group(self, log_group_name):
+        if log_group_name not in self._groups:
+            streams = {}
+            start_ms = to_epoch_millis(self.end_time - timedelta(hours=3))
+            interval_ms = int(60000 / self.events_per_minute)
+            for s in range(self.streams_per_group):
+                stream_name = f"2023/01/01/[$LATEST]{uuid.UUID(int=s + 1).hex}"
+                events = []
+                for i, ts in enumerate(range(start_ms + s * 7, to_epoch_millis(self.end_time), interval_ms)):
+                    request_id = str(uuid.UUID(int=(s << 32) + i // 4))
+                    phase = i % 4
+                    if phase == 0:
+                        message = f"START RequestId: {request_id} Version: $LATEST\n"
+                    elif phase == 1:
+                        level = "ERROR" if i % 52 == 1 else ("WARN" if i % 12 == 1 else "INFO")
+                        message = f"[{level}]\t{datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat()}\t{request_id}\tProcessed sensor batch for zone {i % 9}, status {level.lower()}\n"
+                    elif phase == 2:
+                        message = f"END RequestId: {request_id}\n"
+                    else:
+                        message = f"REPORT RequestId: {request_id}\tDuration: {80 + i % 50}.00 ms\tBilled Duration: {81 + i % 50} ms\n"
+                    events.append({"timestamp": ts, "message": message, "logStreamName": stream_name, "ingestionTime": ts + 200,
+                                   "eventId": f"{s}-{i}"})
+                streams[stream_name] = events
+            self._groups[log_group_name] = streams
+        return self._groups[log_group_name]
+
+    def filter_log_events(self, logGroupName, startTime=0, endTime=None, filterPattern="", limit=DEFAULT_PAGE_SIZE,
+                          nextToken=None, logStreamNames=None, interleaved=True):
+        self.calls["filter_log_events"] += 1
+        end_ms = endTime if endTime is not None else float('inf')
+        query_key = (logGroupName, startTime, end_ms, filterPattern, tuple(logStreamNames or ()))
+        if query_key != self._last_query_key:
+            terms = [term.lower() for term in filterPattern.replace('"', ' ').split()]
+            streams = self._events_for_group(logGroupName)
+            selected = [event for name, events in streams.items() if not logStreamNames or name in logStreamNames
+                        for event in events if startTime <= event["timestamp"] <= end_ms
+                        and all(term in event["message"].lower() for term in terms)]
+            selected.sort(key=lambda event: event["timestamp"])
+            self._last_query_key, self._last_query_events = query_key, selected # Pages of one query share the scan
+        selected = self._last_query_events
+        offset = int(nextToken) if nextToken else 0
+        page = selected[offset:offset + limit]
+        response = {"events": page}
+        if offset + limit < len(selected):
+            response["nextToken"] = str(offset + limit)
+        return response
+
+    def describe_log_streams(self, logGroupName, orderBy="LastEventTime", descending=True, limit=50, nextToken=None):
+        self.calls["describe_log_streams"] += 1
+        streams = [
+            {"logStreamName": name, "firstEventTimestamp": events[0]["timestamp"], "lastEventTimestamp": events[-1]["timestamp"]}
+            for name, events in self._events_for_group(logGroupName).items() if events
+        ]
+        streams.sort(key=lambda stream: stream["lastEventTimestamp"], reverse=descending)
+        offset = int(nextToken) if nextToken else 0
+        response = {"logStreams": streams[offset:offset + limit]}
+        if offset + limit < len(streams):
+            response["nextToken"] = str(offset + limit)
+        return response
+
+    def get_log_events(self, logGroupName, logStreamName, startTime=0, endTime=None, limit=DEFAULT_PAGE_SIZE,
+                       nextToken=None, startFromHead=True):
+        self.calls["get_log_events"] += 1
+        end_ms = endTime if endTime is not None else float('inf')
+        events = [event for event in self._events_for_group(logGroupName).get(logStreamName, [])
+                  if startTime <= event["timestamp"] <= end_ms]
+        offset = int(nextToken.split("/")[1]) if nextToken else 0
+        page = events[offset:offset + limit]
+        # Like the real API, the forward token is always returned; it repeats once the stream is exhausted.
+        next_offset = offset + len(page)
+        return {"events": page, "nextForwardToken": f"f/{next_offset}", "nextBackwardToken": f"b/{offset}"}
+
+
+def iter_log_events(log_group_name, start_time, end_time, filter_pattern="", page_size=DEFAULT_PAGE_SIZE, logs_client=None):
+    """
+    Lazily pages through filter_log_events, yielding one raw event at a time.
+    Only as many pages are requested as the caller consumes.
+
+    :param start_time: datetime or epoch milliseconds.
+    :param end_time: datetime or epoch milliseconds.
+    :param logs_client: boto3 'logs' client; defaults to aws_clients.get_client('logs').
+    """
+    logs_client = logs_client if logs_client is not None else get_client('logs')
+    request = {
+        "logGroupName": log_group_name,
+        "startTime": to_epoch_millis(start_time),
+        "endTime": to_epoch_millis(end_time),
+        "filterPattern": filter_pattern,
+        "limit": page_size,
+    }
+    while True:
+        response = logs_client.filter_log_events(**request)
+        yield from response.get("events", [])
+        next_token = response.get("nextToken")
+        if not next_token:
+            return
+        request["nextToken"] = next_token
+
+
+def iter_log_records(log_group_name, start_time, end_time, filter_pattern="", page_size=DEFAULT_PAGE_SIZE, logs_client=None):
+    """Like iter_log_events, but yields parsed records (see parse_log_event)."""
+    for event in iter_log_events(log_group_name, start_time, end_time, filter_pattern, page_size, logs_client):
+        yield parse_log_event(event)
+
+
+def _record_key(record):
+    """CloudWatch event id, or stream/timestamp/message for events without one."""
+    return record["event_id"] or (record["log_stream"], record["timestamp"], record["message"])
+
+
+def _timestamp(record):
+    return record["timestamp"]
+
+
+class LogSearchIndex:
+    """
+    Inverted index over parsed log records for one log group and a recent time window.
+
+    Postings lists hold record positions in timestamp order, so time-range filters are a bisect
+    and multi-term queries intersect the shortest postings first.
+    """
+
+    def __init__(self, log_group_name):
+        self.log_group_name = log_group_name
+        self.records = []
+        self.timestamps = []
+        self.by_level = {}
+        self.by_request_id = {}
+        self.by_token = {}
+        self.keys = set()
+        self.covered_start_ms = None
+        self.covered_end_ms = None
+        self.settled_ms = None   # Events up to here can no longer arrive late (maintained by LogSearchCache)
+        self.reread_end_ms = None # Covered end at the last re-read of the unsettled range
+
+    def __len__(self):
+        return len(self.records)
+
+    def add_records(self, records):
+        """Appends records (sorted by timestamp, all newer than those already indexed)."""
+        for record in records:
+            position = len(self.records)
+            self.keys.add(_record_key(record))
+            self.records.append(record)
+            self.timestamps.append(record["timestamp"])
+            self.by_level.setdefault(record["level"], []).append(position)
+            if record["request_id"]:
+                self.by_request_id.setdefault(record["request_id"], []).append(position)
+            for token in set(tokenize(record["message"])):
+                self.by_token.setdefault(token, []).append(position)
+
+    def merge_records(self, records):
+        """
+        Adds records in any timestamp order, skipping ones already indexed. Records older than the
+        newest indexed one (late ingestion) re-index the tail from their position onwards.
+
+        :return: Number of records added.
+        """
+        new = sorted((record for record in records if _record_key(record) not in self.keys), key=_timestamp)
+        if not new:
+            return 0
+        position = bisect_right(self.timestamps, new[0]["timestamp"])
+        if position < len(self.records):
+            tail = self.records[position:]
+            del self.records[position:], self.timestamps[position:]
+            for postings in (self.by_level, self.by_request_id, self.by_token):
+                for positions in postings.values():
+                    del positions[bisect_left(positions, position):]
+            new = list(heapq.merge(tail, new, key=_timestamp))
+        self.add_records(new)
+        return len(new)
+
+    def search(self, terms="", level=None, request_id=None, start_time=None, end_time=None, limit=None, newest_first=True):
+        """
+        Returns records matching all given criteria.
+
+        :param terms: Free-text query; every token must appear in the message.
+        :param level: Log level (e.g. 'ERROR') or a list of levels.
+        :param request_id: Lambda request id.
+        :param start_time: datetime or epoch ms (inclusive).
+        :param end_time: datetime or epoch ms (inclusive).
+        :param limit: Maximum number of records to return.
+        """
+        low = bisect_left(self.timestamps, to_epoch_millis(start_time)) if start_time is not None else 0
+        high = bisect_right(self.timestamps, to_epoch_millis(end_time)) if end_time is not None else len(self.timestamps)
+
+        postings = []
+        if level is not None:
+            levels = [level] if isinstance(level, str) else level
+            merged = sorted({p for lvl in levels for p in self.by_level.get(lvl.upper().replace("WARNING", "WARN"), [])})
+            postings.append(merged)
+        if request_id is not None:
+            postings.append(self.by_request_id.get(request_id.lower(), []))
+        for token in set(tokenize(terms)):
+            postings.append(self.by_token.get(token, []))
+
+        if not postings:
+            positions = range(low, high)
+        else:
+            postings.sort(key=len)
+            candidates = postings[0][bisect_left(postings[0], low):bisect_left(postings[0], high)]
+            others = [set(p) for p in postings[1:]]
+            positions = [p for p in candidates if all(p in other for other in others)]
+
+        if newest_first:
+            positions = reversed(positions)
+        results = []
+        for position in positions:
+            results.append(self.records[position])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+class LogSearchCache:
+    """
+    Keeps one LogSearchIndex per log group for the recent window. A search over a window that is
+    already covered is served locally; otherwise only events after the covered end are fetched,
+    plus, at most once per ingestion overlap, the not yet settled range before it (late ingestion).
+
+    :param window_minutes: How much history each index retains; older records are dropped on refresh.
+    :param ingestion_overlap_minutes: How late CloudWatch may ingest an event after its timestamp;
+        also the minimum spacing between re-reads of the unsettled range.
+    """
+
+    def __init__(self, logs_client=None, window_minutes=DEFAULT_INDEX_WINDOW_MINUTES, page_size=DEFAULT_PAGE_SIZE,
+                 ingestion_overlap_minutes=DEFAULT_INGESTION_OVERLAP_MINUTES):
+        self.logs_client = logs_client if logs_client is not None else get_client('logs')
+        self.window_ms = window_minutes * 60 * 1000
+        self.overlap_ms = ingestion_overlap_minutes * 60 * 1000
+        self.page_size = page_size
+        self.indexes = {}
+
+    def get_index(self, log_group_name, start_time, end_time):
+        """Returns an index covering [start_time, end_time], fetching only what is missing."""
+        start_ms, end_ms = to_epoch_millis(start_time), to_epoch_millis(end_time)
+        index = self.indexes.get(log_group_name)
+
+        if index is None or start_ms < index.covered_start_ms:
+            # Cold or older range than cached: (re)build from scratch
+            index = LogSearchIndex(log_group_name)
+            index.add_records(iter_log_records(log_group_name, start_ms, end_ms, page_size=self.page_size, logs_client=self.logs_client))
+            index.covered_start_ms, index.covered_end_ms = start_ms, end_ms
+            index.settled_ms, index.reread_end_ms = end_ms - self.overlap_ms, end_ms
+        elif end_ms > index.covered_end_ms:
+            # Warm: fetch the tail since the last refresh. Once the last re-read is an overlap old,
+            # also re-read the unsettled range before it for late-ingested events.
+            refresh_from_ms = index.covered_end_ms + 1
+            if end_ms - index.reread_end_ms >= self.overlap_ms:
+                refresh_from_ms = max(index.covered_start_ms, index.settled_ms + 1)
+                index.settled_ms, index.reread_end_ms = end_ms - self.overlap_ms, end_ms
+            index.merge_records(iter_log_records(log_group_name, refresh_from_ms, end_ms, page_size=self.page_size, logs_client=self.logs_client))
+            index.covered_end_ms = end_ms
+            if index.covered_end_ms - index.covered_start_ms > 2 * self.window_ms:
+                index = self._trim(index)
+
+        self.indexes[log_group_name] = index
+        return index
+
+    def _trim(self, index):
+        """Rebuilds the index keeping only the last `window_ms` of records, bounding memory."""
+        keep_from_ms = index.covered_end_ms - self.window_ms
+        trimmed = LogSearchIndex(index.log_group_name)
+        trimmed.add_records(index.records[bisect_left(index.timestamps, keep_from_ms):])
+        trimmed.covered_start_ms, trimmed.covered_end_ms = keep_from_ms, index.covered_end_ms
+        trimmed.settled_ms, trimmed.reread_end_ms = index.settled_ms, index.reread_end_ms
+        return trimmed
+
+    def search(self, log_group_name, minutes_ago=60, terms="", level=None, request_id=None, limit=50, end_time=None):
+        """Searches the last `minutes_ago` minutes of a log group, newest first."""
+        end_time = end_time or datetime.utcnow().replace(tzinfo=timezone.utc)
+        start_time = end_time - timedelta(minutes=minutes_ago)
+        index = self.get_index(log_group_name, start_time, end_time)
+        return index.search(terms=terms, level=level, request_id=request_id, start_time=start_time, end_time=end_time, limit=limit)
+
+
+# Module-level cache so warm Lambda containers / IDE sessions reuse the index between searches
+_default_cache = None
+
+def search_recent_logs(log_group_name, minutes_ago=60, terms="", level=None, request_id=None, limit=50, logs_client=None):
+    """
+    Indexed counterpart of get_recent_cloudwatch_logs returning structured records.
+
+    :param terms: Free-text query (all tokens must match).
+    :param level: Optional level filter, e.g. 'ERROR' or ['WARN', 'ERROR'].
+    :param request_id: Optional Lambda request id to pull every line of one invocation.
+    """
+    global _default_cache
+    if _default_cache is None or (logs_client is not None and _default_cache.logs_client is not logs_client):
+        _default_cache = LogSearchCache(logs_client)
+    return _default_cache.search(log_group_name, minutes_ago, terms, level, request_id, limit)
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Indexed CloudWatch Log Search Simulation ---")
+    stand_in = LocalLogsClientStandIn(streams_per_group=8, events_per_minute=60)
+    cache = LogSearchCache(stand_in)
+    log_group = "/aws/lambda/preprocess-hvac-data"
+    now = stand_in.end_time
+
+    start = time.perf_counter()
+    errors = cache.search(log_group, minutes_ago=60, level="ERROR", limit=5, end_time=now)
+    cold_ms = (time.perf_counter() - start) * 1000
+    print(f"Cold search: {len(errors)} ERROR records in {cold_ms:.1f} ms, indexed {len(cache.indexes[log_group])} records, calls: {stand_in.calls}")
+    for record in errors[:3]:
+        print(f"  {record['timestamp']} {record['level']} {record['request_id']} {record['message'][:60]}")
+
+    start = time.perf_counter()
+    zone_warnings = cache.search(log_group, minutes_ago=60, terms="zone 3", level=["WARN", "ERROR"], end_time=now)
+    invocation = cache.search(log_group, minutes_ago=60, request_id=errors[0]["request_id"], end_time=now)
+    warm_ms = (time.perf_counter() - start) * 1000
+    print(f"Warm searches: {len(zone_warnings)} zone-3 warnings, {len(invocation)} lines for one request in {warm_ms:.2f} ms, calls: {stand_in.calls}")
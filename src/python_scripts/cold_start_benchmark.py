@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+import sys
+
+# Startup-time benchmark for the Lambda handler modules in this directory.
+# Each module is imported in a fresh interpreter with `python -X importtime`, which reports the
+# cumulative import cost of every module. The benchmark fails (exit code 1) when:
+#   - a module's own import takes longer than its threshold in COLD_START_THRESHOLDS_MS, or
+#   - a heavy dependency (pandas, numpy, sklearn, boto3, ...) is imported at module load time,
+#     which would put it back on every cold start, including trivial invocations.
+# Run from the IDE terminal or CI: `python cold_start_benchmark.py [--json]`
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Generous ceilings for the module's cumulative import time (ms) on a Lambda-sized CPU.
+# Current values are 10-30 ms each; a heavy import slipping back in costs hundreds of ms.
+COLD_START_THRESHOLDS_MS = {
+    's3_data_processor_template': 50,
+    'athena_query_runner_template': 50,
+    'ide_metric_aggregation_lambda': 50,
+    'ide_lambda_monitoring_utils': 50,
+    'metric_alert_engine': 50,
+    'aws_clients': 20,
+    'heuristic_control_template': 50,
+}
+
+# Dependencies that must only be loaded on first use
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'scipy', 'boto3', 'botocore', 'pulp', 'tensorflow')
+
+# A trivial invocation that must not touch heavy dependencies (bad event -> 400)
+TRIVIAL_INVOCATIONS = {
+    's3_data_processor_template': ('lambda_handler', {}),
+    'athena_query_runner_template': ('lambda_handler', {}),
+}
+
+
+def parse_importtime(stderr_output):
+    """
+    Parses `-X importtime` output into {module_name: cumulative_microseconds}.
+    Lines look like: 'import time:       412 |       1033 |   json.decoder'.
+    """
+    timings = {}
+    for line in stderr_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue # Header line
+        timings[parts[2].strip()] = int(parts[1].strip())
+    return timings
+
+
+def measure_import(module_name, python_executable=sys.executable):
+    """
+    Imports a module in a fresh interpreter and returns (cumulative_ms, heavy_modules_loaded).
+    """
+    result = subprocess.run(
+        [python_executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=SCRIPTS_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr[-2000:]}")
+    timings = parse_importtime(result.stderr)
+    heavy_loaded = sorted({name.split('.')[0] for name in timings if name.split('.')[0] in HEAVY_MODULES})
+    return timings.get(module_name, 0) / 1000.0, heavy_loaded
+
+
+def measure_trivial_invocation(module_name, handler_name, event, python_executable=sys.executable):
+    """
+    Imports the module and invokes a handler with an event that should fail fast, in a fresh
+    interpreter. Returns (elapsed_ms, heavy_modules_loaded, status_code).
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name} as m\n"
+        f"response = m.{handler_name}(json.loads(sys.argv[1]), None)\n"
+        "elapsed_ms = (time.perf_counter() - start) * 1000\n"
+        f"heavy = sorted({{n.split('.')[0] for n in sys.modules if n.split('.')[0] in {HEAVY_MODULES!r}}})\n"
+        "print(json.dumps({'elapsed_ms': elapsed_ms, 'heavy': heavy, 'status': response.get('statusCode')}))\n"
+    )
+    result = subprocess.run([python_executable, "-c", code, json.dumps(event)],
+                            cwd=SCRIPTS_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Invoking {module_name}.{handler_name} failed:\n{result.stderr[-2000:]}")
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    return output['elapsed_ms'], output['heavy'], output['status']
+
+
+def run_benchmark(repeats=3):
+    """
+    Runs the import and trivial-invocation checks. Returns (report, regressions).
+    Import times are the best of `repeats` fresh interpreters to reduce noise.
+    """
+    report, regressions = {}, []
+    for module_name, threshold_ms in COLD_START_THRESHOLDS_MS.items():
+        runs = [measure_import(module_name) for _ in range(repeats)]
+        import_ms = min(ms for ms, _ in runs)
+        heavy_loaded = runs[0][1]
+        entry = {"import_ms": round(import_ms, 2), "threshold_ms": threshold_ms, "heavy_at_import": heavy_loaded}
+        if import_ms > threshold_ms:
+            regressions.append(f"{module_name}: import took {import_ms:.1f} ms (threshold {threshold_ms} ms)")
+        if heavy_loaded:
+            regressions.append(f"{module_name}: heavy modules imported at load time: {', '.join(heavy_loaded)}")
+
+        if module_name in TRIVIAL_INVOCATIONS:
+            handler_name, event = TRIVIAL_INVOCATIONS[module_name]
+            elapsed_ms, heavy_used, status = measure_trivial_invocation(module_name, handler_name, event)
+            entry.update({"trivial_invocation_ms": round(elapsed_ms, 2), "trivial_status": status,
+                          "heavy_in_trivial_invocation": heavy_used})
+            if heavy_used:
+                regressions.append(f"{module_name}.{handler_name}: trivial invocation loaded {', '.join(heavy_used)}")
+        report[module_name] = entry
+    return report, regressions
+
+
+if __name__ == "__main__":
+    print("--- Lambda Cold-Start Import Benchmark ---")
+    benchmark_report, benchmark_regressions = run_benchmark()
+    if "--json" in sys.argv:
+        print(json.dumps({"report": benchmark_report, "regressions": benchmark_regressions}, indent=2))
+    else:
+        for name, entry in benchmark_report.items():
+            line = f"  {name}: import {entry['import_ms']} ms (threshold {entry['threshold_ms']} ms)"
+            if "trivial_invocation_ms" in entry:
+                line += f", trivial invocation {entry['trivial_invocation_ms']} ms -> {entry['trivial_status']}"
+            print(line)
+    if benchmark_regressions:
+        print("\nCold-start regressions:")
+        for regression in benchmark_regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nNo cold-start regressions.")
@@ -0,0 +1,218 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Fast duplicate removal for sensor readings.
+# preprocess_timeseries_data used reset_index().drop_duplicates(subset=['timestamp', 'sensor_id',
+# 'value_interpolated']), which hashes the object sensor_id column row by row and copies the
+# frame twice around it. Here sensor ids become integer codes (free for categorical columns),
+# codes and int64 timestamps are combined into one composite int64 key, and a single argsort of
+# that key finds the rows whose (sensor, timestamp) occurs more than once. Only those candidate
+# rows (usually a small fraction) are resolved further, by value or by recency.
+# Factorizing object sensor ids is about half the cost of the mask, so load_data_from_s3 parses
+# sensor_id as category and the parser's codes are reused here.
+#
+# Two policies:
+#   - keep='first': drop exact repeats of (sensor, timestamp, value), keeping the first row
+#     (the semantics of the previous drop_duplicates call).
+#   - keep='latest': one row per (sensor, timestamp), the most recent delivery, for re-delivered
+#     or corrected data. "Most recent" is the largest `version_column` value (e.g. an ingestion
+#     time) when given, else the last row in input order.
+
+DEDUP_POLICIES = ('first', 'latest')
+
+
+def _sensor_codes(sensor_ids):
+    """Integer codes for sensor ids; categorical columns reuse their existing codes."""
+    if sensor_ids is None:
+        return None
+    if isinstance(getattr(sensor_ids, 'dtype', None), pd.CategoricalDtype):
+        return np.asarray(sensor_ids.cat.codes if isinstance(sensor_ids, pd.Series) else sensor_ids.codes, dtype=np.int64)
+    return pd.factorize(sensor_ids)[0].astype(np.int64)
+
+
+def _coarsest_resolution(ts):
+    """Divides int64 ns timestamps by the largest unit (s, ms, us) they are all multiples of."""
+    for unit in (1_000_000_000, 1_000_000, 1_000):
+        if not (ts % unit).any():
+            return ts // unit
+    return ts
+
+
+def composite_keys(timestamps, sensor_ids=None):
+    """
+    One non-negative int64 key per row, equal exactly when (sensor, timestamp) are equal.
+    Uses codes * span + (t - t_min) at the coarsest exact time resolution; if that could still
+    overflow int64, timestamps are replaced by their dense rank first.
+    """
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype == np.int64:
+        ts = timestamps
+    else:
+        ts = pd.DatetimeIndex(timestamps).as_unit('ns').asi8
+    if len(ts) == 0:
+        return ts.copy()
+    ts = _coarsest_resolution(ts)
+    ts = ts - ts.min()
+    codes = _sensor_codes(sensor_ids)
+    if codes is None:
+        return ts
+    span = int(ts.max()) + 1
+    if (int(codes.max()) + 1) * span < np.iinfo(np.int64).max:
+        return codes * span + ts
+    unique_ts, rank = np.unique(ts, return_inverse=True)
+    return codes * len(unique_ts) + rank.ravel()
+
+
+def _stable_key_order(keys):
+    """
+    Stable argsort of non-negative int64 keys. When key and row position fit in 63 bits together,
+    the position is packed into the low bits and a plain (SIMD) value sort replaces the slower argsort.
+    """
+    n = len(keys)
+    position_bits = max(1, int(n - 1).bit_length())
+    if int(keys.max()).bit_length() + position_bits <= 63:
+        packed = np.sort((keys << position_bits) | np.arange(n, dtype=np.int64))
+        return packed & ((1 << position_bits) - 1), packed >> position_bits
+    order = np.argsort(keys, kind='stable')
+    return order, keys[order]
+
+
+def _canonical_value_bits(values):
+    """Float values as int64 bit patterns, with all NaNs and -0.0 / 0.0 mapped together."""
+    values = np.asarray(values, dtype=np.float64) + 0.0 # -0.0 + 0.0 == 0.0
+    bits = values.view(np.int64).copy()
+    bits[np.isnan(values)] = np.int64(0x7FF8000000000000)
+    return bits
+
+
+def duplicate_mask(timestamps, sensor_ids=None, values=None, keep='first', versions=None):
+    """
+    Returns a boolean array, True for rows to drop.
+
+    :param timestamps: Datetime-like sequence (or int64 epoch ns).
+    :param sensor_ids: Optional sensor ids (object, string or categorical).
+    :param values: For keep='first': the value column that must also match for a row to be a repeat.
+    :param keep: 'first' or 'latest' (see module comment).
+    :param versions: For keep='latest': optional sortable column deciding the most recent row.
+    """
+    if keep not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy: {keep}")
+    keys = composite_keys(timestamps, sensor_ids)
+    n = len(keys)
+    drop = np.zeros(n, dtype=bool)
+    if n < 2:
+        return drop
+
+    # One sort of the composite key; rows in runs of equal keys are the only candidates
+    order, sorted_keys = _stable_key_order(keys)
+    same_as_next = sorted_keys[1:] == sorted_keys[:-1]
+    if not same_as_next.any():
+        return drop
+    in_run = np.zeros(n, dtype=bool)
+    in_run[:-1] |= same_as_next
+    in_run[1:] |= same_as_next
+    candidates = np.sort(order[in_run]) # Input positions, ascending (sorting the few candidates is cheap)
+
+    if keep == 'first':
+        if values is None:
+            group = (keys[candidates],)
+        else:
+            group = (keys[candidates], _canonical_value_bits(np.asarray(values)[candidates]))
+        # Sort candidates by (key[, value], position): the first row of each group is kept
+        sub_order = np.lexsort((candidates,) + tuple(reversed(group)))
+        repeat = np.ones(len(candidates), dtype=bool)
+        repeat[0] = False
+        for column in group:
+            sorted_column = column[sub_order]
+            repeat[1:] &= sorted_column[1:] == sorted_column[:-1]
+        drop[candidates[sub_order[repeat]]] = True
+    else:
+        # Sort candidates by (key, version, position): the last row of each key group is kept
+        sort_columns = (candidates,)
+        if versions is not None:
+            version_values = np.asarray(versions)[candidates]
+            if not np.issubdtype(version_values.dtype, np.number):
+                version_values = pd.factorize(version_values, sort=True)[0]
+            sort_columns += (version_values,)
+        sub_order = np.lexsort(sort_columns + (keys[candidates],))
+        sorted_keys = keys[candidates][sub_order]
+        superseded = np.r_[sorted_keys[1:] == sorted_keys[:-1], False]
+        drop[candidates[sub_order[superseded]]] = True
+    return drop
+
+
+def drop_duplicate_readings(df, keep='first', timestamp_column='timestamp', sensor_column='sensor_id',
+                            value_column='value', version_column=None):
+    """
+    Drops duplicate readings from a DataFrame, preserving input order.
+    `timestamp_column=None` uses the (DatetimeIndex) index.
+
+    :return: The DataFrame without duplicates (the same object if there were none).
+    """
+    if df.empty:
+        return df
+    timestamps = df.index if timestamp_column is None else df[timestamp_column]
+    drop = duplicate_mask(
+        timestamps,
+        sensor_ids=df[sensor_column] if sensor_column in df.columns else None,
+        values=df[value_column].to_numpy() if keep == 'first' and value_column in df.columns else None,
+        keep=keep,
+        versions=df[version_column].to_numpy() if version_column else None,
+    )
+    if not drop.any():
+        return df
+    print(f"Removed {int(drop.sum())} duplicate readings (keep={keep}).")
+    return df[~drop]
+
+
+def _make_benchmark_frame(n_rows, n_sensors=1000, duplicate_fraction=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    n_unique = int(n_rows * (1 - duplicate_fraction))
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2023-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 86400 * 365, n_unique), unit='s'),
+        'sensor_id': pd.Series([f"temp_{i:04d}" for i in range(n_sensors)]).to_numpy()[rng.integers(0, n_sensors, n_unique)],
+        'value_interpolated': np.round(22.0 + rng.normal(0, 0.5, n_unique), 2),
+    })
+    redelivered = df.iloc[rng.integers(0, n_unique, n_rows - n_unique)].copy()
+    corrected = rng.random(len(redelivered)) < 0.5 # Half the re-deliveries carry a corrected value
+    redelivered.loc[corrected, 'value_interpolated'] += 0.1
+    return pd.concat([df, redelivered], ignore_index=True)
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Fast Dedup ---")
+    sample = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2023-01-01T00:04:00Z'] * 3 + ['2023-01-01T00:05:00Z']),
+        'sensor_id': ['temp_001', 'temp_001', 'temp_001', 'temp_001'],
+        'value': [22.6, 22.6, 22.9, 22.7],
+        'ingested_at': [1, 2, 3, 1],
+    })
+    print(drop_duplicate_readings(sample).to_string())
+    print(drop_duplicate_readings(sample, keep='latest', version_column='ingested_at').to_string())
+
+    if "--benchmark" in sys.argv:
+        n_rows = int(sys.argv[sys.argv.index('--rows') + 1]) if '--rows' in sys.argv else 10_000_000
+        frame = _make_benchmark_frame(n_rows)
+        subset = ['timestamp', 'sensor_id', 'value_interpolated']
+        for label, bench_frame in (('object ids', frame), ('categorical ids, as load_data_from_s3 reads them', frame.assign(sensor_id=frame['sensor_id'].astype('category')))):
+            start = time.perf_counter()
+            baseline_mask = bench_frame.duplicated(subset=subset).to_numpy()
+            baseline_mask_s = time.perf_counter() - start
+            start = time.perf_counter()
+            fast_mask = duplicate_mask(bench_frame['timestamp'], bench_frame['sensor_id'], bench_frame['value_interpolated'].to_numpy())
+            fast_mask_s = time.perf_counter() - start
+            start = time.perf_counter()
+            bench_frame.drop_duplicates(subset=subset)
+            baseline_s = time.perf_counter() - start
+            start = time.perf_counter()
+            drop_duplicate_readings(bench_frame, value_column='value_interpolated')
+            fast_s = time.perf_counter() - start
+            print(f"{n_rows:,} rows, {label}: duplicate mask {baseline_mask_s:.2f}s -> {fast_mask_s:.2f}s "
+                  f"({baseline_mask_s / fast_mask_s:.1f}x, identical: {np.array_equal(baseline_mask, fast_mask)}); "
+                  f"with row filtering {baseline_s:.2f}s -> {fast_s:.2f}s ({baseline_s / fast_s:.1f}x)")
+        start = time.perf_counter()
+        latest = drop_duplicate_readings(frame, keep='latest')
+        print(f"keep='latest': {len(latest):,} rows in {time.perf_counter() - start:.2f}s")
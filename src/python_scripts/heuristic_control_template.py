@@ -1,19 +1,30 @@
 
 import json
+import os
+import time
+
+from rules_registry import CompiledRulePlan, RulesRegistry, rule_store_for
+from sensor_windows import SensorWindows
 
 # This script serves as a template for developing heuristic control algorithms.
 # It would typically be executed within an AWS Lambda environment.
 
-# Conceptual: Load rules from S3 (passed via environment variable or event)
-# s3_client = boto3.client('s3')
-# rules_bucket = os.environ.get('RULES_BUCKET')
-# rules_key = os.environ.get('RULES_KEY', 'heuristic_rules_v1.json')
-# try:
-#     response = s3_client.get_object(Bucket=rules_bucket, Key=rules_key)
-#     rules_config = json.loads(response['Body'].read().decode('utf-8'))
-# except Exception as e:
-#     print(f"Error loading rules from S3: {e}")
-#     rules_config = {"rules": []} # Default to no rules if loading fails
+# Rules are loaded from S3 (bucket/key via environment variable or event) through a container-wide
+# RulesRegistry: the rule set is compiled once and only recompiled when its ETag changes.
+RULES_BUCKET = os.environ.get('RULES_BUCKET', 'mock-hvac-rules-bucket')
+RULES_KEY = os.environ.get('RULES_KEY', 'heuristic_rules_v1.json')
+RULES_CHECK_INTERVAL_SECONDS = float(os.environ.get('RULES_CHECK_INTERVAL_SECONDS', '30'))
+
+_rules_registry = None
+_zone_windows = {} # zone_id -> SensorWindows for windowed conditions (kept while the container is warm)
+
+
+def get_rules_registry():
+    """Returns the container-wide RulesRegistry; warm invocations reuse its compiled plans."""
+    global _rules_registry
+    if _rules_registry is None:
+        _rules_registry = RulesRegistry(rule_store_for(RULES_BUCKET), check_interval_seconds=RULES_CHECK_INTERVAL_SECONDS)
+    return _rules_registry
 
 def evaluate_condition(condition_value, operator, sensor_value):
     """Evaluates a single condition."""
@@ -32,7 +43,7 @@ def heuristic_control_algorithm(sensor_inputs, rules_config):
 
     :param sensor_inputs: A dictionary of current sensor readings.
                           Example: {'temperature': 26.5, 'occupancy': 1, 'co2_level': 850}
-    :param rules_config: A dictionary containing the set of rules.
+    :param rules_config: A dictionary containing the set of rules, or a CompiledRulePlan from the rules registry.
                          Example: {
                              "rules": [
                                  {
@@ -55,6 +66,15 @@ def heuristic_control_algorithm(sensor_inputs, rules_config):
              Returns {"action_id": "NO_ACTION", "parameters": {}} if no rule is matched.
     """
     print(f"Input sensor data: {sensor_inputs}")
+    if isinstance(rules_config, CompiledRulePlan):
+        # Pre-validated and priority-sorted: no per-call parsing
+        action = rules_config.evaluate(sensor_inputs)
+        rule_id = action.pop("rule_id", None)
+        if rule_id is None:
+            print("No heuristic rule matched.")
+        else:
+            print(f"Rule '{rule_id}' (plan {rules_config.content_hash[:12]}) matched. Action: {action['action_id']}, Params: {action['parameters']}")
+        return action
     print(f"Using rules configuration: {json.dumps(rules_config, indent=2)}")
 
     # Sort rules by priority (lower number = higher priority) if priority key exists
@@ -71,6 +91,11 @@ def heuristic_control_algorithm(sensor_inputs, rules_config):
             operator = cond.get("operator")
             condition_value = cond.get("value")
 
+            if "aggregate" in cond:
+                print(f"Warning: Windowed condition on '{sensor_name}' in rule '{rule.get('id', 'N/A')}' needs a compiled plan (see lambda_handler). Treating as not met.")
+                conditions_met_flags.append(False)
+                continue
+
             if sensor_name not in sensor_inputs:
                 print(f"Warning: Sensor '{sensor_name}' for rule '{rule.get('id', 'N/A')}' not in inputs. Skipping condition.")
                 conditions_met_flags.append(False) # Treat missing sensor as condition not met
@@ -96,9 +121,28 @@ def heuristic_control_algorithm(sensor_inputs, rules_config):
     print("No heuristic rule matched.")
     return {"action_id": "NO_ACTION", "parameters": {}}
 
+def lambda_handler(event, context):
+    """
+    Lambda entry point. Event: {"sensor_inputs": {...}, "zone_id": ..., "timestamp": epoch seconds or
+    ISO-8601 (defaults to now), "rules_key": optional override of RULES_KEY}.
+    Windowed conditions ("held", "mean", "slope") are fed from per-zone ring buffers, so their
+    history is the readings this container has seen for the zone.
+    """
+    plan = get_rules_registry().get_plan(event.get("rules_key", RULES_KEY))
+    sensor_inputs = event.get("sensor_inputs", {})
+    if plan.windows:
+        windows = _zone_windows.get(event.get("zone_id"))
+        if windows is None:
+            windows = _zone_windows[event.get("zone_id")] = SensorWindows()
+        sensor_inputs = windows.update(plan, sensor_inputs, event.get("timestamp", time.time()))
+    return heuristic_control_algorithm(sensor_inputs, plan)
+
 # --- Example Usage (for local testing in IDE / Lambda test event) ---
 # This part would be replaced by actual event data in a Lambda.
 if __name__ == "__main__":
+    from aws_clients import use_local_stand_ins
+
+    use_local_stand_ins() # Rule sets served from RULES_LOCAL_DIR instead of S3
     mock_sensor_readings = {
         "temperature": 26.0,  # Celsius
         "occupancy": 1,       # Binary (1 for occupied, 0 for empty)
@@ -150,6 +194,20 @@ if __name__ == "__main__":
     determined_action = heuristic_control_algorithm(mock_sensor_readings, mock_rules_definition)
     print(f"\nFinal Determined Action: {determined_action}")
 
+    # Same rules through the registry, as a warm Lambda container would evaluate them
+    registry = get_rules_registry()
+    registry.store.put(RULES_KEY, mock_rules_definition)
+    registry_action = lambda_handler({"sensor_inputs": mock_sensor_readings}, None)
+    print(f"Registry Determined Action: {registry_action} (matches: {registry_action == determined_action})")
+
+    # Windowed condition: cooling only once the zone has been above 25 C for 10 minutes
+    mock_rules_definition["rules"][0]["conditions"][0] = {"sensor": "temperature", "aggregate": "held", "operator": ">", "value": 25.0, "window_seconds": 600}
+    registry.store.put("heuristic_rules_windowed.json", mock_rules_definition)
+    for minute in (0, 5, 10):
+        windowed_action = lambda_handler({"sensor_inputs": mock_sensor_readings, "zone_id": "zone_a", "rules_key": "heuristic_rules_windowed.json",
+                                          "timestamp": 1_700_000_000 + 60 * minute}, None)
+        print(f"Minute {minute}: {windowed_action['action_id']}")
+
     # Conceptual: In Lambda, you would then publish this action
     # iot_client = boto3.client('iot-data', region_name='your-region')
     # iot_client.publish(
@@ -1,12 +1,43 @@
-import boto3
+import heapq
+import json
+import operator
+import sys
 from datetime import datetime, timedelta
+from itertools import islice
 
-# --- AWS Client Initialization (Conceptual) ---
-# cloudwatch_client = boto3.client('cloudwatch')
+# --- AWS Client Initialization (shared per container, see aws_clients.py) ---
+# from aws_clients import get_client # Needed by the commented-out get_client(...) calls below
 
 # This script provides utility functions that might be used by other Lambdas
 # or backend services for fetching, parsing, and processing monitoring data.
 
+def _order_points(timestamps, values):
+    """
+    Returns (timestamps, values) in ascending time order.
+    CloudWatch returns TimestampDescending by default, so already-ordered input is detected with a
+    linear scan and reversed; only genuinely unordered input falls back to a sort.
+    """
+    if len(timestamps) < 2 or all(map(operator.le, timestamps, islice(timestamps, 1, None))):
+        return timestamps, values
+    if all(map(operator.ge, timestamps, islice(timestamps, 1, None))):
+        return timestamps[::-1], values[::-1]
+    order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+    return [timestamps[i] for i in order], [values[i] for i in order]
+
+
+def _format_timestamps(timestamps, iso_cache):
+    """Converts datetimes to ISO strings, formatting each distinct period only once per call."""
+    formatted = []
+    append = formatted.append
+    cached = iso_cache.get
+    for ts in timestamps:
+        iso = cached(ts)
+        if iso is None:
+            iso = iso_cache[ts] = ts.isoformat() if isinstance(ts, datetime) else ts
+        append(iso)
+    return formatted
+
+
 def format_cloudwatch_metrics_for_dashboard(metric_data_results, function_name_or_id="resource"):
     """
     Parses the response from CloudWatch get_metric_data and formats it
@@ -21,23 +52,55 @@ def format_cloudwatch_metrics_for_dashboard(metric_data_results, function_name_o
              }
     """
     formatted_metrics = {}
+    iso_cache = {} # Metrics of one query share periods, so each timestamp is formatted once
     for result in metric_data_results:
         metric_id = result['Id'] # e.g., 'invocations', 'errors'
-        timestamps = result.get('Timestamps', [])
-        values = result.get('Values', [])
-        
-        # Sort by timestamp just in case they are not ordered
-        sorted_points = sorted(zip(timestamps, values), key=lambda x: x[0])
-        
-        # Convert datetime objects to ISO strings if they are not already
-        formatted_points = [(ts.isoformat() if isinstance(ts, datetime) else ts, val) for ts, val in sorted_points]
-        
-        formatted_metrics[metric_id] = formatted_points
+        timestamps, values = _order_points(result.get('Timestamps', []), result.get('Values', []))
+        formatted_metrics[metric_id] = list(zip(_format_timestamps(timestamps, iso_cache), values))
         
     print(f"Formatted CloudWatch metrics for: {function_name_or_id}")
     return formatted_metrics
 
 
+def format_cloudwatch_metrics_as_columns(metric_data_results, function_name_or_id="resource"):
+    """
+    Formats get_metric_data results as aligned columns: one shared ascending timestamp axis plus
+    one value array per metric (None where a metric has no datapoint). This is the layout chart
+    components consume directly.
+
+    When all metrics share the same timestamps (the usual case for one query and period), the axis
+    is reused as-is; otherwise the already-ordered series are k-way merged without a global sort.
+
+    :return: {'timestamps': [iso, ...], 'series': {metric_id: [value_or_None, ...]}}
+    """
+    ordered = {}
+    for result in metric_data_results:
+        ordered[result['Id']] = _order_points(result.get('Timestamps', []), result.get('Values', []))
+    if not ordered:
+        return {"timestamps": [], "series": {}}
+
+    axes = [timestamps for timestamps, _ in ordered.values()]
+    first_axis = axes[0]
+    if all(axis is first_axis or axis == first_axis for axis in axes[1:]):
+        axis = list(first_axis)
+        series = {metric_id: list(values) for metric_id, (_, values) in ordered.items()}
+    else:
+        axis = []
+        for ts in heapq.merge(*axes):
+            if not axis or axis[-1] != ts:
+                axis.append(ts)
+        position = {ts: i for i, ts in enumerate(axis)}
+        series = {}
+        for metric_id, (timestamps, values) in ordered.items():
+            column = [None] * len(axis)
+            for ts, val in zip(timestamps, values):
+                column[position[ts]] = val
+            series[metric_id] = column
+
+    print(f"Formatted CloudWatch metric columns for: {function_name_or_id}")
+    return {"timestamps": _format_timestamps(axis, {}), "series": series}
+
+
 def get_recent_cloudwatch_logs(log_group_name, minutes_ago=60, filter_pattern="", limit=50):
     """
     Fetches recent logs from a specific CloudWatch Log Group.
@@ -48,7 +111,7 @@ def get_recent_cloudwatch_logs(log_group_name, minutes_ago=60, filter_pattern=""
     :param limit: Maximum number of log events to return.
     :return: A list of log event messages.
     """
-    # logs_client = boto3.client('logs')
+    # logs_client = get_client('logs')
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(minutes=minutes_ago)
     
@@ -90,7 +153,7 @@ def create_sns_alert(topic_arn, subject, message_detail, severity="INFO"):
     :param message_detail: Detailed message body for the alert.
     :param severity: Severity level (e.g., INFO, WARNING, CRITICAL).
     """
-    # sns_client = boto3.client('sns')
+    # sns_client = get_client('sns')
     full_message = f"Severity: {severity}\n\n{message_detail}"
     print(f"Publishing alert to SNS Topic {topic_arn}:\nSubject: {subject}\nMessage: {full_message[:200]}...")
     # try:
@@ -148,5 +211,26 @@ if __name__ == "__main__":
     formatted = format_cloudwatch_metrics_for_dashboard(mock_cw_response, "myTestFunction")
     print("\nFormatted Metrics Example:")
     print(json.dumps(formatted, indent=2))
+    print(json.dumps(format_cloudwatch_metrics_as_columns(mock_cw_response, "myTestFunction"), indent=2))
+
+    # 4. Formatter benchmark: 100 metrics x 10k points in CloudWatch's default TimestampDescending order
+    if "--benchmark" in sys.argv:
+        import time
+
+        def legacy_format(metric_data_results):
+            formatted_metrics = {}
+            for result in metric_data_results:
+                sorted_points = sorted(zip(result.get('Timestamps', []), result.get('Values', [])), key=lambda x: x[0])
+                formatted_metrics[result['Id']] = [(ts.isoformat() if isinstance(ts, datetime) else ts, val) for ts, val in sorted_points]
+            return formatted_metrics
+
+        bench_timestamps = [datetime(2023, 1, 1) + timedelta(minutes=5 * i) for i in range(10000)][::-1]
+        bench_response = [{'Id': f'metric_{m}', 'Timestamps': bench_timestamps, 'Values': [float(i) for i in range(10000)]} for m in range(100)]
+        for label, formatter in [("legacy sort + isoformat", legacy_format),
+                                 ("format_cloudwatch_metrics_for_dashboard", format_cloudwatch_metrics_for_dashboard),
+                                 ("format_cloudwatch_metrics_as_columns", format_cloudwatch_metrics_as_columns)]:
+            start = time.perf_counter()
+            formatter(bench_response)
+            print(f"  {label}: {(time.perf_counter() - start) * 1000:.0f} ms")
 
     print("\n--- End of Conceptual Tests ---")
@@ -1,11 +1,13 @@
-import boto3
 import json
 import os
+import random
 from datetime import datetime, timedelta
 
-# --- AWS Client Initialization (Conceptual - credentials managed by Lambda execution role) ---
-# cloudwatch_client = boto3.client('cloudwatch')
-# s3_client = boto3.client('s3') # For storing aggregated metrics
+from metric_quantile_sketches import LatencySketchStore, build_period_sketches
+
+# --- AWS Client Initialization (shared per container, see aws_clients.py) ---
+# from aws_clients import get_client # Needed by the commented-out get_client(...) calls below
+# Services used: 'cloudwatch' for metrics, 's3' for storing aggregated metrics, 'logs' for raw durations
 
 # --- Configuration ---
 # These would typically be passed as environment variables
@@ -31,16 +33,17 @@ SAGEMAKER_ENDPOINTS_TO_MONITOR = [
 def get_lambda_metrics(function_name, start_time, end_time, period_seconds=300):
     """
     Fetches key metrics for a specific Lambda function from CloudWatch.
-    Metrics: Invocations, Errors, Duration (Average, p90, Max), ConcurrentExecutions.
+    Metrics: Invocations, Errors, Duration (Average, p90, Max), Throttles, ConcurrentExecutions.
     """
     print(f"Fetching CloudWatch metrics for Lambda: {function_name} from {start_time} to {end_time}")
-    # response = cloudwatch_client.get_metric_data(
+    # response = get_client('cloudwatch').get_metric_data(
     #     MetricDataQueries=[
     #         {'Id': 'invocations', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_LAMBDA, 'MetricName': 'Invocations', 'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]}, 'Period': period_seconds, 'Stat': 'Sum'}, 'ReturnData': True},
     #         {'Id': 'errors', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_LAMBDA, 'MetricName': 'Errors', 'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]}, 'Period': period_seconds, 'Stat': 'Sum'}, 'ReturnData': True},
     #         {'Id': 'duration_avg', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_LAMBDA, 'MetricName': 'Duration', 'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]}, 'Period': period_seconds, 'Stat': 'Average'}, 'ReturnData': True},
     #         {'Id': 'duration_p90', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_LAMBDA, 'MetricName': 'Duration', 'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]}, 'Period': period_seconds, 'Stat': 'p90'}, 'ReturnData': True},
-    #         # Add more metrics like ConcurrentExecutions, Throttles if needed
+    #         {'Id': 'throttles', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_LAMBDA, 'MetricName': 'Throttles', 'Dimensions': [{'Name': 'FunctionName', 'Value': function_name}]}, 'Period': period_seconds, 'Stat': 'Sum'}, 'ReturnData': True},
+    #         # Add more metrics like ConcurrentExecutions if needed
     #     ],
     #     StartTime=start_time,
     #     EndTime=end_time,
@@ -58,16 +61,17 @@ def get_lambda_metrics(function_name, start_time, end_time, period_seconds=300):
         'errors': {'Timestamps': timestamps, 'Values': [max(0, i % 3 -1) for i in range(12)]}, # some errors
         'duration_avg': {'Timestamps': timestamps, 'Values': [100 + i*10 for i in range(12)]},
         'duration_p90': {'Timestamps': timestamps, 'Values': [150 + i*12 for i in range(12)]},
+        'throttles': {'Timestamps': timestamps, 'Values': [0 for i in range(12)]},
     }
 
-def get_sagemaker_endpoint_metrics(endpoint_name, variant_name='AllTraffic', start_time, end_time, period_seconds=300):
+def get_sagemaker_endpoint_metrics(endpoint_name, start_time, end_time, variant_name='AllTraffic', period_seconds=300):
     """
     Fetches key metrics for a SageMaker endpoint from CloudWatch.
     Metrics: Invocations, ModelLatency, OverheadLatency, Errors (4xx, 5xx).
     """
     print(f"Fetching CloudWatch metrics for SageMaker Endpoint: {endpoint_name}, Variant: {variant_name}")
     # dimensions = [{'Name': 'EndpointName', 'Value': endpoint_name}, {'Name': 'VariantName', 'Value': variant_name}]
-    # response = cloudwatch_client.get_metric_data(
+    # response = get_client('cloudwatch').get_metric_data(
     #     MetricDataQueries=[
     #         {'Id': 'invocations', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_SAGEMAKER, 'MetricName': 'Invocations', 'Dimensions': dimensions}, 'Period': period_seconds, 'Stat': 'Sum'}, 'ReturnData': True},
     #         {'Id': 'model_latency_p90', 'MetricStat': {'Metric': {'Namespace': METRICS_NAMESPACE_SAGEMAKER, 'MetricName': 'ModelLatency', 'Dimensions': dimensions}, 'Period': period_seconds, 'Stat': 'p90'}, 'ReturnData': True},
@@ -89,6 +93,43 @@ def get_sagemaker_endpoint_metrics(endpoint_name, variant_name='AllTraffic', sta
         'overhead_latency_p50': {'Timestamps': timestamps, 'Values': [10 + i for i in range(12)]},
     }
 
+def get_lambda_duration_samples(function_name, start_time, end_time):
+    """
+    Fetches raw per-invocation durations for a Lambda function as (timestamp, duration_ms) pairs.
+    These feed the mergeable latency sketches; CloudWatch metric percentiles cannot be re-aggregated.
+    """
+    # Raw durations come from the REPORT lines Lambda writes to its log group, e.g. via Logs Insights:
+    # logs_client = get_client('logs')
+    # query_id = logs_client.start_query(
+    #     logGroupName=f"/aws/lambda/{function_name}",
+    #     startTime=int(start_time.timestamp()),
+    #     endTime=int(end_time.timestamp()),
+    #     queryString='filter @type = "REPORT" | fields @timestamp, @duration'
+    # )['queryId']
+    # ... poll logs_client.get_query_results(queryId=query_id) until status is 'Complete' ...
+    # return [(row['@timestamp'], float(row['@duration'])) for row in rows]
+
+    # Mocked response for IDE simulation: ~one invocation every 30 seconds
+    rng = random.Random(function_name)
+    total_seconds = int((end_time - start_time).total_seconds())
+    return [(start_time + timedelta(seconds=s), rng.lognormvariate(4.8, 0.4)) for s in range(0, total_seconds, 30)]
+
+def get_sagemaker_model_latency_samples(endpoint_name, start_time, end_time, variant_name='AllTraffic'):
+    """
+    Fetches raw per-request model latencies for an endpoint variant as (timestamp, latency_ms) pairs.
+    """
+    # Conceptually sourced from the endpoint's invocation logs or data-capture records in S3,
+    # which carry one entry (with timing) per request.
+
+    # Mocked response for IDE simulation
+    rng = random.Random(f"{endpoint_name}/{variant_name}")
+    total_seconds = int((end_time - start_time).total_seconds())
+    return [(start_time + timedelta(seconds=s), rng.lognormvariate(4.4, 0.3)) for s in range(0, total_seconds, 10)]
+
+def build_latency_sketches(samples, period_seconds=300):
+    """Turns raw latency samples into JSON-ready {period_start_iso: sketch_dict} for storage."""
+    return {period_start: sketch.to_dict() for period_start, sketch in build_period_sketches(samples, period_seconds).items()}
+
 # Conceptual: Functions to get Athena query metrics (e.g., from CloudTrail logs or by parsing query history)
 # Conceptual: Functions to get Data Pipeline metrics (e.g., S3 object counts, Lambda success rates for preprocessing)
 
@@ -101,12 +142,17 @@ def aggregate_and_store_metrics(start_time, end_time):
     all_metrics_data = {
         "lambda_functions": {},
         "sagemaker_endpoints": {},
+        # Mergeable per-period latency sketches (see metric_quantile_sketches.LatencySketchStore)
+        "latency_sketches": {"lambda_functions": {}, "sagemaker_endpoints": {}},
         "timestamp_range": { "start": start_time.isoformat(), "end": end_time.isoformat() }
     }
 
     for func_name in LAMBDA_FUNCTIONS_TO_MONITOR:
         try:
             all_metrics_data["lambda_functions"][func_name] = get_lambda_metrics(func_name, start_time, end_time)
+            all_metrics_data["latency_sketches"]["lambda_functions"][func_name] = {
+                "duration": build_latency_sketches(get_lambda_duration_samples(func_name, start_time, end_time))
+            }
         except Exception as e:
             print(f"Error fetching metrics for Lambda {func_name}: {e}")
             all_metrics_data["lambda_functions"][func_name] = {"error": str(e)}
@@ -114,6 +160,9 @@ def aggregate_and_store_metrics(start_time, end_time):
     for endpoint_name in SAGEMAKER_ENDPOINTS_TO_MONITOR:
         try:
             all_metrics_data["sagemaker_endpoints"][endpoint_name] = get_sagemaker_endpoint_metrics(endpoint_name, start_time=start_time, end_time=end_time)
+            all_metrics_data["latency_sketches"]["sagemaker_endpoints"][endpoint_name] = {
+                "model_latency": build_latency_sketches(get_sagemaker_model_latency_samples(endpoint_name, start_time, end_time))
+            }
         except Exception as e:
             print(f"Error fetching metrics for SageMaker Endpoint {endpoint_name}: {e}")
             all_metrics_data["sagemaker_endpoints"][endpoint_name] = {"error": str(e)}
@@ -121,7 +170,7 @@ def aggregate_and_store_metrics(start_time, end_time):
     # Store aggregated_data in S3
     # output_key = f"aggregated_metrics/{end_time.strftime('%Y/%m/%d/%H%M%S')}_metrics.json"
     # try:
-    #     s3_client.put_object(
+    #     get_client('s3').put_object(
     #         Bucket=METRICS_S3_BUCKET,
     #         Key=output_key,
     #         Body=json.dumps(all_metrics_data, default=str), # Use default=str for datetime
@@ -184,6 +233,12 @@ if __name__ == "__main__":
         "sagemaker_sample": list(result_data["sagemaker_endpoints"].keys())[0] if result_data["sagemaker_endpoints"] else "N/A",
         "time_range": result_data["timestamp_range"]
     }, indent=2, default=str))
+
+    # Percentiles over any group of resources, re-aggregated from the stored sketches
+    sketch_store = LatencySketchStore()
+    sketch_store.load_aggregated_metrics(json.loads(json.dumps(result_data, default=str)))
+    print("\n--- Duration percentiles across all monitored Lambdas (from sketches) ---")
+    print(json.dumps(sketch_store.quantiles(LAMBDA_FUNCTIONS_TO_MONITOR, 'duration'), indent=2))
     
     # To test the handler directly:
     # mock_lambda_event = {}
@@ -0,0 +1,212 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Memory-lean variant of s3_data_processor_template.preprocess_timeseries_data.
+# The standard path builds a chain of intermediate DataFrames (set_index, sort_index,
+# reset_index().drop_duplicates().set_index(), boolean-mask copies, reset_index) and adds several
+# float64 columns, so peak memory is several times the input. Here the same steps run on plain
+# NumPy columns: one sort permutation, float32 values, a single boolean `keep` mask narrowed in
+# place by each stage, and one final DataFrame built with a single take() per column.
+#
+# Differences from the standard path: values are float32 (about 7 significant digits, ample for
+# sensor readings), so duplicate detection compares float32 values.
+
+DEFAULT_ROLLING_WINDOW = '5min'
+VALUE_DTYPE = np.float32
+
+
+def _linear_fill(values):
+    """
+    Fills NaNs in place by linear interpolation over row position, holding the first/last valid
+    value at the edges (same as interpolate(method='linear') followed by bfill/ffill).
+    """
+    missing = np.isnan(values)
+    if missing.any() and not missing.all():
+        positions = np.flatnonzero(~missing)
+        values[missing] = np.interp(np.flatnonzero(missing), positions, values[positions])
+    return values
+
+
+def _duplicate_mask(timestamps, sensor_codes, values, keep):
+    """
+    Marks rows (among `keep`) repeating an earlier (timestamp, sensor, value), keeping the first.
+    Sensor code and float32 value bits are packed into one int64, so a single lexsort finds them.
+    """
+    rows = np.flatnonzero(keep)
+    packed = (sensor_codes[rows].astype(np.int64) << 32) | (values[rows].view(np.uint32).astype(np.int64))
+    order = np.lexsort((packed, timestamps[rows])) # Stable: the first occurrence sorts first
+    ts_sorted, packed_sorted = timestamps[rows][order], packed[order]
+    repeats = np.zeros(len(rows), dtype=bool)
+    repeats[1:] = (ts_sorted[1:] == ts_sorted[:-1]) & (packed_sorted[1:] == packed_sorted[:-1])
+    duplicate = np.zeros(len(keep), dtype=bool)
+    duplicate[rows[order[repeats]]] = True
+    return duplicate
+
+
+def _time_rolling_mean(timestamps, values, window_ns):
+    """Mean over the time window (t - window, t] for each row of an ascending timestamp array."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    left = np.searchsorted(timestamps, timestamps - window_ns, side='right')
+    right = np.arange(1, len(values) + 1)
+    return ((cumulative[right] - cumulative[left]) / (right - left)).astype(VALUE_DTYPE)
+
+
+def preprocess_timeseries_lean(df, outlier_detector=None, rolling_window=DEFAULT_ROLLING_WINDOW, dedup_policy='first'):
+    """
+    Same steps and output columns as preprocess_timeseries_data, with a fraction of the peak memory.
+    The input frame is only read, never modified.
+
+    :param outlier_detector: Optional StreamingOutlierDetector replacing the 3-sigma rule.
+    :param rolling_window: Time window of value_rolling_avg (e.g. '5min').
+    :param dedup_policy: 'first' (drop exact repeats) or 'latest' (last delivered per sensor and timestamp).
+    :return: DataFrame with timestamp, the input columns, value_interpolated, value_rolling_avg and
+             value_normalized (float32).
+    """
+    if df.empty:
+        print("Input DataFrame is empty. Skipping preprocessing.")
+        return df
+    if 'timestamp' not in df.columns:
+        raise ValueError("DataFrame must contain a 'timestamp' column.")
+    if 'value' not in df.columns:
+        raise ValueError("DataFrame must contain a 'value' column.")
+
+    timestamps = pd.to_datetime(df['timestamp'], errors='coerce')
+    tz = getattr(timestamps.dt, 'tz', None)
+    ts = pd.DatetimeIndex(timestamps).as_unit('ns').asi8 # int64 view, NaT as int64 min
+    valid_ts = ~timestamps.isna().to_numpy()
+    del timestamps
+
+    # One stable sort by time over the rows with a valid timestamp
+    order = np.flatnonzero(valid_ts)
+    order = order[np.argsort(ts[order], kind='stable')]
+    ts = ts[order]
+    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=VALUE_DTYPE)[order]
+    raw_values = values.copy() # The original 'value' column (with its NaNs) is part of the output
+    _linear_fill(values)
+
+    keep = np.ones(len(order), dtype=bool)
+    if 'sensor_id' in df.columns:
+        sensor_codes = pd.factorize(df['sensor_id'])[0][order].astype(np.int32)
+    else:
+        sensor_codes = np.zeros(len(order), dtype=np.int32)
+    if dedup_policy == 'latest':
+        from fast_dedup import duplicate_mask
+        keep &= ~duplicate_mask(ts, sensor_codes, keep='latest')
+    else:
+        keep &= ~_duplicate_mask(ts, sensor_codes, values, keep)
+
+    # Outlier removal (streaming per-sensor detector, or 3-sigma rule on interpolated values)
+    kept = np.flatnonzero(keep)
+    if outlier_detector is not None:
+        sensor_ids = df['sensor_id'].to_numpy()[order[kept]].tolist() if 'sensor_id' in df.columns else None
+        flags = np.asarray(outlier_detector.outlier_mask(sensor_ids, (ts[kept] // 1_000_000).tolist(),
+                                                         values[kept].tolist()), dtype=bool)
+        keep[kept[flags]] = False
+    elif len(kept) > 1:
+        kept_values = values[kept]
+        std = kept_values.std(dtype=np.float64, ddof=1)
+        if std != 0:
+            mean = kept_values.mean(dtype=np.float64)
+            keep[kept[np.abs(kept_values - mean) > 3 * std]] = False
+        del kept_values
+
+    kept = np.flatnonzero(keep)
+    del keep
+    kept_ts, kept_values = ts[kept], values[kept]
+    if len(kept) == 0:
+        # Same columns and dtypes as a non-empty result, just no rows
+        print("DataFrame is empty after outlier removal. No data to process further.")
+        rolling = normalized = np.empty(0, dtype=VALUE_DTYPE)
+    else:
+        rolling = _time_rolling_mean(kept_ts, kept_values, pd.Timedelta(rolling_window).value)
+        value_min, value_range = kept_values.min(), np.ptp(kept_values)
+        normalized = (kept_values - value_min) / value_range if value_range > 0 else np.zeros(len(kept), dtype=VALUE_DTYPE)
+
+    # Single materialization: every output column is one take() from the input or one array
+    source_rows = order[kept]
+    out_timestamps = pd.DatetimeIndex(kept_ts)
+    if tz is not None:
+        out_timestamps = out_timestamps.tz_localize('UTC').tz_convert(tz)
+    columns = {'timestamp': out_timestamps}
+    for column in df.columns:
+        if column == 'timestamp':
+            continue
+        columns[column] = raw_values[kept] if column == 'value' else df[column].to_numpy()[source_rows]
+    columns['value_interpolated'] = kept_values
+    columns['value_rolling_avg'] = rolling
+    columns['value_normalized'] = normalized
+    result = pd.DataFrame(columns, copy=False)
+    if len(result):
+        print(f"Preprocessing complete. {len(result)} rows remaining.")
+    return result
+
+
+def _make_benchmark_frame(n_rows, n_sensors=500, seed=0):
+    """Raw-file-like input: string timestamps are parsed upstream, so this starts from datetimes."""
+    rng = np.random.default_rng(seed)
+    values = 22.0 + rng.normal(0, 0.5, n_rows)
+    values[rng.random(n_rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2023-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 86400 * 30 * 1000, n_rows), unit='ms'),
+        'sensor_id': pd.Series([f"temp_{i:04d}" for i in range(n_sensors)]).to_numpy()[rng.integers(0, n_sensors, n_rows)],
+        'value': values,
+        'unit': 'C',
+        'zone': 'A',
+    })
+
+
+def measure_peak_rss(mode, n_rows):
+    """
+    Runs one preprocessing mode on an `n_rows` frame in a fresh interpreter.
+    Returns {'input_mb', 'peak_mb', 'seconds'}: peak RSS growth over the RSS after building the input.
+    """
+    code = (
+        "import json, resource, time, warnings\n"
+        "warnings.simplefilter('ignore')\n"
+        "import lean_preprocessor as lp\n"
+        "from s3_data_processor_template import preprocess_timeseries_data\n"
+        f"df = lp._make_benchmark_frame({n_rows})\n"
+        "input_mb = df.memory_usage(deep=True).sum() / 2**20\n"
+        "import gc; gc.collect()\n"
+        "def rss_mb():\n"
+        "    return int(open('/proc/self/statm').read().split()[1]) * resource.getpagesize() / 2**20\n"
+        "base_mb = rss_mb()\n"
+        "start = time.perf_counter()\n"
+        f"out = lp.preprocess_timeseries_lean(df) if {mode!r} == 'lean' else preprocess_timeseries_data(df, resample_freq=None, memory_mode='standard')\n"
+        "seconds = time.perf_counter() - start\n"
+        "peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+        "print(json.dumps({'input_mb': input_mb, 'peak_mb': peak_mb - base_mb, 'seconds': seconds}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import warnings
+    warnings.simplefilter('ignore', FutureWarning)
+    from s3_data_processor_template import preprocess_timeseries_data
+
+    print("--- Memory-Lean Preprocessing ---")
+    sample = _make_benchmark_frame(20000, n_sensors=20)
+    standard = preprocess_timeseries_data(sample.copy(), resample_freq=None, memory_mode='standard')
+    lean = preprocess_timeseries_lean(sample)
+    print(f"Rows: standard {len(standard)}, lean {len(lean)}; columns match: {list(standard.columns) == list(lean.columns)}")
+    for column in ('value_interpolated', 'value_rolling_avg', 'value_normalized'):
+        print(f"  max |standard - lean| {column}: {np.nanmax(np.abs(standard[column].to_numpy() - lean[column].to_numpy())):.2e}")
+
+    if "--memory-benchmark" in sys.argv:
+        for n_rows in (1_000_000, 5_000_000):
+            runs = {mode: measure_peak_rss(mode, n_rows) for mode in ('standard', 'lean')}
+            print(f"{n_rows:>9,} rows (input {runs['lean']['input_mb']:.0f} MB): "
+                  f"standard peak +{runs['standard']['peak_mb']:.0f} MB in {runs['standard']['seconds']:.2f}s, "
+                  f"lean peak +{runs['lean']['peak_mb']:.0f} MB in {runs['lean']['seconds']:.2f}s "
+                  f"({runs['standard']['peak_mb'] / max(runs['lean']['peak_mb'], 1):.1f}x less)")
@@ -0,0 +1,423 @@
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from aws_clients import get_client, using_local_stand_ins
+from feature_pipeline import max_lookback
+from ml_model_template import build_sequences
+
+# Offline stand-in for train_hvac_model_sagemaker: trains a compact model on the local CPU.
+# train_hvac_model_local has the same signature and, like SageMaker, returns a training job
+# identifier and writes <output path>/<job name>/output/model.tar.gz. The archive holds model.json
+# (architecture, preprocessing: base features, feature spec, sequence length and fitted scalers)
+# and weights.npz; load_local_model reads it back for inference (predict_hvac_control_local and
+# the batch scoring job).
+# The model is an MLP over the flattened input window (sequence_length x features), trained with
+# Adam on mini-batches gathered from the strided sequence view (build_sequences), so only one batch
+# is copied at a time. Work is dominated by float32 matrix products; NumPy's BLAS runs them on all
+# cores (`num_threads` caps it when threadpoolctl is installed). Validation MSE drives early
+# stopping; a checkpoint is written after every epoch and a re-run with the same data and
+# hyperparameters resumes from it.
+# Paths: s3:// URIs map to LOCAL_ML_DIR/<bucket>/<key> with local stand-ins (the default), else
+# data is downloaded and artifacts uploaded through the shared S3 client.
+
+LOCAL_ML_DIR = os.environ.get('LOCAL_ML_DIR', os.path.join(tempfile.gettempdir(), 'hvac-ml'))
+MODEL_FORMAT = 'hvac-mlp-v1'
+DEFAULT_HYPERPARAMETERS = {
+    'epochs': 50,
+    'batch_size': 256,
+    'learning_rate': 0.001,
+    'hidden_units': '64,32',
+    'sequence_length': 24,
+    'features': 'temperature,occupancy',
+    'target': 'energy_consumption',
+    'feature_spec': '', # JSON feature_pipeline spec
+    'validation_fraction': 0.2, # Tail of the training data, when there is no validation channel
+    'patience': 5,
+    'min_delta': 1e-5,
+    'num_threads': 0, # 0: all cores
+    'seed': 0,
+}
+
+
+def _resolve(uri):
+    """Local path for an s3:// URI under the stand-ins, the URI itself otherwise."""
+    if uri.startswith('s3://') and using_local_stand_ins():
+        return os.path.join(LOCAL_ML_DIR, *uri[len('s3://'):].rstrip('/').split('/'))
+    return uri
+
+
+def _download(uri):
+    """Local copy of an S3 prefix (real S3) or the resolved local path."""
+    if not uri.startswith('s3://') or using_local_stand_ins():
+        return _resolve(uri)
+    bucket, prefix = uri[len('s3://'):].split('/', 1)
+    target_dir = tempfile.mkdtemp(prefix='hvac-ml-data-')
+    s3 = get_client('s3')
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            path = os.path.join(target_dir, item['Key'].replace('/', '_'))
+            s3.download_file(bucket, item['Key'], path)
+    return target_dir
+
+
+def load_training_frame(uri, timestamp_column='timestamp'):
+    """
+    Wide training table (one column per signal) from a CSV/Parquet file or a prefix of such files,
+    indexed and sorted by timestamp.
+    """
+    path = _download(uri)
+    files = [path] if os.path.isfile(path) else sorted(
+        glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True) + glob.glob(os.path.join(path, '**', '*.csv'), recursive=True))
+    if not files:
+        raise FileNotFoundError(f"No CSV or Parquet training data under {uri}")
+    frames = [pd.read_parquet(file) if file.endswith('.parquet') else pd.read_csv(file) for file in files]
+    df = pd.concat(frames, ignore_index=True)
+    df[timestamp_column] = pd.to_datetime(df[timestamp_column])
+    return df.set_index(timestamp_column).sort_index()
+
+
+def _parse_hyperparameters(hyperparameters):
+    """SageMaker passes hyperparameters as strings; coerce them to the defaults' types."""
+    parsed = dict(DEFAULT_HYPERPARAMETERS)
+    for name, value in (hyperparameters or {}).items():
+        if name not in DEFAULT_HYPERPARAMETERS:
+            raise ValueError(f"Unknown hyperparameter '{name}'")
+        parsed[name] = type(DEFAULT_HYPERPARAMETERS[name])(value)
+    return parsed
+
+
+class MlpRegressor:
+    """Fully connected ReLU network with one linear output, float32 weights."""
+
+    def __init__(self, layer_sizes, seed=0):
+        rng = np.random.default_rng(seed)
+        self.layer_sizes = list(layer_sizes)
+        self.weights = [(rng.standard_normal((n_in, n_out)) * np.sqrt(2.0 / n_in)).astype(np.float32) # He init
+                        for n_in, n_out in zip(layer_sizes[:-1], layer_sizes[1:])]
+        self.biases = [np.zeros(n_out, dtype=np.float32) for n_out in layer_sizes[1:]]
+
+    @property
+    def parameters(self):
+        return self.weights + self.biases
+
+    def forward(self, X):
+        """Predictions plus the layer activations backward() needs."""
+        activations = [X]
+        for layer, (W, b) in enumerate(zip(self.weights, self.biases)):
+            Z = activations[-1] @ W
+            Z += b
+            if layer < len(self.weights) - 1:
+                np.maximum(Z, 0.0, out=Z)
+            activations.append(Z)
+        return activations[-1][:, 0], activations
+
+    def backward(self, activations, error):
+        """Gradients of the mean squared error (weights then biases, as in `parameters`)."""
+        delta = (2.0 / len(error)) * error[:, None].astype(np.float32)
+        weight_grads, bias_grads = [None] * len(self.weights), [None] * len(self.weights)
+        for layer in range(len(self.weights) - 1, -1, -1):
+            weight_grads[layer] = activations[layer].T @ delta
+            bias_grads[layer] = delta.sum(axis=0)
+            if layer:
+                delta = delta @ self.weights[layer].T
+                delta *= activations[layer] > 0
+        return weight_grads + bias_grads
+
+    def predict(self, X, batch_size=65536):
+        X = X.reshape(len(X), -1)
+        return np.concatenate([self.forward(X[i:i + batch_size].astype(np.float32, copy=False))[0]
+                               for i in range(0, len(X), batch_size)]) if len(X) else np.empty(0, dtype=np.float32)
+
+
+class AdamOptimizer:
+    def __init__(self, parameters, learning_rate, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.learning_rate, self.beta1, self.beta2, self.epsilon = learning_rate, beta1, beta2, epsilon
+        self.m = [np.zeros_like(p) for p in parameters]
+        self.v = [np.zeros_like(p) for p in parameters]
+        self.step = 0
+
+    def update(self, parameters, grads):
+        """In-place update of `parameters`."""
+        self.step += 1
+        correction = np.sqrt(1 - self.beta2 ** self.step) / (1 - self.beta1 ** self.step)
+        for p, g, m, v in zip(parameters, grads, self.m, self.v):
+            m *= self.beta1
+            m += (1 - self.beta1) * g
+            v *= self.beta2
+            v += (1 - self.beta2) * (g * g)
+            p -= (self.learning_rate * correction) * m / (np.sqrt(v) + self.epsilon)
+
+
+def _mse(model, X, y):
+    return float(np.mean((model.predict(X) - y) ** 2)) if len(y) else float('nan')
+
+
+def _save_checkpoint(path, model, optimizer, state):
+    arrays = {f"param_{i}": p for i, p in enumerate(model.parameters)}
+    arrays.update({f"m_{i}": m for i, m in enumerate(optimizer.m)})
+    arrays.update({f"v_{i}": v for i, v in enumerate(optimizer.v)})
+    arrays.update({f"best_{i}": p for i, p in enumerate(state["best_parameters"])})
+    meta = {key: value for key, value in state.items() if key != "best_parameters"}
+    arrays["meta"] = np.frombuffer(json.dumps(dict(meta, adam_step=optimizer.step)).encode("utf-8"), dtype=np.uint8)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(f"{path}.tmp", path)
+
+
+def _load_checkpoint(path, model, optimizer, config_hash):
+    """Restores model/optimizer in place and returns the training state, or None if there is no matching checkpoint."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as checkpoint:
+        meta = json.loads(checkpoint["meta"].tobytes().decode("utf-8"))
+        if meta.get("config_hash") != config_hash:
+            return None
+        n = len(model.parameters)
+        for i, p in enumerate(model.parameters):
+            p[...] = checkpoint[f"param_{i}"]
+            optimizer.m[i][...] = checkpoint[f"m_{i}"]
+            optimizer.v[i][...] = checkpoint[f"v_{i}"]
+        best = [checkpoint[f"best_{i}"].copy() for i in range(n)]
+    optimizer.step = meta.pop("adam_step")
+    return dict(meta, best_parameters=best)
+
+
+def _blas_threads(num_threads):
+    """Context capping BLAS threads when threadpoolctl is available (NumPy's BLAS already uses all cores by default)."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=num_threads or os.cpu_count(), user_api='blas')
+
+
+def write_model_artifacts(model, metadata, output_dir):
+    """Writes model.tar.gz (model.json + weights.npz) into output_dir and returns its path."""
+    os.makedirs(output_dir, exist_ok=True)
+    weights = io.BytesIO()
+    np.savez(weights, **{f"W{i}": W for i, W in enumerate(model.weights)}, **{f"b{i}": b for i, b in enumerate(model.biases)})
+    path = os.path.join(output_dir, 'model.tar.gz')
+    with tarfile.open(f"{path}.tmp", 'w:gz') as archive:
+        for name, payload in (('model.json', json.dumps(metadata, indent=2).encode('utf-8')), ('weights.npz', weights.getvalue())):
+            info = tarfile.TarInfo(name)
+            info.size = len(payload)
+            archive.addfile(info, io.BytesIO(payload))
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+class LocalHvacModel:
+    """A trained model loaded from model.tar.gz: preprocessing metadata plus the network."""
+
+    def __init__(self, metadata, network):
+        self.metadata = metadata
+        self.network = network
+        self.sequence_length = metadata["sequence_length"]
+        self.scalers = (metadata["scaler_features"], metadata["scaler_target"])
+
+    def predict_scaled(self, X_scaled):
+        """Scaled predictions for scaled input sequences of shape (n, sequence_length, features)."""
+        return self.network.predict(X_scaled)
+
+    def predict_kwh(self, X_scaled):
+        """Predictions in target units (the target scaler inverted)."""
+        scaler_target = self.scalers[1]
+        return (self.predict_scaled(X_scaled).astype(np.float64) - scaler_target["min_"]) / scaler_target["scale_"]
+
+
+def load_local_model(model_artifacts):
+    """Loads model.tar.gz (local path or s3:// URI) written by train_hvac_model_local."""
+    path = _resolve(model_artifacts)
+    if model_artifacts.startswith('s3://') and not using_local_stand_ins():
+        bucket, key = model_artifacts[len('s3://'):].split('/', 1)
+        path = os.path.join(tempfile.mkdtemp(prefix='hvac-model-'), 'model.tar.gz')
+        get_client('s3').download_file(bucket, key, path)
+    with tarfile.open(path, 'r:gz') as archive:
+        metadata = json.loads(archive.extractfile('model.json').read().decode('utf-8'))
+        with np.load(io.BytesIO(archive.extractfile('weights.npz').read())) as weights:
+            n_layers = len(metadata["layer_sizes"]) - 1
+            network = MlpRegressor(metadata["layer_sizes"])
+            network.weights = [weights[f"W{i}"] for i in range(n_layers)]
+            network.biases = [weights[f"b{i}"] for i in range(n_layers)]
+    if metadata.get("format") != MODEL_FORMAT:
+        raise ValueError(f"Unsupported model format {metadata.get('format')!r} in {model_artifacts}")
+    return LocalHvacModel(metadata, network)
+
+
+def describe_local_training_job(training_job):
+    """Job description (TrainingJobStatus, ModelArtifacts, FinalMetricDataList, ...) by name or identifier."""
+    name = training_job.rsplit('/', 1)[-1]
+    with open(os.path.join(LOCAL_ML_DIR, 'training-jobs', f"{name}.json")) as f:
+        return json.load(f)
+
+
+def train_hvac_model_local(
+    s3_train_data_path,
+    s3_val_data_path, # Optional; None splits the tail of the training data off
+    s3_output_path_for_model,
+    hyperparameters,
+    instance_type='ml.m5.large', # Ignored locally; kept for interface parity
+    instance_count=1,
+    sagemaker_role_arn=None
+    ):
+    """
+    Trains the model on this machine; same interface as train_hvac_model_sagemaker.
+
+    :param hyperparameters: Dict (string values accepted) over DEFAULT_HYPERPARAMETERS.
+    :return: Training job identifier; describe_local_training_job gives the artifact location and metrics.
+    """
+    params = _parse_hyperparameters(hyperparameters)
+    # Second-resolution time plus a random suffix: jobs started in the same second must not share
+    # (and overwrite) each other's artifacts and description, and SageMaker rejects duplicate names
+    job_name = f"hvac-mlp-train-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    features = [name for name in params['features'].split(',') if name]
+    feature_spec = json.loads(params['feature_spec']) if params['feature_spec'] else None
+    L = params['sequence_length']
+
+    df = load_training_frame(s3_train_data_path)
+    if s3_val_data_path:
+        train_df, val_df = df, load_training_frame(s3_val_data_path)
+    else:
+        split = int(len(df) * (1 - params['validation_fraction']))
+        history = L + (max_lookback(feature_spec) if feature_spec else 0) # Input rows before the first validation target
+        train_df, val_df = df.iloc[:split], df.iloc[max(0, split - history):]
+    X_train, y_train, scaler_features, scaler_target = build_sequences(train_df, L, features, params['target'], feature_spec=feature_spec)
+    if X_train is None:
+        raise ValueError("Not enough training data to build sequences.")
+    X_val, y_val, _, _ = build_sequences(val_df, L, features, params['target'], feature_spec=feature_spec,
+                                         scalers=(scaler_features, scaler_target))
+    if X_val is None:
+        X_val, y_val = X_train[:0], y_train[:0]
+
+    n_inputs = L * X_train.shape[2]
+    hidden = [int(units) for units in params['hidden_units'].split(',') if units]
+    model = MlpRegressor([n_inputs] + hidden + [1], seed=params['seed'])
+    optimizer = AdamOptimizer(model.parameters, params['learning_rate'])
+    config_hash = hashlib.sha256(json.dumps({"params": params, "train": [len(X_train), n_inputs, float(y_train.sum())]},
+                                            sort_keys=True).encode('utf-8')).hexdigest()
+    output_root = _resolve(s3_output_path_for_model)
+    checkpoint_path = os.path.join(output_root, 'checkpoints', 'checkpoint.npz')
+    state = _load_checkpoint(checkpoint_path, model, optimizer, config_hash)
+    if state is None:
+        state = {"config_hash": config_hash, "epoch": 0, "best_val_mse": float('inf'), "bad_epochs": 0,
+                 "best_parameters": [p.copy() for p in model.parameters], "history": []}
+    else:
+        print(f"Resuming from checkpoint after epoch {state['epoch']} (best val MSE {state['best_val_mse']:.6f}).")
+
+    print(f"Local training job {job_name}: {len(X_train):,} train / {len(X_val):,} validation sequences, "
+          f"layers {model.layer_sizes}, batch {params['batch_size']}")
+    rng = np.random.default_rng(params['seed'] + state["epoch"])
+    y_train32 = y_train.astype(np.float32)
+    batch_size = params['batch_size']
+    with _blas_threads(params['num_threads']):
+        while state["epoch"] < params['epochs'] and state["bad_epochs"] < params['patience']:
+            start = time.perf_counter()
+            order = rng.permutation(len(X_train))
+            train_loss = 0.0
+            for batch_start in range(0, len(order), batch_size):
+                idx = np.sort(order[batch_start:batch_start + batch_size]) # Sorted gathers read the strided view sequentially
+                X_batch = X_train[idx].reshape(len(idx), -1).astype(np.float32)
+                predictions, activations = model.forward(X_batch)
+                error = predictions - y_train32[idx]
+                optimizer.update(model.parameters, model.backward(activations, error))
+                train_loss += float(error @ error)
+            seconds = time.perf_counter() - start
+            state["epoch"] += 1
+            val_mse = _mse(model, X_val, y_val) if len(y_val) else train_loss / len(order)
+            if val_mse < state["best_val_mse"] - params['min_delta']:
+                state.update(best_val_mse=val_mse, bad_epochs=0, best_parameters=[p.copy() for p in model.parameters])
+            else:
+                state["bad_epochs"] += 1
+            throughput = len(order) / seconds
+            state["history"].append({"epoch": state["epoch"], "train_mse": train_loss / len(order), "val_mse": val_mse,
+                                     "samples_per_second": round(throughput)})
+            print(f"  Epoch {state['epoch']}/{params['epochs']}: train MSE {train_loss / len(order):.6f}, "
+                  f"val MSE {val_mse:.6f}, {throughput:,.0f} samples/sec ({seconds:.2f}s)")
+            _save_checkpoint(checkpoint_path, model, optimizer, state)
+    if state["bad_epochs"] >= params['patience']:
+        print(f"Early stopping: no validation improvement for {params['patience']} epochs.")
+
+    for p, best in zip(model.parameters, state["best_parameters"]):
+        p[...] = best
+    metadata = {
+        "format": MODEL_FORMAT, "layer_sizes": model.layer_sizes, "sequence_length": L,
+        "base_features": features, "feature_spec": feature_spec, "target": params['target'],
+        "scaler_features": scaler_features, "scaler_target": scaler_target,
+        "training_job_name": job_name, "best_val_mse": state["best_val_mse"], "epochs_trained": state["epoch"],
+    }
+    artifact_path = write_model_artifacts(model, metadata, os.path.join(output_root, job_name, 'output'))
+    model_artifacts = f"{s3_output_path_for_model.rstrip('/')}/{job_name}/output/model.tar.gz"
+    if s3_output_path_for_model.startswith('s3://') and not using_local_stand_ins():
+        bucket, key = model_artifacts[len('s3://'):].split('/', 1)
+        get_client('s3').upload_file(artifact_path, bucket, key)
+
+    description = {
+        "TrainingJobName": job_name, "TrainingJobStatus": "Completed",
+        "ModelArtifacts": {"S3ModelArtifacts": model_artifacts},
+        "HyperParameters": {name: str(value) for name, value in params.items()},
+        "FinalMetricDataList": [{"MetricName": "validation:mse", "Value": state["best_val_mse"]}],
+        "History": state["history"],
+    }
+    jobs_dir = os.path.join(LOCAL_ML_DIR, 'training-jobs')
+    os.makedirs(jobs_dir, exist_ok=True)
+    with open(os.path.join(jobs_dir, f"{job_name}.json"), 'w') as f:
+        json.dump(description, f, indent=2)
+    with contextlib.suppress(FileNotFoundError): # No checkpoint if no epoch ran (e.g. epochs=0)
+        os.remove(checkpoint_path) # Finished: a later run with the same settings starts fresh
+    print(f"Model artifacts: {model_artifacts} (best val MSE {state['best_val_mse']:.6f})")
+    return f"local:training-job/{job_name}"
+
+
+def synthetic_training_frame(n_hours=24 * 365, seed=0):
+    """Hourly building history where energy follows temperature, occupancy and time of day."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2023-01-01', periods=n_hours, freq='h')
+    hour = index.hour.to_numpy()
+    occupancy = ((hour >= 8) & (hour < 18) & (index.dayofweek.to_numpy() < 5)).astype(float)
+    temperature = 22 + 6 * np.sin(2 * np.pi * (np.arange(n_hours) / 24 - 0.3)) + rng.normal(0, 1.0, n_hours)
+    energy = 1.5 + 0.6 * np.abs(temperature - 21) + 3.0 * occupancy + rng.normal(0, 0.3, n_hours)
+    return pd.DataFrame({'timestamp': index, 'temperature': temperature, 'occupancy': occupancy,
+                         'energy_consumption': energy})
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    from aws_clients import use_local_stand_ins
+
+    use_local_stand_ins() # s3:// URIs map to LOCAL_ML_DIR
+    n_hours = int(sys.argv[sys.argv.index('--hours') + 1]) if '--hours' in sys.argv else 24 * 365
+    print(f"--- Local CPU Training ({os.cpu_count()} CPUs) ---")
+    train_uri = 's3://hvac-ml-data/training/'
+    train_dir = _resolve(train_uri)
+    os.makedirs(train_dir, exist_ok=True)
+    synthetic_training_frame(n_hours).to_parquet(os.path.join(train_dir, 'history.parquet'), index=False)
+
+    job = train_hvac_model_local(
+        s3_train_data_path=train_uri,
+        s3_val_data_path=None,
+        s3_output_path_for_model='s3://hvac-ml-models/hvac_mlp_local/',
+        hyperparameters={'epochs': '20', 'batch_size': '256', 'learning_rate': '0.001', 'sequence_length': '24',
+                         'feature_spec': json.dumps([{"type": "cyclic", "unit": "hour"}])},
+    )
+    description = describe_local_training_job(job)
+    local_model = load_local_model(description["ModelArtifacts"]["S3ModelArtifacts"])
+    history = load_training_frame(train_uri)
+    X_all, y_all, _, _ = build_sequences(history, local_model.sequence_length, local_model.metadata["base_features"],
+                                         local_model.metadata["target"], feature_spec=local_model.metadata["feature_spec"],
+                                         scalers=local_model.scalers)
+    predicted = local_model.predict_kwh(X_all[-168:])
+    actual = history['energy_consumption'].to_numpy()[-168:]
+    print(f"Last week: MAE {np.mean(np.abs(predicted - actual)):.3f} kWh (mean consumption {actual.mean():.2f} kWh)")
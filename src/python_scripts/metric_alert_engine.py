@@ -0,0 +1,390 @@
+import json
+from collections import deque
+from datetime import datetime, timezone
+
+from ide_lambda_monitoring_utils import create_sns_alert
+
+# This module evaluates threshold alert rules continuously over the metric series produced by
+# ide_metric_aggregation_lambda.aggregate_and_store_metrics. Each aggregation run returns an
+# overlapping window (e.g. the last hour every 5 minutes), so the engine remembers the last
+# timestamp seen per resource and only consumes new points. Every rule keeps a sliding window
+# with running sums (and a monotonic deque for max), so each new point costs O(1) per rule.
+# Alerts are sent only when a rule x resource pair changes state (OK <-> ALARM).
+# CloudWatch fills in and corrects recent periods after the fact, so each poll also compares the
+# trailing `revision_seconds` of points with what was consumed. If any point there is new or
+# changed, the resource's windows are rewound to just before it (from the retained points and
+# per-point state checkpoints) and replayed. A replay that changes the current state of a pair
+# reports one transition, marked "revised"; transitions it merely re-derives are not sent again.
+
+ALERT_TOPIC_ARN = "arn:aws:sns:us-east-1:123456789012:HvacIdeAlerts"
+
+DEFAULT_REVISION_SECONDS = 900 # Trailing span re-evaluated on each poll (three 5-minute periods)
+
+STATE_OK = "OK"
+STATE_ALARM = "ALARM"
+
+# Rule definitions follow the same dict style as the heuristic rules config.
+# - aggregation: 'sum', 'mean', 'max' over `metric`, or 'ratio' = sum(metric) / sum(denominator_metric)
+# - trigger_above / clear_below: hysteresis band; the alarm clears only once the value drops below clear_below
+# - breach_points: consecutive breaching evaluations required before alarming
+DEFAULT_ALERT_RULES = [
+    {
+        "id": "lambda_error_rate",
+        "resource_type": "lambda_functions",
+        "description": "Lambda error rate over the last 15 minutes",
+        "metric": "errors",
+        "denominator_metric": "invocations",
+        "aggregation": "ratio",
+        "window_seconds": 900,
+        "trigger_above": 0.10,
+        "clear_below": 0.05,
+        "breach_points": 1,
+        "severity": "CRITICAL",
+    },
+    {
+        "id": "lambda_p90_duration",
+        "resource_type": "lambda_functions",
+        "description": "Lambda p90 duration (ms), worst period in the last 15 minutes",
+        "metric": "duration_p90",
+        "aggregation": "max",
+        "window_seconds": 900,
+        "trigger_above": 250.0,
+        "clear_below": 200.0,
+        "breach_points": 2,
+        "severity": "WARNING",
+    },
+    {
+        "id": "lambda_throttles",
+        "resource_type": "lambda_functions",
+        "description": "Lambda throttled invocations over the last 15 minutes",
+        "metric": "throttles",
+        "aggregation": "sum",
+        "window_seconds": 900,
+        "trigger_above": 5,
+        "clear_below": 1,
+        "breach_points": 1,
+        "severity": "WARNING",
+    },
+    {
+        "id": "sagemaker_p90_model_latency",
+        "resource_type": "sagemaker_endpoints",
+        "description": "SageMaker p90 model latency (ms), mean over the last 15 minutes",
+        "metric": "model_latency_p90",
+        "aggregation": "mean",
+        "window_seconds": 900,
+        "trigger_above": 120.0,
+        "clear_below": 100.0,
+        "breach_points": 2,
+        "severity": "WARNING",
+    },
+]
+
+
+def _to_epoch_seconds(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class SlidingWindowState:
+    """
+    Sliding-window aggregate plus alarm state for one rule x resource pair.
+    Adding a point and evicting expired points are amortized O(1).
+    """
+    __slots__ = ("window_seconds", "points", "value_sum", "denominator_sum", "max_candidates",
+                 "state", "breach_streak", "last_value", "checkpoints")
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.points = deque()         # (epoch, value, denominator)
+        self.value_sum = 0.0
+        self.denominator_sum = 0.0
+        self.max_candidates = deque() # (epoch, value), values strictly decreasing
+        self.state = STATE_OK
+        self.breach_streak = 0
+        self.last_value = None
+        self.checkpoints = deque()    # (epoch, state, breach_streak, last_value) after each evaluated point
+
+    def checkpoint(self, epoch, keep_seconds):
+        """Records the state after the point at `epoch`, keeping one checkpoint older than `keep_seconds`."""
+        self.checkpoints.append((epoch, self.state, self.breach_streak, self.last_value))
+        while len(self.checkpoints) > 1 and self.checkpoints[1][0] < epoch - keep_seconds:
+            self.checkpoints.popleft()
+
+    def add(self, epoch, value, denominator=0.0):
+        self.points.append((epoch, value, denominator))
+        self.value_sum += value
+        self.denominator_sum += denominator
+        while self.max_candidates and self.max_candidates[-1][1] <= value:
+            self.max_candidates.pop()
+        self.max_candidates.append((epoch, value))
+
+        cutoff = epoch - self.window_seconds
+        while self.points and self.points[0][0] <= cutoff:
+            _, old_value, old_denominator = self.points.popleft()
+            self.value_sum -= old_value
+            self.denominator_sum -= old_denominator
+        while self.max_candidates and self.max_candidates[0][0] <= cutoff:
+            self.max_candidates.popleft()
+
+    def aggregate(self, aggregation):
+        if not self.points:
+            return None
+        if aggregation == "sum":
+            return self.value_sum
+        if aggregation == "mean":
+            return self.value_sum / len(self.points)
+        if aggregation == "max":
+            return self.max_candidates[0][1]
+        if aggregation == "ratio":
+            return self.value_sum / self.denominator_sum if self.denominator_sum > 0 else 0.0
+        raise ValueError(f"Unsupported aggregation: {aggregation}")
+
+
+class MetricAlertEngine:
+    """
+    Incremental threshold-alert evaluator for aggregated IDE metrics.
+
+    :param rules: List of rule dicts (see DEFAULT_ALERT_RULES).
+    :param topic_arn: SNS topic the alerts are published to.
+    :param notifier: Callable with the create_sns_alert signature
+                     (topic_arn, subject, message_detail, severity). Can be swapped for a batching
+                     dispatcher or a test recorder.
+    :param notify_on_clear: Also send an INFO notification when an alarm clears.
+    :param revision_seconds: Trailing span before the newest consumed point in which late or
+                             corrected datapoints are re-evaluated.
+    """
+
+    def __init__(self, rules=None, topic_arn=ALERT_TOPIC_ARN, notifier=create_sns_alert, notify_on_clear=True,
+                 revision_seconds=DEFAULT_REVISION_SECONDS):
+        self.topic_arn = topic_arn
+        self.notifier = notifier
+        self.notify_on_clear = notify_on_clear
+        self.revision_seconds = revision_seconds
+        self.rules_by_resource_type = {}
+        for rule in (rules if rules is not None else DEFAULT_ALERT_RULES):
+            self._validate_rule(rule)
+            self.rules_by_resource_type.setdefault(rule["resource_type"], []).append(rule)
+        self.states = {}     # (rule_id, resource) -> SlidingWindowState
+        self.last_seen = {}  # (resource_type, resource) -> epoch of the newest consumed point
+        self.consumed = {}   # (resource_type, resource) -> {epoch: {metric_id: value}}, for rewinding
+
+    @staticmethod
+    def _validate_rule(rule):
+        for key in ("id", "resource_type", "metric", "aggregation", "window_seconds", "trigger_above"):
+            if key not in rule:
+                raise ValueError(f"Alert rule '{rule.get('id', 'N/A')}' is missing '{key}'.")
+        if rule["aggregation"] == "ratio" and "denominator_metric" not in rule:
+            raise ValueError(f"Ratio rule '{rule['id']}' needs a 'denominator_metric'.")
+        if rule.get("clear_below", rule["trigger_above"]) > rule["trigger_above"]:
+            raise ValueError(f"Alert rule '{rule['id']}': clear_below must not exceed trigger_above.")
+
+    def ingest_aggregated_metrics(self, aggregated_metrics):
+        """
+        Consumes the output of aggregate_and_store_metrics, evaluating points newer than those
+        already seen for each resource and re-evaluating late or corrected ones (revision_seconds).
+
+        :return: List of state transitions, each a dict with rule_id, resource, state, value, timestamp.
+        """
+        transitions = []
+        for resource_type in self.rules_by_resource_type:
+            for resource, series in aggregated_metrics.get(resource_type, {}).items():
+                if not series or "error" in series:
+                    continue
+                transitions.extend(self.ingest_resource_series(resource_type, resource, series))
+        return transitions
+
+    def ingest_resource_series(self, resource_type, resource, series):
+        """
+        Consumes one resource's metric series ({metric_id: {'Timestamps': [...], 'Values': [...]}}).
+        Points from all metrics are aligned by timestamp and fed in time order, from the earliest
+        point that is new or changed.
+        """
+        rules = self.rules_by_resource_type.get(resource_type)
+        if not rules:
+            return []
+        resource_key = (resource_type, resource)
+        last_seen = self.last_seen.get(resource_key, float('-inf'))
+        revisable_after = last_seen - self.revision_seconds
+        consumed = self.consumed.setdefault(resource_key, {})
+
+        rows = {} # epoch -> {metric_id: value}
+        for metric_id, metric_series in series.items():
+            for timestamp, value in zip(metric_series.get('Timestamps', []), metric_series.get('Values', [])):
+                epoch = _to_epoch_seconds(timestamp)
+                if epoch > revisable_after:
+                    rows.setdefault(epoch, {})[metric_id] = value
+        changed = [epoch for epoch, values in rows.items() if any(consumed.get(epoch, {}).get(m) != v for m, v in values.items())]
+        if not changed:
+            return []
+        for epoch in changed:
+            consumed.setdefault(epoch, {}).update(rows[epoch])
+        replay_from = min(changed)
+
+        transitions = []
+        if replay_from <= last_seen:
+            transitions.extend(self._replay(resource_type, resource, replay_from, last_seen))
+        for epoch in sorted(epoch for epoch in consumed if epoch > last_seen):
+            transitions.extend(self.ingest_point(resource_type, resource, epoch, consumed[epoch]))
+        newest = max(last_seen, max(changed))
+        self.last_seen[resource_key] = newest
+
+        # Keep the points any rule window may need when rewinding to the oldest revisable point
+        horizon = newest - self.revision_seconds - max(rule["window_seconds"] for rule in rules)
+        for epoch in [epoch for epoch in consumed if epoch <= horizon]:
+            del consumed[epoch]
+        return transitions
+
+    def _replay(self, resource_type, resource, since, until):
+        """
+        Rewinds the resource's rule windows to just before `since` and re-evaluates the consumed
+        points up to `until` without notifying, then reports the pairs whose current state changed.
+        """
+        consumed = self.consumed[(resource_type, resource)]
+        epochs = sorted(epoch for epoch in consumed if epoch <= until)
+        previous = {}
+        for rule in self.rules_by_resource_type[resource_type]:
+            key = (rule["id"], resource)
+            old = self.states.get(key)
+            if old is None:
+                continue
+            previous[key] = old.state
+            window = self.states[key] = SlidingWindowState(rule["window_seconds"])
+            while old.checkpoints and old.checkpoints[-1][0] >= since:
+                old.checkpoints.pop()
+            if old.checkpoints:
+                _, window.state, window.breach_streak, window.last_value = old.checkpoints[-1]
+            window.checkpoints = old.checkpoints
+            for epoch in epochs:
+                if epoch >= since:
+                    break
+                value = consumed[epoch].get(rule["metric"])
+                if value is not None:
+                    window.add(epoch, value, consumed[epoch].get(rule.get("denominator_metric"), 0.0) or 0.0)
+
+        for epoch in epochs:
+            if epoch >= since:
+                self.ingest_point(resource_type, resource, epoch, consumed[epoch], notify=False)
+
+        transitions = []
+        for rule in self.rules_by_resource_type[resource_type]:
+            key = (rule["id"], resource)
+            window = self.states.get(key)
+            if window is None or window.state == previous.get(key, STATE_OK):
+                continue
+            event = {"rule_id": rule["id"], "resource": resource, "state": window.state, "value": window.last_value,
+                     "timestamp": datetime.fromtimestamp(until, tz=timezone.utc).isoformat(), "revised": True}
+            transitions.append(event)
+            self._notify(rule, event)
+        return transitions
+
+    def ingest_point(self, resource_type, resource, epoch, metric_values, notify=True):
+        """Evaluates every rule for one resource at one timestamp. O(1) per rule."""
+        transitions = []
+        for rule in self.rules_by_resource_type.get(resource_type, []):
+            value = metric_values.get(rule["metric"])
+            if value is None:
+                continue
+            key = (rule["id"], resource)
+            window = self.states.get(key)
+            if window is None:
+                window = self.states[key] = SlidingWindowState(rule["window_seconds"])
+            denominator = metric_values.get(rule.get("denominator_metric"), 0.0) or 0.0
+            window.add(epoch, value, denominator)
+            current = window.aggregate(rule["aggregation"])
+            window.last_value = current
+
+            transition = self._update_state(rule, window, current)
+            window.checkpoint(epoch, self.revision_seconds)
+            if transition and notify:
+                event = {"rule_id": rule["id"], "resource": resource, "state": transition,
+                         "value": current, "timestamp": datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()}
+                transitions.append(event)
+                self._notify(rule, event)
+        return transitions
+
+    @staticmethod
+    def _update_state(rule, window, current):
+        """Applies hysteresis; returns the new state on a transition, otherwise None."""
+        trigger_above = rule["trigger_above"]
+        clear_below = rule.get("clear_below", trigger_above)
+        if window.state == STATE_OK:
+            if current > trigger_above:
+                window.breach_streak += 1
+                if window.breach_streak >= rule.get("breach_points", 1):
+                    window.state = STATE_ALARM
+                    return STATE_ALARM
+            else:
+                window.breach_streak = 0
+        elif current < clear_below:
+            window.state = STATE_OK
+            window.breach_streak = 0
+            return STATE_OK
+        return None
+
+    def _notify(self, rule, event):
+        if event["state"] == STATE_OK and not self.notify_on_clear:
+            return
+        if event["state"] == STATE_ALARM:
+            severity = rule.get("severity", "WARNING")
+            subject = f"{severity}: {rule['id']} breached for '{event['resource']}'{' (revised data)' if event.get('revised') else ''}"
+            detail = (f"{rule.get('description', rule['id'])} is {event['value']:.4g}, "
+                      f"above the threshold of {rule['trigger_above']:g}.")
+        else:
+            severity = "INFO"
+            subject = f"RESOLVED: {rule['id']} for '{event['resource']}'"
+            detail = (f"{rule.get('description', rule['id'])} is back to {event['value']:.4g}, "
+                      f"below {rule.get('clear_below', rule['trigger_above']):g}.")
+        message = f"{detail}\nTimestamp: {event['timestamp']}\nRule: {json.dumps(rule)}"
+        self.notifier(self.topic_arn, subject[:100], message, severity=severity) # SNS subjects are capped at 100 chars
+
+    def get_states(self, only_alarming=False):
+        """Returns the current state and windowed value for every rule x resource pair."""
+        return [
+            {"rule_id": rule_id, "resource": resource, "state": window.state, "value": window.last_value}
+            for (rule_id, resource), window in self.states.items()
+            if not only_alarming or window.state == STATE_ALARM
+        ]
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import time
+    from datetime import timedelta
+
+    print("--- Streaming Alert Engine Simulation ---")
+    sent_alerts = []
+    engine = MetricAlertEngine(notifier=lambda topic_arn, subject, message_detail, severity="INFO": sent_alerts.append((severity, subject)))
+
+    # Two overlapping aggregation runs, as produced every 5 minutes by the aggregation Lambda
+    base = datetime(2023, 1, 1, 10, 0, tzinfo=timezone.utc)
+    def mock_run(start_index, errors):
+        timestamps = [(base + timedelta(minutes=5 * i)).isoformat() for i in range(start_index, start_index + 12)]
+        return {"lambda_functions": {"control-algo-heuristic": {
+            "invocations": {"Timestamps": timestamps, "Values": [100] * 12},
+            "errors": {"Timestamps": timestamps, "Values": errors},
+            "duration_p90": {"Timestamps": timestamps, "Values": [150] * 12},
+            "throttles": {"Timestamps": timestamps, "Values": [0] * 12},
+        }}}
+
+    print(engine.ingest_aggregated_metrics(mock_run(0, [0, 1, 2, 30, 30, 20, 1, 0, 0, 0, 0, 0])))
+    print(engine.ingest_aggregated_metrics(mock_run(1, [1, 2, 30, 30, 20, 1, 0, 0, 0, 0, 0, 0]))) # Overlap: 1 new point
+    print(engine.ingest_aggregated_metrics(mock_run(1, [1, 2, 30, 30, 20, 1, 0, 0, 0, 0, 0, 40]))) # Late correction: re-evaluated
+    print(f"Alerts sent: {sent_alerts}")
+
+    # Throughput check: thousands of rule x resource pairs per tick
+    engine = MetricAlertEngine(notifier=lambda *args, **kwargs: None)
+    n_resources = 2000
+    start = time.perf_counter()
+    for tick in range(10):
+        epoch = base.timestamp() + tick * 300
+        for r in range(n_resources):
+            engine.ingest_point("lambda_functions", f"fn-{r}", epoch,
+                                {"invocations": 100, "errors": (r + tick) % 15, "duration_p90": 150 + r % 200, "throttles": r % 3})
+    elapsed = time.perf_counter() - start
+    pairs = n_resources * len(engine.rules_by_resource_type["lambda_functions"])
+    print(f"{pairs} rule x resource pairs: {elapsed / 10 * 1000:.1f} ms per tick")
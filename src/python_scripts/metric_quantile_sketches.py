@@ -0,0 +1,287 @@
+import json
+import math
+from datetime import datetime, timezone
+
+# This module provides mergeable quantile sketches (DDSketch) for latency metrics.
+# CloudWatch only returns pre-computed percentiles per period (e.g. Duration p90), and
+# percentiles cannot be averaged or summed across periods, functions or variants.
+# Storing one small sketch per (resource, metric, period) instead lets the IDE answer
+# "p99 of all preprocessing Lambdas over the last 6 hours" by merging sketches, without
+# re-querying raw data and in bounded memory.
+
+DEFAULT_RELATIVE_ACCURACY = 0.01 # Quantile estimates are within 1% of the true value
+DEFAULT_MAX_BUCKETS = 2048       # Hard memory bound per sketch
+MIN_INDEXABLE_VALUE = 1e-9       # Values at or below this are counted in the zero bucket
+
+
+class DDSketch:
+    """
+    A DDSketch (Masson et al., VLDB 2019) with relative-error guarantees.
+
+    Values are mapped to logarithmically sized buckets so any quantile estimate is within
+    `relative_accuracy` of the true value. Two sketches built with the same accuracy can be
+    merged exactly by adding bucket counts, which is what makes per-period sketches
+    re-aggregatable. When the number of buckets exceeds `max_buckets`, the lowest buckets
+    are collapsed together, keeping the upper (tail latency) quantiles accurate.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1.")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {} # bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index):
+        # Midpoint (in relative terms) of the bucket (gamma^(i-1), gamma^i]
+        return 2.0 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        """
+        Adds a value (e.g. one invocation duration in ms) to the sketch.
+
+        :param value: Non-negative observation. Negative values are counted as zero.
+        :param count: Weight of the observation.
+        """
+        if count <= 0:
+            return
+        if value > MIN_INDEXABLE_VALUE:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_buckets:
+                self._collapse_lowest()
+        else:
+            self.zero_count += count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse_lowest(self):
+        """Folds the lowest buckets into the lowest retained one until within max_buckets."""
+        indices = sorted(self.bins)
+        excess = len(indices) - self.max_buckets
+        target = indices[excess]
+        self.bins[target] += sum(self.bins.pop(i) for i in indices[:excess])
+
+    def merge(self, other):
+        """
+        Merges another sketch into this one in place.
+
+        :param other: A DDSketch built with the same relative accuracy.
+        :return: self, to allow chaining.
+        """
+        if abs(other.gamma - self.gamma) > 1e-12:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        if other.count == 0:
+            return self
+        for index, bucket_count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + bucket_count
+        if len(self.bins) > self.max_buckets:
+            self._collapse_lowest()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Estimates the q-quantile (0 <= q <= 1). Returns None for an empty sketch.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1.")
+        if self.count == 0:
+            return None
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                # Clamp to observed range so estimates never fall outside [min, max]
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs):
+        """Returns a dict {q: estimate} for several quantiles."""
+        return {q: self.quantile(q) for q in qs}
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        """Serializes the sketch to a JSON-compatible dict (bucket keys become strings)."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "bins": {str(index): bucket_count for index, bucket_count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a sketch from the output of `to_dict`."""
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY),
+                     data.get("max_buckets", DEFAULT_MAX_BUCKETS))
+        sketch.bins = {int(index): bucket_count for index, bucket_count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+def _to_epoch_seconds(timestamp):
+    """Accepts datetimes, ISO strings or epoch seconds and returns epoch seconds (UTC)."""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def build_period_sketches(samples, period_seconds=300, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    """
+    Groups raw (timestamp, value) samples into one sketch per period.
+
+    :param samples: Iterable of (timestamp, value) pairs, e.g. (REPORT line time, duration ms).
+    :param period_seconds: Width of each period, aligned to the epoch like CloudWatch periods.
+    :return: Dict {period_start_iso: DDSketch}.
+    """
+    sketches = {}
+    for timestamp, value in samples:
+        epoch = _to_epoch_seconds(timestamp)
+        period_start = int(epoch // period_seconds) * period_seconds
+        sketch = sketches.get(period_start)
+        if sketch is None:
+            sketch = sketches[period_start] = DDSketch(relative_accuracy)
+        sketch.add(value)
+    return {
+        datetime.fromtimestamp(period_start, tz=timezone.utc).isoformat(): sketch
+        for period_start, sketch in sorted(sketches.items())
+    }
+
+
+class LatencySketchStore:
+    """
+    In-memory store of per-period sketches keyed by (resource, metric, period start).
+
+    Any percentile over an arbitrary time range and group of resources (functions,
+    endpoint variants) is answered by merging the matching period sketches.
+    """
+
+    def __init__(self):
+        self._sketches = {} # (resource, metric) -> {period_start_epoch: DDSketch}
+
+    def add_period_sketch(self, resource, metric, period_start, sketch):
+        """Adds (merges) a sketch for one resource/metric/period."""
+        periods = self._sketches.setdefault((resource, metric), {})
+        epoch = _to_epoch_seconds(period_start)
+        if epoch in periods:
+            periods[epoch].merge(sketch)
+        else:
+            periods[epoch] = DDSketch(sketch.relative_accuracy, sketch.max_buckets).merge(sketch)
+
+    def load_aggregated_metrics(self, aggregated_metrics):
+        """
+        Loads the 'latency_sketches' section produced by
+        ide_metric_aggregation_lambda.aggregate_and_store_metrics (also after a JSON round-trip).
+        """
+        loaded = 0
+        for resources in aggregated_metrics.get("latency_sketches", {}).values():
+            for resource, metrics in resources.items():
+                for metric, periods in metrics.items():
+                    for period_start, sketch_data in periods.items():
+                        sketch = sketch_data if isinstance(sketch_data, DDSketch) else DDSketch.from_dict(sketch_data)
+                        self.add_period_sketch(resource, metric, period_start, sketch)
+                        loaded += 1
+        return loaded
+
+    def merged_sketch(self, resources, metric, start_time=None, end_time=None):
+        """
+        Merges all sketches for the given resources and metric with period start in [start, end).
+
+        :param resources: A resource name or a list of names (e.g. several Lambda functions).
+        :param metric: Metric name, e.g. 'duration' or 'model_latency'.
+        :return: A new DDSketch (empty if nothing matched).
+        """
+        if isinstance(resources, str):
+            resources = [resources]
+        start_epoch = _to_epoch_seconds(start_time) if start_time is not None else float('-inf')
+        end_epoch = _to_epoch_seconds(end_time) if end_time is not None else float('inf')
+        merged = None
+        for resource in resources:
+            for period_start, sketch in self._sketches.get((resource, metric), {}).items():
+                if start_epoch <= period_start < end_epoch:
+                    if merged is None:
+                        merged = DDSketch(sketch.relative_accuracy, sketch.max_buckets)
+                    merged.merge(sketch)
+        return merged if merged is not None else DDSketch()
+
+    def quantiles(self, resources, metric, start_time=None, end_time=None, qs=(0.5, 0.9, 0.99)):
+        """
+        Returns a summary dict (count, avg, min, max and requested percentiles) for a group
+        of resources over a time range.
+        """
+        sketch = self.merged_sketch(resources, metric, start_time, end_time)
+        summary = {"count": sketch.count, "avg": sketch.avg,
+                   "min": sketch.min if sketch.count else None,
+                   "max": sketch.max if sketch.count else None}
+        for q in qs:
+            summary[f"p{q * 100:g}"] = sketch.quantile(q)
+        return summary
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import random
+
+    print("--- Mergeable Latency Sketch Demo ---")
+    random.seed(7)
+    base_time = datetime(2023, 1, 1, 10, 0, tzinfo=timezone.utc)
+    store = LatencySketchStore()
+    all_samples = []
+    for func_name, scale in [('preprocess-hvac-data', 120.0), ('control-algo-heuristic', 40.0)]:
+        samples = [(base_time.timestamp() + i * 3, random.lognormvariate(math.log(scale), 0.5)) for i in range(2400)]
+        all_samples.extend(value for _, value in samples)
+        for period_start, sketch in build_period_sketches(samples, period_seconds=300).items():
+            store.add_period_sketch(func_name, 'duration', period_start, sketch)
+
+    # Round-trip through JSON to show the per-period sketches are storable
+    serialized = json.dumps(store.merged_sketch('preprocess-hvac-data', 'duration').to_dict())
+    print(f"Serialized merged sketch size: {len(serialized)} bytes")
+
+    summary = store.quantiles(['preprocess-hvac-data', 'control-algo-heuristic'], 'duration')
+    exact = sorted(all_samples)
+    print("Merged across both functions and all periods:")
+    for key, estimate in summary.items():
+        print(f"  {key}: {estimate}")
+    for q in (0.5, 0.9, 0.99):
+        print(f"  exact p{q * 100:g}: {exact[int(q * (len(exact) - 1))]:.2f}")
@@ -12,6 +12,8 @@ import os
 import json
 import time
 
+from feature_pipeline import FEATURE_CACHE_DIR, FeatureCache, build_features, max_lookback
+
 # This script serves as a template for developing AI/ML based HVAC control algorithms.
 # It outlines conceptual steps for data loading, preprocessing, model building, 
 # training (potentially via SageMaker), and prediction (potentially via SageMaker Endpoint).
@@ -23,10 +25,12 @@ import time
 # SAGEMAKER_ENDPOINT_NAME = os.environ.get('SAGEMAKER_ENDPOINT_NAME', 'hvac-lstm-control-endpoint')
 
 # --- Data Loading and Preprocessing ---
-def load_and_preprocess_data(s3_data_path, sequence_length=24, features=['temperature', 'occupancy'], target='energy_consumption'):
+def load_and_preprocess_data(s3_data_path, sequence_length=24, features=['temperature', 'occupancy'], target='energy_consumption',
+                             feature_spec=None, feature_cache_dir=FEATURE_CACHE_DIR):
     """
     Loads data from S3, preprocesses it for LSTM model training.
     - Handles missing values.
+    - Adds engineered features (feature_pipeline.py) if a feature spec is given.
     - Scales features.
     - Creates sequences for time-series prediction.
     
@@ -34,8 +38,13 @@ def load_and_preprocess_data(s3_data_path, sequence_length=24, features=['temper
     :param sequence_length: Number of past time steps to use for predicting the next step.
     :param features: List of feature column names.
     :param target: Target column name to predict.
+    :param feature_spec: Optional feature_pipeline spec (lags, diffs, rolling stats, cyclic calendar
+                         encodings); its features are appended to `features` and the rows whose
+                         features are incomplete are dropped.
+    :param feature_cache_dir: Directory for cached feature matrices (None: always recompute).
     :return: Tuple of (X_scaled_sequences, y_scaled_sequences, scaler_features, scaler_target)
-             Returns (None, None, None, None) on failure.
+             Returns (None, None, None, None) on failure. X is a read-only strided view of shape
+             (sequences, sequence_length, features) over the scaled feature matrix.
     """
     print(f"Attempting to load data from {s3_data_path} (conceptual S3 access).")
     # Conceptual: Download from S3 using boto3
@@ -60,47 +69,68 @@ def load_and_preprocess_data(s3_data_path, sequence_length=24, features=['temper
     df.set_index('timestamp', inplace=True)
     print(f"Successfully loaded/mocked data with {len(df)} rows.")
 
+    return build_sequences(df, sequence_length, features, target, feature_spec=feature_spec,
+                           feature_cache_dir=feature_cache_dir)
+
+
+def _fit_min_max(values):
+    """MinMaxScaler parameters (x * scale_ + min_), with the template's 1e-6 guard against constant columns."""
+    minimum, maximum = values.min(axis=0), values.max(axis=0)
+    scale = 1.0 / (maximum - minimum + 1e-6)
+    return {"type": "MinMaxScaler", "min_": (-minimum * scale).tolist(), "scale_": scale.tolist()}
+
+
+def build_sequences(df, sequence_length, features, target, feature_spec=None, feature_cache_dir=FEATURE_CACHE_DIR,
+                    scalers=None):
+    """
+    Preprocessing shared by training and inference, for a regularly sampled frame with a DatetimeIndex:
+    fills missing values, adds engineered features, scales and cuts sequences.
+
+    :param scalers: (scaler_features, scaler_target) from an earlier call (e.g. the training set's,
+                    stored with the model) to apply instead of fitting new ones.
+    :return: As load_and_preprocess_data. scaler_features also lists the final feature columns.
+    """
     # 1. Handle missing values (e.g., linear interpolation)
-    df.interpolate(method='linear', inplace=True)
-    df.fillna(method='bfill', inplace=True)
-    df.fillna(method='ffill', inplace=True) # Fill any remaining NaNs at edges
+    df = df.interpolate(method='linear').bfill().ffill() # ffill: any remaining NaNs at edges
 
     if df.isnull().values.any():
         print("Warning: Data still contains NaNs after initial fill. Dropping NaN rows.")
-        df.dropna(inplace=True)
+        df = df.dropna()
 
     if df.empty:
         print("Error: DataFrame empty after NaN handling.")
         return None, None, None, None
         
-    # 2. Scale features and target
-    # scaler_features = MinMaxScaler(feature_range=(0, 1))
-    # df[features] = scaler_features.fit_transform(df[features])
-    
-    # scaler_target = MinMaxScaler(feature_range=(0, 1))
-    # df[target] = scaler_target.fit_transform(df[[target]])
-    
+    # 2. Engineered features (vectorized, cached on disk by data hash + spec)
+    if feature_spec:
+        cache = FeatureCache(feature_cache_dir) if feature_cache_dir else None
+        feature_names, feature_matrix, cache_hit = build_features(df, feature_spec, cache=cache)
+        df = df.assign(**{name: feature_matrix[:, i] for i, name in enumerate(feature_names)}).iloc[max_lookback(feature_spec):]
+        features = list(features) + [name for name in feature_names if name not in features]
+        print(f"Added {len(feature_names)} engineered features ({'cache hit' if cache_hit else 'computed'}).")
+
+    # 3. Scale features and target (MinMaxScaler semantics, fitted here unless given)
     print(f"Features for scaling: {features}, Target: {target}")
-    # MOCK scaling for IDE
-    df[features] = (df[features] - df[features].min()) / (df[features].max() - df[features].min() + 1e-6)
-    df[[target]] = (df[[target]] - df[[target]].min()) / (df[[target]].max() - df[[target]].min() + 1e-6)
-    
-    # 3. Create sequences
-    X_sequences, y_sequences = [], []
-    for i in range(len(df) - sequence_length):
-        X_sequences.append(df[features].iloc[i:(i + sequence_length)].values)
-        y_sequences.append(df[target].iloc[i + sequence_length])
-        
-    if not X_sequences:
+    feature_values = df[features].to_numpy(dtype=float)
+    target_values = df[target].to_numpy(dtype=float)
+    if scalers is None:
+        scaler_features = dict(_fit_min_max(feature_values), features=list(features))
+        scaler_target = _fit_min_max(target_values)
+    else:
+        scaler_features, scaler_target = scalers
+    feature_values = feature_values * np.asarray(scaler_features["scale_"]) + np.asarray(scaler_features["min_"])
+    target_values = target_values * scaler_target["scale_"] + scaler_target["min_"]
+
+    # 4. Create sequences (strided windows over the feature matrix, no per-row copies)
+    n_sequences = len(df) - sequence_length
+    if n_sequences <= 0:
         print("Error: Not enough data to create sequences.")
         return None, None, None, None
+    X_sequences = np.lib.stride_tricks.sliding_window_view(feature_values, sequence_length, axis=0)[:n_sequences].transpose(0, 2, 1)
+    y_sequences = target_values[sequence_length:]
 
-    print(f"Created {len(X_sequences)} sequences of length {sequence_length}.")
-    # Mock scalers for IDE demonstration
-    mock_scaler_features = {"type": "MinMaxScaler", "min_": "feature_mins_array", "scale_": "feature_scales_array"}
-    mock_scaler_target = {"type": "MinMaxScaler", "min_": "target_min_scalar", "scale_": "target_scale_scalar"}
-
-    return np.array(X_sequences), np.array(y_sequences), mock_scaler_features, mock_scaler_target
+    print(f"Created {n_sequences} sequences of length {sequence_length}.")
+    return X_sequences, y_sequences, scaler_features, scaler_target
 
 
 # --- Model Building (TensorFlow/Keras LSTM Example) ---
@@ -134,11 +164,12 @@ def train_hvac_model_sagemaker(
     hyperparameters, # Dict like {'epochs': 50, 'batch_size': 32, 'learning_rate': 0.001}
     instance_type='ml.m5.large', 
     instance_count=1,
-    sagemaker_role_arn # IAM Role ARN for SageMaker to access S3, etc.
+    sagemaker_role_arn=None # IAM Role ARN for SageMaker to access S3, etc. (required by SageMaker)
     ):
     """
     Conceptual function to launch an AWS SageMaker training job.
     This would use a custom training script (e.g., this file adapted) stored in S3 or a SageMaker built-in algo.
+    local_trainer.train_hvac_model_local has the same interface and trains on the local CPU instead.
     """
     # sagemaker_client = boto3.client('sagemaker')
     training_job_name = f"hvac-lstm-train-{int(time.time())}"
@@ -196,8 +227,30 @@ def predict_hvac_control_sagemaker_endpoint(input_data_sequence, endpoint_name):
     return {"predicted_energy_kwh": np.random.uniform(1, 5)}
 
 
+_local_models = {} # model artifact path -> LocalHvacModel, per container
+
+
+def predict_hvac_control_local(input_data_sequence, model_artifacts):
+    """
+    Offline counterpart of predict_hvac_control_sagemaker_endpoint, using a model.tar.gz written by
+    local_trainer.train_hvac_model_local (loaded once per container).
+    :param input_data_sequence: Numpy array of shape (n, sequence_length, features), scaled as in training.
+    :param model_artifacts: Path or s3:// URI of model.tar.gz.
+    :return: {"predicted_energy_kwh": value} for one sequence, a list of values for several.
+    """
+    from local_trainer import load_local_model
+    model = _local_models.get(model_artifacts)
+    if model is None:
+        model = _local_models[model_artifacts] = load_local_model(model_artifacts)
+    predictions = model.predict_kwh(np.asarray(input_data_sequence))
+    return {"predicted_energy_kwh": float(predictions[0]) if len(predictions) == 1 else predictions.tolist()}
+
+
 # --- Example Workflow for IDE Simulation / Lambda Test Event ---
 if __name__ == "__main__":
+    from aws_clients import use_local_stand_ins
+
+    use_local_stand_ins() # Local training reads and writes under LOCAL_ML_DIR instead of S3
     print("--- AI/ML HVAC Control Algorithm Template: Simulation Start ---")
 
     # 1. Load and Preprocess Data (Mocked for IDE)
@@ -221,8 +274,8 @@ if __name__ == "__main__":
     model_summary = build_lstm_hvac_model(timesteps=12, n_features=2)
     print(f"Model architecture (mock): {model_summary}")
 
-    # 3. Train Model (Conceptual SageMaker Call for IDE)
-    print("\nStep 3: Train Model via SageMaker (Conceptual)")
+    # 3. Train Model (Conceptual SageMaker Call; trained locally on the CPU for IDE simulation)
+    print("\nStep 3: Train Model via SageMaker (Conceptual) / locally")
     mock_hyperparams = {'epochs': '10', 'batch_size': '32', 'learning_rate': '0.001'} # SageMaker expects string hyperparams
     mock_sagemaker_role = "arn:aws:iam::123456789012:role/SageMakerExecutionRole"
     # training_job_arn = train_hvac_model_sagemaker(
@@ -234,6 +287,17 @@ if __name__ == "__main__":
     # )
     # print(f"Conceptual SageMaker Training Job ARN: {training_job_arn}")
     # print("Note: Actual model training would happen on SageMaker. This script simulates the call.")
+    from local_trainer import _resolve, describe_local_training_job, synthetic_training_frame, train_hvac_model_local
+    local_train_dir = _resolve('s3://hvac-ml-data/training/')
+    os.makedirs(local_train_dir, exist_ok=True)
+    synthetic_training_frame(24 * 90).to_parquet(os.path.join(local_train_dir, 'history.parquet'), index=False)
+    training_job = train_hvac_model_local(
+        s3_train_data_path='s3://hvac-ml-data/training/',
+        s3_val_data_path=None,
+        s3_output_path_for_model='s3://hvac-ml-models/hvac_mlp_local/',
+        hyperparameters=dict(mock_hyperparams, sequence_length='12'),
+    )
+    local_model_artifacts = describe_local_training_job(training_job)["ModelArtifacts"]["S3ModelArtifacts"]
 
     # 4. Predict using Deployed Endpoint (Conceptual SageMaker Call for IDE)
     print("\nStep 4: Predict using SageMaker Endpoint (Conceptual)")
@@ -242,6 +306,7 @@ if __name__ == "__main__":
         # prediction = predict_hvac_control_sagemaker_endpoint(sample_input_for_prediction, SAGEMAKER_ENDPOINT_NAME)
         prediction = predict_hvac_control_sagemaker_endpoint(sample_input_for_prediction, "hvac-lstm-control-endpoint-v1")
         print(f"Conceptual prediction output: {prediction}")
+        print(f"Local model prediction output: {predict_hvac_control_local(sample_input_for_prediction, local_model_artifacts)}")
     else:
         print("Not enough data to form a sample for prediction.")
 
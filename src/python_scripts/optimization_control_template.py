@@ -1,5 +1,5 @@
 
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, value as pulp_value
+from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, PULP_CBC_CMD, value as pulp_value
 
 # This script serves as a template for developing optimization-based control algorithms.
 # It typically runs in an AWS Lambda environment, possibly triggered periodically or by events.
@@ -28,7 +28,10 @@ def optimize_hvac_control_schedule(
     temp_change_per_kwh, # Positive for heating, negative for cooling adjustment if needed
     cost_weight,
     comfort_deviation_weight,
-    target_comfort_temp=None # Optional: if provided, penalize deviation from this specific temp
+    target_comfort_temp=None, # Optional: if provided, penalize deviation from this specific temp
+    solver_backend=None, # Optional: 'auto', 'pulp_cbc', 'scipy_highs' or 'fast_path' (see solver_backends.py)
+    time_limit_seconds=None,
+    mip_gap=None
     ):
     """
     Optimizes HVAC energy usage over a defined horizon to minimize a weighted sum of
@@ -46,6 +49,11 @@ def optimize_hvac_control_schedule(
     :param comfort_deviation_weight: Weight for minimizing deviation from comfort bounds.
     :param target_comfort_temp: Optional specific target temperature for comfort penalty. If None,
                                  penalty is based on being outside min/max bounds.
+    :param solver_backend: If given, the problem is solved by solver_backends.solve_hvac_schedule with
+                           that backend ('auto' picks by horizon); the result then also has "objective"
+                           and per-phase "timings". If None, this function's PuLP model is solved by CBC.
+    :param time_limit_seconds: Solver time limit (None: no limit for CBC, the solver_backends default otherwise).
+    :param mip_gap: Relative MIP gap (None: solver default).
     :return: A list of optimal energy usage (kWh) for each time step, or None if no solution.
              Also returns the calculated total cost and average comfort deviation.
     """
@@ -61,6 +69,18 @@ def optimize_hvac_control_schedule(
             cost_weight = 0.5
             comfort_deviation_weight = 0.5
 
+    if solver_backend is not None:
+        from solver_backends import DEFAULT_MIP_GAP, DEFAULT_TIME_LIMIT_SECONDS, solve_hvac_schedule
+        problem = {
+            'energy_prices': energy_prices, 'comfort_min': comfort_min, 'comfort_max': comfort_max,
+            'initial_temp': initial_temp, 'optimization_horizon_hours': optimization_horizon_hours,
+            'hvac_max_capacity_kw': hvac_max_capacity_kw, 'temp_change_per_kwh': temp_change_per_kwh,
+            'cost_weight': cost_weight, 'comfort_deviation_weight': comfort_deviation_weight,
+        }
+        return solve_hvac_schedule(
+            problem, backend=solver_backend,
+            time_limit_seconds=time_limit_seconds if time_limit_seconds is not None else DEFAULT_TIME_LIMIT_SECONDS,
+            mip_gap=mip_gap if mip_gap is not None else DEFAULT_MIP_GAP)
 
     prob = LpProblem("HVAC_Energy_Cost_Comfort_Optimization", LpMinimize)
 
@@ -112,7 +132,7 @@ def optimize_hvac_control_schedule(
         # For this example, we rely on min/max bounds for simplicity.
 
     print("Optimization problem defined. Attempting to solve...")
-    prob.solve() # Uses default CBC solver, can specify others if installed
+    prob.solve(PULP_CBC_CMD(timeLimit=time_limit_seconds, gapRel=mip_gap)) # CBC; see solver_backends.py for the others
 
     if LpStatus[prob.status] == 'Optimal':
         optimal_energy_kwh_schedule = [pulp_value(e) for e in energy_kwh_vars]
@@ -0,0 +1,249 @@
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import csr_matrix
+
+# Parametric sensitivity sweeps for optimize_hvac_control_schedule.
+# Each call of the template builds a PuLP model from Python expressions, writes it out and runs
+# CBC as a subprocess, so one solve costs tens of milliseconds before any optimization happens.
+# Here the same LP is laid out once per horizon as sparse matrices (HvacScheduleLp); a scenario
+# only overwrites coefficient arrays in place (prices and weights in the objective, the thermal
+# coefficient inside the equality matrix, the capacity bound, the comfort band and the initial
+# temperature on the constraint bounds) and calls HiGHS through scipy.optimize.milp (no integer
+# variables, so it solves the LP; milp skips most of linprog's per-call matrix checks and stacking).
+# Scenarios are solved in chunks on a process pool; each worker keeps its own structures.
+
+DEFAULT_SCENARIOS_PER_TASK = 256
+SWEEP_PARAMETERS = ('cost_weight', 'comfort_deviation_weight', 'hvac_max_capacity_kw', 'temp_change_per_kwh',
+                    'comfort_min', 'comfort_max', 'initial_temp')
+
+
+def _normalized_weights(cost_weight, comfort_deviation_weight):
+    """Same normalization as optimize_hvac_control_schedule, without the per-call warning."""
+    total_weight = cost_weight + comfort_deviation_weight
+    if total_weight <= 0:
+        return 0.5, 0.5
+    return cost_weight / total_weight, comfort_deviation_weight / total_weight
+
+
+class HvacScheduleLp:
+    """
+    The optimize_hvac_control_schedule LP for one horizon, in matrix form.
+    Variables: [energy_kwh(H), temp(H), dev_below_min(H), dev_above_max(H)].
+    """
+
+    def __init__(self, horizon):
+        self.horizon = H = horizon
+        self.energy, self.temp = slice(0, H), slice(H, 2 * H)
+        self.below, self.above = slice(2 * H, 3 * H), slice(3 * H, 4 * H)
+        n = 4 * H
+
+        # One constraint matrix lb <= A x <= ub, built directly in CSR so the -k entries sit at known
+        # positions of `data`. Rows 0..H-1 (transition, equality):
+        #   temp_t - temp_{t-1} - k * energy_t = 0   (temp_{-1} is the initial temperature on the bounds)
+        # Rows H..2H-1 and 2H..3H-1 (comfort):
+        #   temp_t + below_t >= comfort_min ;  temp_t - above_t <= comfort_max
+        t = np.arange(H)
+        row_lengths = np.concatenate((np.full(H, 3), np.full(2 * H, 2)))
+        row_lengths[0] = 2
+        indptr = np.concatenate(([0], np.cumsum(row_lengths)))
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1])
+        transition_start, transition_end = indptr[:H], indptr[1:H + 1]
+        indices[transition_start], data[transition_start] = t, 0.0 # energy_t, coefficient set per scenario
+        indices[transition_start[1:] + 1], data[transition_start[1:] + 1] = H + t[1:] - 1, -1.0 # temp_{t-1}
+        indices[transition_end - 1], data[transition_end - 1] = H + t, 1.0 # temp_t
+        for block, (slack_offset, slack_sign) in enumerate(((2 * H, 1.0), (3 * H, -1.0))):
+            row_start = indptr[(block + 1) * H:(block + 2) * H]
+            indices[row_start], data[row_start] = H + t, 1.0
+            indices[row_start + 1], data[row_start + 1] = slack_offset + t, slack_sign
+        self._k_positions = transition_start
+        self.A = csr_matrix((data, indices, indptr), shape=(3 * H, n))
+        self.lower = np.concatenate((np.zeros(H), np.zeros(H), np.full(H, -np.inf)))
+        self.upper = np.concatenate((np.zeros(H), np.full(H, np.inf), np.zeros(H)))
+
+        self.c = np.zeros(n)
+        self.variable_lower = np.zeros(n)
+        self.variable_upper = np.full(n, np.inf)
+        self.variable_lower[self.temp] = -np.inf
+
+    def set_coefficients(self, energy_prices, comfort_min, comfort_max, initial_temp, hvac_max_capacity_kw,
+                         temp_change_per_kwh, cost_weight, comfort_deviation_weight):
+        """Overwrites the scenario-dependent coefficients in place."""
+        cost_weight, comfort_deviation_weight = _normalized_weights(cost_weight, comfort_deviation_weight)
+        self.prices = np.asarray(energy_prices, dtype=float)[:self.horizon]
+        self.c[self.energy] = cost_weight * self.prices
+        self.c[self.below] = comfort_deviation_weight
+        self.c[self.above] = comfort_deviation_weight
+        H = self.horizon
+        self.A.data[self._k_positions] = -temp_change_per_kwh
+        self.lower[0] = self.upper[0] = initial_temp
+        self.lower[H:2 * H] = comfort_min
+        self.upper[2 * H:] = comfort_max
+        self.variable_upper[self.energy] = hvac_max_capacity_kw
+
+    def extract(self, x, objective):
+        """Result dict with the keys optimize_hvac_control_schedule returns, plus "objective"."""
+        return {
+            "status": "Optimal",
+            "schedule_kwh": x[self.energy],
+            "temperatures_celsius": x[self.temp],
+            "total_cost": float(self.prices @ x[self.energy]),
+            "total_comfort_deviation": float(x[self.below].sum() + x[self.above].sum()),
+            "objective": float(objective),
+        }
+
+    def solve(self, options=None, **coefficients):
+        """
+        Solves one scenario (keyword arguments as in set_coefficients).
+
+        :param options: HiGHS options for scipy.optimize.milp (e.g. time_limit, mip_rel_gap).
+        :return: Result dict as in extract.
+        """
+        self.set_coefficients(**coefficients)
+        result = milp(self.c, constraints=LinearConstraint(self.A, self.lower, self.upper),
+                      bounds=Bounds(self.variable_lower, self.variable_upper), options=options) # No integrality: solved as an LP
+        if result.status != 0:
+            return {"status": result.message, "schedule_kwh": None}
+        return self.extract(result.x, result.fun)
+
+
+_structures = {} # horizon -> HvacScheduleLp, per process
+
+
+def _structure(horizon):
+    structure = _structures.get(horizon)
+    if structure is None:
+        structure = _structures[horizon] = HvacScheduleLp(horizon)
+    return structure
+
+
+def _scenario_coefficients(base_problem, scenario):
+    coefficients = dict(base_problem, **scenario)
+    if 'cost_weight' in scenario and 'comfort_deviation_weight' not in scenario:
+        coefficients['comfort_deviation_weight'] = 1.0 - scenario['cost_weight']
+    horizon = coefficients.pop('optimization_horizon_hours', None) or len(coefficients['energy_prices'])
+    return horizon, coefficients
+
+
+def _solve_scenarios(base_problem, scenarios, keep_schedules):
+    rows = []
+    for scenario in scenarios:
+        horizon, coefficients = _scenario_coefficients(base_problem, scenario)
+        result = _structure(horizon).solve(**coefficients)
+        row = dict(scenario, status=result["status"])
+        if result["schedule_kwh"] is not None:
+            row.update(total_cost=result["total_cost"], total_comfort_deviation=result["total_comfort_deviation"],
+                       objective=result["objective"], total_energy_kwh=float(result["schedule_kwh"].sum()))
+            if keep_schedules:
+                row["schedule_kwh"] = result["schedule_kwh"].tolist()
+        rows.append(row)
+    return rows
+
+
+def parameter_grid(**grids):
+    """All combinations of the given parameter values, e.g. parameter_grid(cost_weight=[0.2, 0.8], hvac_max_capacity_kw=[3, 5])."""
+    unknown = set(grids) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    names = list(grids)
+    return [dict(zip(names, combination)) for combination in itertools.product(*(grids[name] for name in names))]
+
+
+def run_parameter_sweep(base_problem, scenarios, max_workers=None, scenarios_per_task=DEFAULT_SCENARIOS_PER_TASK,
+                        keep_schedules=False):
+    """
+    Solves every scenario of a sweep.
+
+    :param base_problem: Keyword arguments of optimize_hvac_control_schedule shared by all scenarios.
+    :param scenarios: List of parameter overrides (see parameter_grid). If a scenario sets cost_weight
+                      but not comfort_deviation_weight, the latter is 1 - cost_weight.
+    :param max_workers: Worker processes (default: all CPUs); 1 solves in-process.
+    :param keep_schedules: Also return each scenario's energy schedule.
+    :return: DataFrame with one row per scenario: its parameters, status, total_cost,
+             total_comfort_deviation, objective and total_energy_kwh.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = [scenarios[i:i + scenarios_per_task] for i in range(0, len(scenarios), scenarios_per_task)]
+    start = time.perf_counter()
+    if max_workers == 1:
+        rows = [row for chunk in chunks for row in _solve_scenarios(base_problem, chunk, keep_schedules)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_solve_scenarios, base_problem, chunk, keep_schedules) for chunk in chunks]
+            rows = [row for future in futures for row in future.result()]
+    seconds = time.perf_counter() - start
+    print(f"Sweep: {len(scenarios)} scenarios in {seconds:.2f}s ({len(scenarios) / seconds:.0f} scenarios/sec, {max_workers} workers)")
+    return pd.DataFrame(rows)
+
+
+def pareto_frontier(results, cost_column='total_cost', comfort_column='total_comfort_deviation', tolerance=1e-6):
+    """
+    Scenarios not dominated in (cost, comfort deviation), sorted by increasing cost.
+    Among scenarios with equal outcomes the first one is kept.
+    """
+    solved = results[results['status'] == 'Optimal']
+    # Sort on outcomes rounded to the tolerance, so solver noise doesn't order equal costs
+    decimals = int(round(-np.log10(tolerance)))
+    order = np.lexsort((solved[comfort_column].round(decimals).to_numpy(), solved[cost_column].round(decimals).to_numpy()))
+    ordered = solved.iloc[order]
+    comfort = ordered[comfort_column].round(decimals).to_numpy()
+    best_before = np.minimum.accumulate(np.concatenate(([np.inf], comfort[:-1])))
+    return ordered[comfort < best_before].reset_index(drop=True)
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import warnings
+    warnings.simplefilter('ignore')
+
+    print("--- Optimizer Parameter Sweep ---")
+    hours = np.arange(24)
+    base_problem = {
+        "energy_prices": (0.12 + 0.08 * np.exp(-((hours - 18) / 3.0) ** 2)).round(3).tolist(), # Evening peak
+        "comfort_min": 20.0,
+        "comfort_max": 24.0,
+        "initial_temp": 17.0,
+        "optimization_horizon_hours": 24,
+        "hvac_max_capacity_kw": 5.0,
+        "temp_change_per_kwh": 0.5,
+        "cost_weight": 0.5,
+        "comfort_deviation_weight": 0.5,
+    }
+
+    # Same results as the PuLP template on a few scenarios
+    import contextlib
+    import io
+    from optimization_control_template import optimize_hvac_control_schedule
+    for scenario in ({"cost_weight": 0.2}, {"cost_weight": 0.9, "hvac_max_capacity_kw": 2.0}, {"temp_change_per_kwh": 0.1}):
+        horizon, coefficients = _scenario_coefficients(base_problem, scenario)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            reference = optimize_hvac_control_schedule(optimization_horizon_hours=horizon, **coefficients)
+            pulp_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        result = _structure(horizon).solve(**coefficients)
+        highs_ms = (time.perf_counter() - start) * 1000
+        print(f"{scenario}: cost {reference['total_cost']:.4f} / {result['total_cost']:.4f}, "
+              f"deviation {reference['total_comfort_deviation']:.4f} / {result['total_comfort_deviation']:.4f} "
+              f"(PuLP {pulp_ms:.0f} ms, reused structure {highs_ms:.1f} ms)")
+
+    scenarios = parameter_grid(cost_weight=[0.5, 0.8, 0.9, 0.95, 0.97, 0.98, 0.99, 0.995],
+                               hvac_max_capacity_kw=[1.0, 2.0, 5.0], temp_change_per_kwh=[0.3, 0.5, 0.8])
+    results = run_parameter_sweep(base_problem, scenarios)
+    print(pareto_frontier(results).round(3).to_string())
+
+    if "--benchmark" in sys.argv:
+        n_scenarios = int(sys.argv[sys.argv.index('--scenarios') + 1]) if '--scenarios' in sys.argv else 10_000
+        rng = np.random.default_rng(0)
+        scenarios = [{"cost_weight": float(w), "hvac_max_capacity_kw": float(c), "temp_change_per_kwh": float(k)}
+                     for w, c, k in zip(rng.uniform(0.5, 0.999, n_scenarios), rng.uniform(1, 8, n_scenarios),
+                                        rng.uniform(0.1, 1.0, n_scenarios))]
+        results = run_parameter_sweep(base_problem, scenarios)
+        print(f"Pareto frontier: {len(pareto_frontier(results))} of {len(results)} scenarios")
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from aws_clients import get_client, using_local_stand_ins
+from sensor_windows import CONDITION_OPERATORS, compile_window_condition
+
+# This module keeps compiled heuristic rule sets warm across Lambda invocations.
+# heuristic_control_algorithm receives `rules_config` as a raw dict and re-sorts and re-interprets
+# it on every call. Here a rule set is validated and compiled once into a CompiledRulePlan
+# (priority-sorted, operators resolved to functions, actions pre-built). Plans are cached in an LRU
+# keyed by the SHA-256 of the rule set's canonical JSON, so identical content is never compiled twice
+# even if it is re-uploaded. The RulesRegistry checks the store's ETag (S3) or mtime (local file) at
+# most every `check_interval_seconds`, and a new plan is swapped in with a single reference
+# assignment: in-flight evaluations keep the plan they started with. If a new rule set fails
+# validation, the previous plan stays active.
+# Windowed conditions ("held", "mean", "slope"; see sensor_windows.py) compile into comparisons
+# against derived readings; the plan lists their WindowSpecs in `windows`.
+
+DEFAULT_PLAN_CACHE_SIZE = 32
+DEFAULT_CHECK_INTERVAL_SECONDS = 30
+RULES_LOCAL_DIR = os.environ.get('RULES_LOCAL_DIR', os.path.join(tempfile.gettempdir(), 'hvac-rules'))
+NO_ACTION = {"action_id": "NO_ACTION", "parameters": {}}
+
+
+class RuleValidationError(ValueError):
+    """Raised when a rule set cannot be compiled."""
+
+
+class RuleStoreError(OSError):
+    """Raised when a store cannot be read (e.g. an S3 throttle, network error or missing key)."""
+
+
+def rules_content_hash(rules_config):
+    """SHA-256 of the rule set's canonical JSON (key order and whitespace don't matter)."""
+    canonical = json.dumps(rules_config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompiledRule:
+    """One validated rule: conditions as (sensor, operator function, value) tuples."""
+    __slots__ = ("rule_id", "description", "priority", "match_all", "conditions", "action")
+
+    def __init__(self, rule_id, description, priority, match_all, conditions, action):
+        self.rule_id = rule_id
+        self.description = description
+        self.priority = priority
+        self.match_all = match_all
+        self.conditions = conditions
+        self.action = action
+
+    def matches(self, sensor_inputs):
+        # A missing sensor makes its condition false, as in heuristic_control_algorithm
+        if self.match_all:
+            for sensor, compare, value in self.conditions:
+                if sensor not in sensor_inputs or not compare(sensor_inputs[sensor], value):
+                    return False
+            return True
+        for sensor, compare, value in self.conditions:
+            if sensor in sensor_inputs and compare(sensor_inputs[sensor], value):
+                return True
+        return False
+
+
+class CompiledRulePlan:
+    """
+    A priority-ordered, validated rule set ready for evaluation.
+
+    :param rules: CompiledRule list, already sorted by priority.
+    :param content_hash: rules_content_hash of the source rule set.
+    :param windows: WindowSpecs of the windowed conditions; their derived readings come from
+                    SensorWindows.update and are what `sensors` lists for those conditions.
+    """
+
+    def __init__(self, rules, content_hash, version=None, windows=()):
+        self.rules = rules
+        self.content_hash = content_hash
+        self.version = version
+        self.windows = tuple(windows)
+        self.sensors = sorted({sensor for rule in rules for sensor, _, _ in rule.conditions})
+
+    def with_version(self, version):
+        """The same compiled rules under another version tag (no recompilation)."""
+        if version == self.version:
+            return self
+        return CompiledRulePlan(self.rules, self.content_hash, version, self.windows)
+
+    def evaluate(self, sensor_inputs):
+        """Returns the action of the first (highest-priority) matching rule, or NO_ACTION."""
+        for rule in self.rules:
+            if rule.matches(sensor_inputs):
+                return {"action_id": rule.action["action_id"], "parameters": dict(rule.action["parameters"]),
+                        "rule_id": rule.rule_id}
+        return dict(NO_ACTION, parameters={})
+
+
+def compile_rules(rules_config, version=None):
+    """
+    Validates and compiles a rules_config dict (see heuristic_control_algorithm for the format).
+
+    :raises RuleValidationError: On malformed rules or conditions (not dicts, conditions not a list),
+                                 unknown operators or aggregates, missing fields, or non-numeric
+                                 thresholds or priorities.
+    """
+    if not isinstance(rules_config, dict) or not isinstance(rules_config.get("rules", []), list):
+        raise RuleValidationError("rules_config must be a dict with a 'rules' list.")
+    compiled = []
+    windows = {}
+    for index, rule in enumerate(rules_config.get("rules", [])):
+        if not isinstance(rule, dict):
+            raise RuleValidationError(f"Rule {index} must be a dict, got {type(rule).__name__}.")
+        rule_id = rule.get("id", f"rule_{index}")
+        conditions = rule.get("conditions", [])
+        if not isinstance(conditions, list):
+            raise RuleValidationError(f"Rule '{rule_id}': conditions must be a list, got {type(conditions).__name__}.")
+        priority = rule.get("priority", float('inf'))
+        if isinstance(priority, bool) or not isinstance(priority, (int, float)):
+            raise RuleValidationError(f"Rule '{rule_id}': priority must be a number, got {priority!r}.")
+        if not isinstance(rule.get("parameters", {}), dict):
+            raise RuleValidationError(f"Rule '{rule_id}': parameters must be a dict.")
+        if not conditions:
+            continue # Rules without conditions never match, as in heuristic_control_algorithm
+        mode = str(rule.get("conditions_operator", "AND")).upper()
+        if mode not in ("AND", "OR"):
+            raise RuleValidationError(f"Rule '{rule_id}': conditions_operator must be AND or OR, got '{mode}'.")
+        compiled_conditions = []
+        for condition in conditions:
+            if not isinstance(condition, dict):
+                raise RuleValidationError(f"Rule '{rule_id}': each condition must be a dict, got {type(condition).__name__}.")
+            sensor, op, value = condition.get("sensor"), condition.get("operator"), condition.get("value")
+            if not sensor or not isinstance(sensor, str):
+                raise RuleValidationError(f"Rule '{rule_id}': condition without a 'sensor' name.")
+            if "aggregate" in condition:
+                try:
+                    spec, compiled_condition = compile_window_condition(condition)
+                except ValueError as e:
+                    raise RuleValidationError(f"Rule '{rule_id}': {e}.") from e
+                windows.setdefault(spec.key, spec)
+                compiled_conditions.append(compiled_condition)
+                continue
+            if op not in CONDITION_OPERATORS:
+                raise RuleValidationError(f"Rule '{rule_id}': unsupported operator '{op}'.")
+            if op not in ("==", "!=") and not isinstance(value, (int, float)):
+                raise RuleValidationError(f"Rule '{rule_id}': threshold for '{sensor}' must be numeric.")
+            compiled_conditions.append((sensor, CONDITION_OPERATORS[op], value))
+        action = {"action_id": rule.get("action", "UNKNOWN_ACTION"), "parameters": rule.get("parameters", {})}
+        compiled.append(CompiledRule(rule_id, rule.get("description", ""), priority,
+                                     mode == "AND", tuple(compiled_conditions), action))
+    compiled.sort(key=lambda r: r.priority) # Stable: equal priorities keep file order
+    return CompiledRulePlan(compiled, rules_content_hash(rules_config), version, windows.values())
+
+
+class LocalRuleStore:
+    """Rule sets as JSON files in a directory (IDE simulation). The version tag is the file's mtime/size."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def head(self, key):
+        stat = os.stat(self._path(key))
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def get(self, key):
+        path = self._path(key)
+        tag = self.head(key)
+        with open(path, "rb") as f:
+            return f.read(), tag
+
+    def put(self, key, rules_config):
+        """Writes a rule set atomically (used by the IDE to publish edits)."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(rules_config, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class S3RuleStore:
+    """Rule sets as S3 objects. The version tag is the object's ETag."""
+
+    def __init__(self, bucket, s3_client=None):
+        self.bucket = bucket
+        self.s3_client = s3_client
+
+    def _client(self):
+        return self.s3_client if self.s3_client is not None else get_client('s3')
+
+    def head(self, key):
+        from botocore.exceptions import BotoCoreError, ClientError
+        try:
+            return self._client().head_object(Bucket=self.bucket, Key=key)["ETag"]
+        except (BotoCoreError, ClientError) as e:
+            raise RuleStoreError(f"head s3://{self.bucket}/{key}: {e}") from e
+
+    def get(self, key):
+        from botocore.exceptions import BotoCoreError, ClientError
+        try:
+            response = self._client().get_object(Bucket=self.bucket, Key=key)
+            return response["Body"].read(), response["ETag"]
+        except (BotoCoreError, ClientError) as e:
+            raise RuleStoreError(f"get s3://{self.bucket}/{key}: {e}") from e
+
+
+def rule_store_for(bucket):
+    """S3RuleStore for `bucket`, or a LocalRuleStore under RULES_LOCAL_DIR when running on local stand-ins."""
+    if using_local_stand_ins():
+        return LocalRuleStore(os.path.join(RULES_LOCAL_DIR, bucket or 'local'))
+    return S3RuleStore(bucket)
+
+
+class RulesRegistry:
+    """
+    Serves compiled plans for rule set keys, recompiling only when the content changes.
+
+    :param store: LocalRuleStore or S3RuleStore.
+    :param cache_size: Compiled plans kept in the LRU (by content hash).
+    :param check_interval_seconds: Minimum time between version checks per key; 0 checks every call.
+    """
+
+    def __init__(self, store, cache_size=DEFAULT_PLAN_CACHE_SIZE, check_interval_seconds=DEFAULT_CHECK_INTERVAL_SECONDS,
+                 clock=time.monotonic):
+        self.store = store
+        self.cache_size = cache_size
+        self.check_interval_seconds = check_interval_seconds
+        self.clock = clock
+        self._plans_by_hash = OrderedDict() # content hash -> CompiledRulePlan (LRU)
+        self._active = {} # key -> (version tag, plan, last check time)
+        self._lock = threading.Lock()
+        self.stats = {"checks": 0, "loads": 0, "compilations": 0, "cache_hits": 0, "rejected": 0}
+
+    def _compiled(self, rules_config, version):
+        content_hash = rules_content_hash(rules_config)
+        plan = self._plans_by_hash.get(content_hash)
+        if plan is not None:
+            self._plans_by_hash.move_to_end(content_hash)
+            self.stats["cache_hits"] += 1
+            return plan.with_version(version) # Cached under its first version; report the current one
+        plan = compile_rules(rules_config, version)
+        self.stats["compilations"] += 1
+        self._plans_by_hash[content_hash] = plan
+        while len(self._plans_by_hash) > self.cache_size:
+            self._plans_by_hash.popitem(last=False)
+        return plan
+
+    def get_plan(self, key):
+        """
+        Returns the active plan for `key`, reloading it if the stored version changed.
+        Between checks this is a dict lookup with no I/O.
+        """
+        now = self.clock()
+        active = self._active.get(key)
+        if active is not None and now - active[2] < self.check_interval_seconds:
+            return active[1]
+
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None and now - active[2] < self.check_interval_seconds:
+                return active[1] # Another thread refreshed it meanwhile
+            self.stats["checks"] += 1
+            try:
+                version = self.store.head(key)
+                if active is not None and version == active[0]:
+                    self._active[key] = (version, active[1], now)
+                    return active[1]
+                body, version = self.store.get(key)
+                self.stats["loads"] += 1
+                plan = self._compiled(json.loads(body), version)
+            except (RuleValidationError, ValueError, OSError) as e: # Store errors are RuleStoreError (an OSError)
+                if active is None:
+                    raise
+                self.stats["rejected"] += 1
+                print(f"Keeping rules '{key}' version {active[0]}: reload failed ({e})")
+                self._active[key] = (active[0], active[1], now)
+                return active[1]
+            self._active[key] = (version, plan, now) # Atomic swap: readers see the old or the new plan
+            if active is not None:
+                print(f"Rules '{key}' updated to version {version} (plan {plan.content_hash[:12]}).")
+            return plan
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Rules Registry Simulation ---")
+    rules = {"rules": [
+        {"id": "hot_occupied", "priority": 1, "conditions_operator": "AND",
+         "conditions": [{"sensor": "temperature", "operator": ">", "value": 25.0},
+                        {"sensor": "occupancy", "operator": "==", "value": 1}],
+         "action": "ACTIVATE_STANDARD_COOLING", "parameters": {"target_temp_celsius": 23.0}},
+        {"id": "empty_warm", "priority": 2, "conditions_operator": "AND",
+         "conditions": [{"sensor": "temperature", "operator": ">", "value": 26.0},
+                        {"sensor": "occupancy", "operator": "==", "value": 0}],
+         "action": "SET_STANDBY_MODE", "parameters": {"standby_temp_celsius": 25.0}},
+    ]}
+    store = LocalRuleStore(tempfile.mkdtemp(prefix="hvac-rules-demo-"))
+    store.put("heuristic_rules_v1.json", rules)
+    registry = RulesRegistry(store, check_interval_seconds=0)
+    readings = {"temperature": 26.5, "occupancy": 1}
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        registry.get_plan("heuristic_rules_v1.json").evaluate(readings)
+    print(f"10,000 warm evaluations (version check every call): {(time.perf_counter() - start) * 1000:.1f} ms, stats {registry.stats}")
+
+    time.sleep(0.01) # Ensure a new mtime
+    rules["rules"][0]["conditions"][0]["value"] = 27.0
+    store.put("heuristic_rules_v1.json", rules)
+    print(f"After edit: {registry.get_plan('heuristic_rules_v1.json').evaluate(readings)}")
+
+    time.sleep(0.01)
+    rules["rules"][0]["conditions"][0]["value"] = 25.0 # Revert: served from the LRU, no compilation
+    store.put("heuristic_rules_v1.json", rules)
+    print(f"After revert: {registry.get_plan('heuristic_rules_v1.json').evaluate(readings)}, stats {registry.stats}")
+
+    time.sleep(0.01)
+    rules["rules"][0]["conditions"][0]["operator"] = "~="
+    store.put("heuristic_rules_v1.json", rules)
+    print(f"After invalid edit: {registry.get_plan('heuristic_rules_v1.json').evaluate(readings)}")
+
+    rules["rules"][0]["conditions"][0]["operator"] = ">"
+    for label, broken in (("rule not a dict", {"rules": ["x"]}),
+                          ("conditions as a dict", {"rules": [dict(rules["rules"][0], conditions={"sensor": "temperature"})]}),
+                          ("string priority", {"rules": [dict(rules["rules"][0], priority="1"), rules["rules"][1]]})):
+        time.sleep(0.01)
+        store.put("heuristic_rules_v1.json", broken)
+        print(f"After malformed edit ({label}): {registry.get_plan('heuristic_rules_v1.json').evaluate(readings)['action_id']}")
+
+    import shutil
+    shutil.rmtree(store.directory, ignore_errors=True)
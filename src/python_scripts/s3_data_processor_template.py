@@ -1,25 +1,60 @@
 
 import json
-import boto3
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-import numpy as np
+import os
 from io import StringIO # Or BytesIO for binary files like Parquet
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
 
-# --- AWS Client Initialization (Conceptual - credentials managed by Lambda execution role) ---
-# s3_client = boto3.client('s3')
-# dynamodb_resource = boto3.resource('dynamodb')
-# processed_data_table = dynamodb_resource.Table('SensorDataProcessed') # Example table
+# Heavy dependencies (pandas, numpy, boto3) are imported inside the functions that need them, so a
+# cold start only pays for them when an invocation actually processes data (a 400 for a bad event
+# returns without loading them). After the first import they are cached in sys.modules.
+
+# --- AWS Client Initialization (shared per container, see aws_clients.py) ---
+# from aws_clients import get_client # Needed by the commented-out get_client(...) calls below
+_bulk_writer = None
+_outlier_detectors = {} # bucket -> StreamingOutlierDetector (its state object lives in that bucket)
+
+def get_bulk_writer():
+    """Returns the container-wide DynamoDB bulk writer for processed data."""
+    global _bulk_writer
+    if _bulk_writer is None:
+        from dynamodb_bulk_writer import DynamoDBBulkWriter
+        _bulk_writer = DynamoDBBulkWriter('SensorDataProcessed')
+    return _bulk_writer
+
+def get_outlier_detector(bucket):
+    """
+    Returns the container-wide streaming outlier detector for a bucket, loading its persisted per-sensor
+    state on first use. Warm invocations reuse the in-memory state; it is saved back after each processed file.
+    """
+    if bucket not in _outlier_detectors:
+        from streaming_outlier_detector import load_outlier_detector
+        _outlier_detectors[bucket] = load_outlier_detector(bucket, OUTLIER_STATE_KEY)
+    return _outlier_detectors[bucket]
 
 # --- Configuration ---
 # These would typically be passed as environment variables or part of the event
 # S3_PROCESSED_BUCKET = 'your-hvac-processed-data-bucket' 
-# ROLLING_AVG_WINDOW = '5T' # 5 minutes for rolling average
+ROLLING_AVG_WINDOW = '5T' # 5 minutes for rolling average
+MAX_DOWNLOAD_WORKERS = 8 # Concurrent S3 downloads per batched invocation
+# 'sigma': 3-sigma on the current file only; 'streaming': per-sensor online detector whose state
+# persists between invocations (streaming_outlier_detector.py)
+OUTLIER_FILTER_MODE = os.environ.get('OUTLIER_FILTER_MODE', 'sigma')
+OUTLIER_STATE_KEY = os.environ.get('OUTLIER_STATE_KEY', 'state/outlier_detector.json')
+# Optional fixed sampling grid per sensor, e.g. '1min', '5min' or '1h' (timeseries_resampler.py); unset keeps raw timestamps
+RESAMPLE_FREQ = os.environ.get('RESAMPLE_FREQ') or None
+RESAMPLE_MAX_GAP = os.environ.get('RESAMPLE_MAX_GAP', '15min') # Longer gaps are left unfilled
+# 'lean': NumPy column pipeline with float32 values and in-place masks (lean_preprocessor.py), for large inputs
+PREPROCESS_MEMORY_MODE = os.environ.get('PREPROCESS_MEMORY_MODE', 'standard')
+# 'first': drop exact repeats of (timestamp, sensor_id, value); 'latest': keep only the last delivered
+# reading per (sensor_id, timestamp), for re-delivered or corrected files (fast_dedup.py)
+DEDUP_POLICY = os.environ.get('DEDUP_POLICY', 'first')
 
 def load_data_from_s3(bucket, key):
     """Loads data from S3. Handles JSON and CSV, can be extended for Parquet."""
+    import pandas as pd
     print(f"Loading data from s3://{bucket}/{key}")
-    # obj = s3_client.get_object(Bucket=bucket, Key=key)
+    # obj = get_client('s3').get_object(Bucket=bucket, Key=key)
     # file_content = obj['Body'].read().decode('utf-8')
     
     # Mocking S3 get_object for local testing / IDE simulation
@@ -35,59 +70,87 @@ def load_data_from_s3(bucket, key):
         ]
         file_content = json.dumps(mock_data)
         df = pd.read_json(StringIO(file_content))
+        if 'sensor_id' in df.columns:
+            df['sensor_id'] = df['sensor_id'].astype('category')
     elif key.endswith('.csv'):
         # Mock CSV data
         mock_csv_content = "timestamp,sensor_id,value,unit,zone\n" \
                            "2023-01-01T00:00:00Z,temp_001,22.5,C,A\n" \
                            "2023-01-01T00:01:00Z,temp_001,22.7,C,A"
-        df = pd.read_csv(StringIO(mock_csv_content))
+        # sensor_id as category: the parser builds the integer codes for free, and deduplication and
+        # grouping reuse them instead of hashing the id strings again
+        df = pd.read_csv(StringIO(mock_csv_content), dtype={'sensor_id': 'category'})
     # elif key.endswith('.parquet'):
-        # For Parquet, you'd use: df = pd.read_parquet(BytesIO(obj['Body'].read()))
+        # For Parquet, you'd use: df = pd.read_parquet(BytesIO(obj['Body'].read())) (write sensor_id as a dictionary column)
     else:
         raise ValueError(f"Unsupported file type for key: {key}")
     
     print(f"Loaded {len(df)} rows.")
     return df
 
-def preprocess_timeseries_data(df):
+def preprocess_timeseries_data(df, outlier_detector=None, resample_freq=RESAMPLE_FREQ, memory_mode=PREPROCESS_MEMORY_MODE):
     """
     Applies a series of preprocessing steps to the timeseries DataFrame.
+    If `outlier_detector` (a StreamingOutlierDetector) is given, step 6 uses it instead of the
+    file's own mean/std, judging each reading against its sensor's history.
+    If `resample_freq` is set, step 4 instead aligns each sensor to that grid with time-weighted
+    interpolation, leaving gaps longer than RESAMPLE_MAX_GAP unfilled.
+    With memory_mode='lean', the steps run in lean_preprocessor.preprocess_timeseries_lean instead.
     1. Converts 'timestamp' to datetime objects.
     2. Sets 'timestamp' as index and sorts.
     3. Ensures 'value' column is numeric, coercing errors.
     4. Handles missing values using linear interpolation.
-    5. Removes duplicate entries based on timestamp and sensor_id.
-    6. Identifies and removes outliers (values > 3 standard deviations from the mean).
+    5. Removes duplicate entries based on timestamp and sensor_id (DEDUP_POLICY).
+    6. Identifies and removes outliers (streaming per-sensor detector if given, else values > 3 standard deviations from the mean).
     7. Calculates rolling averages (e.g., 5-minute window).
-    8. Normalizes 'value' using MinMaxScaler to a 0-1 range.
+    8. Normalizes 'value' to a 0-1 range (min-max scaling in NumPy).
     """
+    import numpy as np
+    import pandas as pd
+
     if df.empty:
         print("Input DataFrame is empty. Skipping preprocessing.")
         return df
 
+    if memory_mode == 'lean':
+        from lean_preprocessor import preprocess_timeseries_lean
+        if resample_freq:
+            from timeseries_resampler import resample_timeseries
+            df = resample_timeseries(df, freq=resample_freq, max_gap=RESAMPLE_MAX_GAP)
+        return preprocess_timeseries_lean(df, outlier_detector=outlier_detector, rolling_window=ROLLING_AVG_WINDOW,
+                                          dedup_policy=DEDUP_POLICY)
+
     # Convert timestamp and set as index
     if 'timestamp' not in df.columns:
         raise ValueError("DataFrame must contain a 'timestamp' column.")
     df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
     df.dropna(subset=['timestamp'], inplace=True) # Drop rows where timestamp conversion failed
-    df = df.set_index('timestamp').sort_index()
+    df = df.set_index('timestamp').sort_index(kind='stable') # Stable: equal timestamps keep delivery order
 
     # Ensure 'value' is numeric
     if 'value' not in df.columns:
         raise ValueError("DataFrame must contain a 'value' column.")
     df['value'] = pd.to_numeric(df['value'], errors='coerce')
 
-    # Interpolate missing 'value' data
-    df['value_interpolated'] = df['value'].interpolate(method='linear').fillna(method='bfill').fillna(method='ffill')
+    if resample_freq:
+        # Regular per-sensor grid, interpolated in time (not by row position) in one vectorized pass
+        from timeseries_resampler import resample_timeseries
+        df = resample_timeseries(df.reset_index(), freq=resample_freq, max_gap=RESAMPLE_MAX_GAP)
+        df = df.set_index('timestamp').sort_index(kind='stable')
+        df['value_interpolated'] = df['value']
+    else:
+        # Interpolate missing 'value' data
+        df['value_interpolated'] = df['value'].interpolate(method='linear').fillna(method='bfill').fillna(method='ffill')
     
-    # Remove duplicates (considering sensor_id if present, otherwise just timestamp and value)
-    subset_cols = ['value_interpolated']
-    if 'sensor_id' in df.columns:
-        subset_cols.insert(0, 'sensor_id')
-    df = df.reset_index().drop_duplicates(subset=['timestamp'] + subset_cols).set_index('timestamp')
-
-    # Outlier removal (3-sigma rule on interpolated values)
-    if not df['value_interpolated'].empty and df['value_interpolated'].std() != 0:
+    # Remove duplicates (considering sensor_id if present, otherwise just timestamp and value).
+    # Composite int64 (sensor code, timestamp) keys and one sort, instead of drop_duplicates on object columns.
+    from fast_dedup import drop_duplicate_readings
+    df = drop_duplicate_readings(df, keep=DEDUP_POLICY, timestamp_column=None, value_column='value_interpolated')
+
+    # Outlier removal (streaming per-sensor detector, or 3-sigma rule on interpolated values)
+    if outlier_detector is not None:
+        df = outlier_detector.filter_dataframe(df, value_column='value_interpolated')
+    elif not df['value_interpolated'].empty and df['value_interpolated'].std() != 0:
         mean_val = df['value_interpolated'].mean()
         std_val = df['value_interpolated'].std()
         df = df[np.abs(df['value_interpolated'] - mean_val) <= (3 * std_val)]
@@ -99,9 +162,10 @@ def preprocess_timeseries_data(df):
     # Rolling average
     df['value_rolling_avg'] = df['value_interpolated'].rolling(window=ROLLING_AVG_WINDOW).mean().fillna(method='bfill').fillna(method='ffill')
 
-    # Normalization (MinMaxScaler)
-    scaler = MinMaxScaler()
-    df['value_normalized'] = scaler.fit_transform(df[['value_interpolated']])
+    # Normalization (min-max; same result as sklearn's MinMaxScaler without importing sklearn)
+    values = df['value_interpolated'].to_numpy(dtype=float)
+    value_range = np.ptp(values)
+    df['value_normalized'] = (values - values.min()) / value_range if value_range > 0 else 0.0
     
     print(f"Preprocessing complete. {len(df)} rows remaining.")
     return df.reset_index() # Ensure timestamp is a column for saving
@@ -116,25 +180,14 @@ def save_processed_data(df, bucket, key):
     # parquet_buffer = BytesIO()
     # df.to_parquet(parquet_buffer, index=False)
     # processed_key = f"processed/{key.replace('.json', '.parquet').replace('.csv', '.parquet')}"
-    # s3_client.put_object(Bucket=bucket, Key=processed_key, Body=parquet_buffer.getvalue())
+    # get_client('s3').put_object(Bucket=bucket, Key=processed_key, Body=parquet_buffer.getvalue())
     # print(f"Saved processed data to s3://{bucket}/{processed_key}")
 
-    # Example: Save to DynamoDB (ensure schema matches and types are converted)
-    # for _, row_series in df.iterrows():
-    #     item = row_series.to_dict()
-    #     # Convert numpy types to Python native types for DynamoDB
-    #     for k, v in item.items():
-    #         if isinstance(v, np.generic):
-    #             item[k] = v.item()
-    #         elif pd.isna(v): # Handle Pandas NaT/NaN
-    #             item[k] = None 
-    #         elif isinstance(v, pd.Timestamp): # Convert Timestamp to ISO string
-    #             item[k] = v.isoformat()
-    #     # Ensure primary key elements (e.g., sensor_id, timestamp) are present and correctly formatted
-    #     # try:
-    #     #    processed_data_table.put_item(Item=item)
-    #     # except Exception as e:
-    #     #    print(f"Error saving item to DynamoDB: {item}, Error: {e}")
+    # Example: Save to DynamoDB with BatchWriteItem (25 items per call across a small thread pool,
+    # Decimal conversion done column-wise, UnprocessedItems retried with backoff).
+    # Primary key elements (e.g., sensor_id, timestamp) must be present in the DataFrame.
+    write_report = get_bulk_writer().write_dataframe(df)
+    print(f"DynamoDB bulk write: {write_report['items']} items at {write_report['items_per_second']} items/sec.")
     print("Simulated saving processed data.")
 
 
@@ -145,25 +198,26 @@ def lambda_handler(event, context):
     - Loads data from S3.
     - Preprocesses the data.
     - Saves processed data to another S3 location (e.g., Parquet for Athena) and/or DynamoDB.
+    The event is an S3 notification for one object, or a direct invocation {'bucket': ..., 'key': ...};
+    anything else gets a 400 (batches go to batch_lambda_handler).
     """
-    try:
-        # Assuming S3 trigger:
-        # bucket = event['Records'][0]['s3']['bucket']['name']
-        # key = event['Records'][0]['s3']['object']['key']
-        
-        # For IDE simulation / direct invocation, event might carry bucket/key directly:
-        bucket = event.get('bucket', 'mock-hvac-data-bucket') # Default mock bucket
-        key = event.get('key', 'sample_temp_data.json')     # Default mock key
-        
-        if not bucket or not key:
-            return {'statusCode': 400, 'body': json.dumps("Missing S3 bucket or key in event.")}
+    records = extract_s3_records(event) if isinstance(event, dict) else []
+    if len(records) != 1 or not records[0]['bucket'] or not records[0]['key']:
+        message = "Missing S3 bucket or key in event." if not records else "Expected exactly one S3 object; use batch_lambda_handler for batches."
+        return {'statusCode': 400, 'body': json.dumps(message)}
+    bucket, key = records[0]['bucket'], records[0]['key']
 
+    try:
         raw_df = load_data_from_s3(bucket, key)
         
         if raw_df.empty:
             return {'statusCode': 200, 'body': json.dumps(f"No data loaded from s3://{bucket}/{key}. Nothing to process.")}
             
-        processed_df = preprocess_timeseries_data(raw_df)
+        outlier_detector = get_outlier_detector(bucket) if OUTLIER_FILTER_MODE == 'streaming' else None
+        processed_df = preprocess_timeseries_data(raw_df, outlier_detector=outlier_detector)
+        if outlier_detector is not None:
+            from streaming_outlier_detector import save_outlier_detector
+            save_outlier_detector(outlier_detector, bucket, OUTLIER_STATE_KEY)
         
         if not processed_df.empty:
             save_processed_data(processed_df, bucket, key) # Conceptual save
@@ -189,8 +243,181 @@ def lambda_handler(event, context):
             'body': json.dumps({"error": str(e)})
         }
 
+def extract_s3_records(event):
+    """
+    Extracts (bucket, key) records from an S3 event notification, an SQS-batched delivery of
+    S3 notifications, or a direct IDE invocation ({'bucket': ..., 'key': ...}).
+
+    :return: List of dicts with 'bucket', 'key', 'item_id' (the SQS messageId when present,
+             otherwise 's3://bucket/key') and 'sqs' (whether item_id can be reported back to SQS
+             as a partial batch failure).
+    """
+    records = []
+    for record in event.get('Records', []):
+        if 's3' in record:
+            bucket = record['s3']['bucket']['name']
+            key = unquote_plus(record['s3']['object']['key']) # Keys are URL-encoded in S3 events
+            records.append({'bucket': bucket, 'key': key, 'item_id': f"s3://{bucket}/{key}", 'sqs': False})
+        elif 'body' in record: # SQS message wrapping an S3 notification
+            try:
+                body = json.loads(record['body'])
+                inner = body.get('Records', [])
+                if not inner:
+                    raise ValueError("SQS message does not contain S3 records.")
+            except ValueError as e:
+                # Malformed messages are reported as failures rather than failing the whole batch
+                records.append({'bucket': None, 'key': None, 'item_id': record.get('messageId'), 'sqs': True, 'error': str(e)})
+                continue
+            for inner_record in inner:
+                records.append({
+                    'bucket': inner_record['s3']['bucket']['name'],
+                    'key': unquote_plus(inner_record['s3']['object']['key']),
+                    'item_id': record.get('messageId'),
+                    'sqs': True,
+                })
+    if not records and event.get('bucket') and event.get('key'):
+        records.append({'bucket': event['bucket'], 'key': event['key'], 'item_id': f"s3://{event['bucket']}/{event['key']}", 'sqs': False})
+    return records
+
+
+def save_processed_batch(df, bucket, partition_column='timestamp'):
+    """
+    Saves one combined processed DataFrame as Parquet, partitioned by date (Hive-style 'dt=' prefixes
+    so Athena can prune partitions). Returns the list of written keys.
+    """
+    if df.empty:
+        print("No processed data to save.")
+        return []
+
+    import pandas as pd
+    written_keys = []
+    partition_dates = pd.to_datetime(df[partition_column], utc=True).dt.strftime('%Y-%m-%d')
+    for partition_date, partition_df in df.groupby(partition_dates, sort=True):
+        output_key = f"processed/dt={partition_date}/batch-{pd.Timestamp.now(tz='UTC').strftime('%Y%m%dT%H%M%S%f')}.parquet"
+        # parquet_buffer = BytesIO()
+        # partition_df.to_parquet(parquet_buffer, index=False)
+        # get_client('s3').put_object(Bucket=S3_PROCESSED_BUCKET, Key=output_key, Body=parquet_buffer.getvalue())
+        print(f"Simulated saving {len(partition_df)} rows to s3://{bucket}/{output_key}")
+        written_keys.append(output_key)
+
+    # The DynamoDB copy is written once for the whole batch as well
+    get_bulk_writer().write_dataframe(df)
+    return written_keys
+
+
+def batch_lambda_handler(event, context):
+    """
+    AWS Lambda handler for batched deliveries: an S3 event notification or SQS batch carrying N objects.
+    - Downloads all objects concurrently.
+    - Preprocesses them together through one pipeline run.
+    - Writes one combined, date-partitioned output.
+    - Reports per-record partial failures ('batchItemFailures', for SQS ReportBatchItemFailures),
+      so only failed messages are redelivered.
+    """
+    records = extract_s3_records(event)
+    if not records:
+        return {'statusCode': 400, 'body': json.dumps("No S3 records found in event."), 'batchItemFailures': []}
+
+    import pandas as pd
+    results = {record['item_id']: {'status': 'FAILED', 'error': record['error']} for record in records if 'error' in record}
+    sqs_items = {record['item_id'] for record in records if record['sqs']}
+    loadable = [record for record in records if 'error' not in record]
+
+    def load_record(record):
+        try:
+            df = load_data_from_s3(record['bucket'], record['key'])
+            df['source_key'] = record['key']
+            return record, df, None
+        except Exception as e:
+            return record, None, e
+
+    frames = {} # item_id -> [(bucket, df)]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_DOWNLOAD_WORKERS, len(loadable)))) as executor:
+        for record, df, error in executor.map(load_record, loadable):
+            # One SQS message can carry several objects; it fails if any of them fails
+            result = results.setdefault(record['item_id'], {'status': 'LOADED', 'rows': 0})
+            if error is not None:
+                print(f"Error loading s3://{record['bucket']}/{record['key']}: {error}")
+                results[record['item_id']] = {'status': 'FAILED', 'error': str(error)}
+            elif result['status'] != 'FAILED':
+                frames.setdefault(record['item_id'], []).append((record['bucket'], df))
+                result['rows'] += len(df)
+
+    def fail(item_ids, error):
+        for item_id in item_ids:
+            if results[item_id]['status'] != 'FAILED':
+                results[item_id] = {'status': 'FAILED', 'error': error}
+
+    # Every frame of a failed message is dropped before anything is written, so a redelivery doesn't
+    # write the message's other objects twice. Work is grouped by bucket: each bucket gets its own
+    # outlier state and output location.
+    by_bucket = {} # bucket -> {item_id: [df]}
+    for item_id, item_frames in frames.items():
+        if results[item_id]['status'] == 'FAILED':
+            continue
+        for bucket, df in item_frames:
+            if not df.empty:
+                by_bucket.setdefault(bucket, {}).setdefault(item_id, []).append(df)
+
+    processed = {} # bucket -> (processed DataFrame, outlier detector or None)
+    for bucket, bucket_frames in by_bucket.items():
+        try:
+            outlier_detector = get_outlier_detector(bucket) if OUTLIER_FILTER_MODE == 'streaming' else None
+            processed[bucket] = (preprocess_timeseries_data(pd.concat([df for dfs in bucket_frames.values() for df in dfs],
+                                                                      ignore_index=True),
+                                                           outlier_detector=outlier_detector), outlier_detector)
+        except Exception as e:
+            # The bucket's shared pipeline failed: every message in it has to be retried
+            print(f"Error processing batch for bucket {bucket}: {str(e)}")
+            fail(bucket_frames, str(e))
+
+    # A message spanning buckets is only written if all of its buckets processed
+    pending = set(processed)
+    while True:
+        blocked = {bucket for bucket in pending if any(results[item_id]['status'] == 'FAILED' for item_id in by_bucket[bucket])}
+        if not blocked:
+            break
+        for bucket in blocked:
+            fail(by_bucket[bucket], "Another object in the same message failed.")
+        pending -= blocked
+    for bucket in set(processed) - pending:
+        _outlier_detectors.pop(bucket, None) # Readings absorbed but not written: reload the persisted state next time
+
+    written_keys = []
+    processed_rows = 0
+    for bucket in sorted(pending):
+        processed_df, outlier_detector = processed[bucket]
+        try:
+            written_keys += save_processed_batch(processed_df, bucket)
+            processed_rows += len(processed_df)
+            if outlier_detector is not None:
+                from streaming_outlier_detector import save_outlier_detector
+                save_outlier_detector(outlier_detector, bucket, OUTLIER_STATE_KEY)
+        except Exception as e:
+            print(f"Error saving batch for bucket {bucket}: {str(e)}")
+            _outlier_detectors.pop(bucket, None)
+            fail(by_bucket[bucket], str(e))
+    for result in results.values():
+        if result['status'] == 'LOADED':
+            result['status'] = 'PROCESSED'
+
+    failures = [item_id for item_id, result in results.items() if result['status'] == 'FAILED']
+    return {
+        'statusCode': 200 if not failures else 207,
+        'body': json.dumps({
+            "message": f"Processed {len(results) - len(failures)}/{len(results)} items; {processed_rows} rows after preprocessing.",
+            "output_keys": written_keys,
+            "records": results,
+        }, default=str),
+        # Only SQS message ids mean anything to ReportBatchItemFailures
+        'batchItemFailures': [{'itemIdentifier': item_id} for item_id in failures if item_id in sqs_items],
+    }
+
 # --- For local testing or IDE simulation ---
 if __name__ == "__main__":
+    from aws_clients import use_local_stand_ins
+
+    use_local_stand_ins() # In-memory DynamoDB stand-in for the bulk writer
     # Simulate an S3 event or a direct call with parameters
     mock_event = {
         'bucket': 'mock-hvac-data-bucket',
@@ -203,6 +430,30 @@ if __name__ == "__main__":
     print("\n--- Lambda Result ---")
     print(json.dumps(json.loads(result['body']), indent=2, default=str))
     
+    # Batched S3 notification: three objects, one of which has an unsupported type
+    mock_batch_event = {'Records': [
+        {'s3': {'bucket': {'name': 'mock-hvac-data-bucket'}, 'object': {'key': key}}}
+        for key in ['raw/zone_a/sample_temp_data.json', 'raw/zone_b/sample+temp+data.csv', 'raw/zone_c/readings.xml']
+    ]}
+    print("\n--- Simulating Batched Lambda Execution ---")
+    batch_result = batch_lambda_handler(mock_batch_event, None)
+    print(json.dumps(json.loads(batch_result['body']), indent=2))
+    print(f"batchItemFailures: {batch_result['batchItemFailures']}")
+
+    # SQS delivery: message m-1 carries a good object and the unsupported one, so it is retried as a
+    # whole and neither object is written; m-2 (another bucket) is processed on its own
+    mock_sqs_event = {'Records': [
+        {'messageId': message_id, 'body': json.dumps({'Records': [
+            {'s3': {'bucket': {'name': bucket}, 'object': {'key': key}}} for bucket, key in objects]})}
+        for message_id, objects in [('m-1', [('mock-hvac-data-bucket', 'raw/zone_a/sample_temp_data.json'),
+                                             ('mock-hvac-data-bucket', 'raw/zone_c/readings.xml')]),
+                                    ('m-2', [('mock-hvac-archive-bucket', 'raw/zone_d/sample_temp_data.json')])]
+    ]}
+    print("\n--- Simulating SQS Batched Lambda Execution ---")
+    sqs_result = batch_lambda_handler(mock_sqs_event, None)
+    print(json.dumps(json.loads(sqs_result['body'])['records'], indent=2))
+    print(f"batchItemFailures: {sqs_result['batchItemFailures']}")
+
     # Example of directly calling functions for fine-grained testing:
     # print("\n--- Direct Function Call Example ---")
     # test_df = load_data_from_s3('mock-bucket', 'test.json')
@@ -211,5 +462,3 @@ if __name__ == "__main__":
     #    print("\n--- Processed DataFrame (Direct Call) ---")
     #    print(processed_test_df.head())
 
-```
-
@@ -0,0 +1,293 @@
+import threading
+import time
+from datetime import datetime
+
+from aws_clients import get_client
+
+# This module provides a batching, rate-limited alternative to calling
+# ide_lambda_monitoring_utils.create_sns_alert once per alert. During an incident storm many
+# near-identical alerts fire within seconds; the dispatcher queues them in memory, coalesces
+# alerts with the same key (e.g. resource + rule) within a window, and publishes them from a
+# background worker with SNS PublishBatch (up to 10 messages per call), throttled by a token bucket.
+
+SNS_PUBLISH_BATCH_MAX_ENTRIES = 10
+SNS_SUBJECT_MAX_LENGTH = 100
+SEVERITY_ORDER = {"INFO": 0, "WARNING": 1, "CRITICAL": 2}
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter. Tokens refill continuously at `rate_per_second` up to `capacity`.
+
+    :param rate_per_second: Sustained number of operations allowed per second.
+    :param capacity: Burst size (defaults to one second's worth of tokens).
+    :param clock: Monotonic time source, injectable for tests.
+    """
+
+    def __init__(self, rate_per_second, capacity=None, clock=time.monotonic):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive.")
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """Takes `tokens` if available and returns True, otherwise returns False immediately."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Blocks until `tokens` are available (or `timeout` seconds pass). Returns True on success."""
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait_seconds = (tokens - self.tokens) / self.rate_per_second
+            if deadline is not None and self.clock() + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+
+class LocalSnsTopicStandIn:
+    """
+    Local stand-in for the SNS client used by the dispatcher. Records every PublishBatch call
+    so tests and IDE simulations can assert on what would have been sent.
+
+    :param fail_every: If set, every Nth entry is reported as Failed (to exercise retries).
+    """
+
+    def __init__(self, fail_every=None):
+        self.fail_every = fail_every
+        self.batches = []  # list of (topic_arn, entries)
+        self.messages = [] # flattened list of successfully published entries
+        self._entry_counter = 0
+        self._lock = threading.Lock()
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        if len(PublishBatchRequestEntries) > SNS_PUBLISH_BATCH_MAX_ENTRIES:
+            raise ValueError("PublishBatch accepts at most 10 entries.")
+        successful, failed = [], []
+        with self._lock:
+            self.batches.append((TopicArn, PublishBatchRequestEntries))
+            for entry in PublishBatchRequestEntries:
+                self._entry_counter += 1
+                if self.fail_every and self._entry_counter % self.fail_every == 0:
+                    failed.append({"Id": entry["Id"], "Code": "InternalError", "SenderFault": False})
+                else:
+                    self.messages.append(dict(entry, TopicArn=TopicArn))
+                    successful.append({"Id": entry["Id"], "MessageId": f"local-msg-{self._entry_counter}"})
+        return {"Successful": successful, "Failed": failed}
+
+    def publish(self, TopicArn, Message, Subject=None, MessageAttributes=None):
+        entry = {"Id": "0", "Message": Message}
+        if Subject is not None:
+            entry["Subject"] = Subject
+        if MessageAttributes:
+            entry["MessageAttributes"] = MessageAttributes
+        response = self.publish_batch(TopicArn, [entry])
+        if response["Failed"]:
+            raise RuntimeError(f"Publish to {TopicArn} failed: {response['Failed'][0]['Code']}")
+        return {"MessageId": response["Successful"][0]["MessageId"]}
+
+
+class AlertDispatcher:
+    """
+    Queues alerts, coalesces duplicates and publishes them in rate-limited batches.
+
+    `submit` has the same signature as create_sns_alert, so the dispatcher can be passed as the
+    notifier of metric_alert_engine.MetricAlertEngine.
+
+    :param sns_client: boto3 SNS client (or LocalSnsTopicStandIn). Defaults to aws_clients.get_client('sns').
+    :param coalesce_window_seconds: Alerts with the same key within this window become one message.
+    :param publish_rate_per_second: Sustained PublishBatch calls per second (token bucket rate).
+    :param burst: Token bucket capacity.
+    :param max_pending: Upper bound on distinct pending alerts; new keys beyond it are dropped.
+    :param max_attempts: Attempts per entry before a failed publish is given up.
+    :param poll_interval_seconds: How often the background worker checks for due alerts.
+    """
+
+    def __init__(self, sns_client=None, coalesce_window_seconds=30.0, publish_rate_per_second=10.0,
+                 burst=None, max_pending=10000, max_attempts=3, poll_interval_seconds=0.5, clock=time.monotonic):
+        self.sns_client = sns_client if sns_client is not None else get_client('sns')
+        self.coalesce_window_seconds = coalesce_window_seconds
+        self.rate_limiter = TokenBucket(publish_rate_per_second, burst, clock=clock)
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.poll_interval_seconds = poll_interval_seconds
+        self.clock = clock
+        self._pending = {} # coalesce key -> pending alert dict (insertion ordered = arrival order)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._entry_seq = 0
+        self._retry_seq = 0
+        self.stats = {"submitted": 0, "coalesced": 0, "dropped": 0, "published": 0, "failed": 0, "batches": 0}
+
+    def submit(self, topic_arn, subject, message_detail, severity="INFO", coalesce_key=None):
+        """
+        Enqueues an alert. Returns immediately.
+
+        :param coalesce_key: Alerts sharing this key within the window are merged. Defaults to
+                             (topic_arn, subject), which for engine alerts is unique per resource + rule.
+        :return: The coalesce key, or None if the alert was dropped because the queue is full.
+        """
+        key = coalesce_key if coalesce_key is not None else (topic_arn, subject)
+        now = self.clock()
+        with self._lock:
+            self.stats["submitted"] += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending["count"] += 1
+                pending["message_detail"] = message_detail # Keep the most recent details
+                pending["last_seen"] = now
+                if SEVERITY_ORDER.get(severity, 0) > SEVERITY_ORDER.get(pending["severity"], 0):
+                    pending["severity"] = severity
+                    pending["subject"] = subject
+                self.stats["coalesced"] += 1
+                return key
+            if len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                print(f"Alert queue full ({self.max_pending}); dropping alert: {subject}")
+                return None
+            self._pending[key] = {
+                "topic_arn": topic_arn, "subject": subject, "message_detail": message_detail,
+                "severity": severity, "count": 1, "first_seen": now, "last_seen": now, "attempts": 0,
+            }
+        return key
+
+    # Allows `AlertDispatcher` instances to be used where create_sns_alert is expected
+    __call__ = submit
+
+    def _take_due(self, force=False):
+        """Removes and returns pending alerts whose coalescing window has elapsed."""
+        now = self.clock()
+        due = []
+        with self._lock:
+            for key in list(self._pending):
+                pending = self._pending[key]
+                if force or now - pending["first_seen"] >= self.coalesce_window_seconds:
+                    due.append(self._pending.pop(key))
+        return due
+
+    def _build_entry(self, pending):
+        self._entry_seq += 1
+        message = f"Severity: {pending['severity']}\n\n{pending['message_detail']}"
+        if pending["count"] > 1:
+            span = pending["last_seen"] - pending["first_seen"]
+            message = f"[{pending['count']} occurrences coalesced over {span:.0f}s]\n" + message
+        return {
+            "Id": f"alert-{self._entry_seq}",
+            "Subject": pending["subject"][:SNS_SUBJECT_MAX_LENGTH],
+            "Message": message,
+            "MessageAttributes": {"severity": {"DataType": "String", "StringValue": pending["severity"]}},
+        }
+
+    def _publish(self, due):
+        """Publishes due alerts grouped by topic, 10 per PublishBatch call. Failed entries are re-queued."""
+        by_topic = {}
+        for pending in due:
+            by_topic.setdefault(pending["topic_arn"], []).append(pending)
+
+        for topic_arn, alerts in by_topic.items():
+            for i in range(0, len(alerts), SNS_PUBLISH_BATCH_MAX_ENTRIES):
+                chunk = alerts[i:i + SNS_PUBLISH_BATCH_MAX_ENTRIES]
+                entries = [self._build_entry(pending) for pending in chunk]
+                pending_by_id = {entry["Id"]: pending for entry, pending in zip(entries, chunk)}
+                self.rate_limiter.acquire()
+                try:
+                    response = self.sns_client.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=entries)
+                except Exception as e:
+                    print(f"Error publishing alert batch to SNS topic {topic_arn}: {e}")
+                    response = {"Successful": [], "Failed": [{"Id": entry["Id"]} for entry in entries]}
+                with self._lock:
+                    self.stats["batches"] += 1
+                    self.stats["published"] += len(response.get("Successful", []))
+                for failure in response.get("Failed", []):
+                    self._requeue(pending_by_id[failure["Id"]])
+
+    def _requeue(self, pending):
+        pending["attempts"] += 1
+        with self._lock:
+            if pending["attempts"] >= self.max_attempts:
+                self.stats["failed"] += 1
+                print(f"Giving up on alert after {pending['attempts']} attempts: {pending['subject']}")
+                return
+            # A unique key per retry: alerts with distinct coalesce keys can share a subject and attempt count
+            self._retry_seq += 1
+            pending["first_seen"] = self.clock() - self.coalesce_window_seconds # Due on the next pass
+            self._pending[("retry", self._retry_seq)] = pending
+
+    def flush(self):
+        """Publishes everything pending right now, regardless of coalescing windows (e.g. before a Lambda returns)."""
+        for _ in range(self.max_attempts):
+            due = self._take_due(force=True)
+            if not due:
+                break
+            self._publish(due)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.poll_interval_seconds)
+            self._wake.clear()
+            due = self._take_due()
+            if due:
+                self._publish(due)
+
+    def start(self):
+        """Starts the background publishing worker (idempotent)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name="sns-alert-dispatcher", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self, flush=True):
+        """Stops the worker, optionally publishing whatever is still queued."""
+        self._stopping.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        if flush:
+            self.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop(flush=True)
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Batched SNS Alert Dispatcher Simulation ---")
+    topic = "arn:aws:sns:us-east-1:123456789012:HvacIdeAlerts"
+    stand_in = LocalSnsTopicStandIn(fail_every=7)
+
+    with AlertDispatcher(sns_client=stand_in, coalesce_window_seconds=0.2, publish_rate_per_second=20) as dispatcher:
+        # Incident storm: 500 alerts over 25 distinct (resource, rule) pairs
+        for i in range(500):
+            resource = f"fn-{i % 25}"
+            dispatcher.submit(topic, f"CRITICAL: lambda_error_rate breached for '{resource}'",
+                              f"Error rate sample #{i} at {datetime.utcnow().isoformat()}", severity="CRITICAL")
+        time.sleep(0.5)
+
+    print(f"Dispatcher stats: {dispatcher.stats}")
+    print(f"PublishBatch calls: {len(stand_in.batches)}, messages recorded: {len(stand_in.messages)}")
+    print(f"Sample message:\n{stand_in.messages[0]['Message'][:160]}")
@@ -0,0 +1,273 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from optimization_sweep import HvacScheduleLp, _normalized_weights, _structure
+
+# Pluggable solver backends for the optimize_hvac_control_schedule LP.
+# The template always builds a PuLP model and calls prob.solve() with CBC's defaults: no time
+# limit, no gap, solver output on stdout. Here the same problem (a dict of the template's keyword
+# arguments) can be solved by one of three backends:
+#   - 'pulp_cbc':    the template's PuLP formulation, solved by CBC as a subprocess.
+#   - 'scipy_highs': the matrix form (HvacScheduleLp) laid out for this call and solved by HiGHS
+#                    through scipy.optimize.milp.
+#   - 'fast_path':   the same matrix form, but the layout is cached per horizon and only the
+#                    coefficients are overwritten (as in optimization_sweep).
+# 'auto' picks the backend for the problem's horizon from BACKEND_BY_HORIZON (calibrated with
+# `python solver_backends.py --calibrate`; SOLVER_BACKEND overrides it). Every backend applies
+# the time limit and relative MIP gap, and reports wall-clock timings per phase:
+#   build    - model construction (PuLP expressions, or matrix layout + coefficients),
+#   presolve - Python-side conversion into the solver's input (SciPy constraint/bound objects);
+#              None for CBC, which reads the model inside the solver call. The solvers' own presolve
+#              is not reported separately by either solver and is counted in `solve`,
+#   solve    - the solver call,
+#   extract  - reading the schedule, temperatures and totals back.
+# Timings are returned under result["timings"] and printed as one JSON line per solve, so they can
+# be filtered out of CloudWatch Logs and tracked for regressions.
+
+SOLVER_BACKENDS = ('pulp_cbc', 'scipy_highs', 'fast_path')
+DEFAULT_TIME_LIMIT_SECONDS = float(os.environ.get('SOLVER_TIME_LIMIT_SECONDS', '10'))
+DEFAULT_MIP_GAP = float(os.environ.get('SOLVER_MIP_GAP', '1e-4'))
+
+# (largest horizon in steps, backend), in increasing horizon order.
+# From `python solver_backends.py --calibrate`: the fast path is the fastest at every horizon
+# (CBC is 3-7x slower; the uncached SciPy layout costs a few tenths of a millisecond per solve).
+BACKEND_BY_HORIZON = ((np.inf, 'fast_path'),)
+
+# Regression ceilings (ms, median total) for the auto-selected backend per horizon.
+# Current values are about 3 / 5 / 20 ms.
+SOLVE_TIME_THRESHOLDS_MS = {24: 10, 96: 20, 672: 60}
+
+_STATUS_BY_MILP_CODE = {0: 'Optimal', 1: 'Not Solved', 2: 'Infeasible', 3: 'Unbounded', 4: 'Undefined'}
+
+
+def _problem_coefficients(problem):
+    """Splits a problem dict (optimize_hvac_control_schedule keyword arguments) into (horizon, coefficients)."""
+    coefficients = {key: value for key, value in problem.items()
+                    if key not in ('optimization_horizon_hours', 'target_comfort_temp')}
+    horizon = problem.get('optimization_horizon_hours') or len(problem['energy_prices'])
+    coefficients['energy_prices'] = np.asarray(problem['energy_prices'], dtype=float)[:horizon]
+    return horizon, coefficients
+
+
+def _timings(backend, horizon, build, presolve, solve, extract):
+    phases = {"build_ms": build, "presolve_ms": presolve, "solve_ms": solve, "extract_ms": extract}
+    phases = {name: None if seconds is None else round(seconds * 1000, 3) for name, seconds in phases.items()}
+    total = sum(seconds for seconds in (build, presolve, solve, extract) if seconds is not None)
+    return dict({"backend": backend, "horizon": horizon}, **phases, total_ms=round(total * 1000, 3))
+
+
+class PulpCbcBackend:
+    """The template's PuLP formulation solved by CBC."""
+
+    name = 'pulp_cbc'
+
+    def solve(self, problem, time_limit_seconds=DEFAULT_TIME_LIMIT_SECONDS, mip_gap=DEFAULT_MIP_GAP):
+        from pulp import PULP_CBC_CMD, LpMinimize, LpProblem, LpStatus, LpVariable, lpSum, value as pulp_value # Only this backend needs PuLP
+
+        start = time.perf_counter()
+        H, coefficients = _problem_coefficients(problem)
+        prices = coefficients['energy_prices']
+        cost_weight, comfort_deviation_weight = _normalized_weights(coefficients['cost_weight'],
+                                                                    coefficients['comfort_deviation_weight'])
+        k = coefficients['temp_change_per_kwh']
+        prob = LpProblem("HVAC_Energy_Cost_Comfort_Optimization", LpMinimize)
+        energy = [LpVariable(f"energy_kwh_hour_{t}", lowBound=0, upBound=coefficients['hvac_max_capacity_kw']) for t in range(H)]
+        temps = [LpVariable(f"temp_celsius_hour_{t}", cat='Continuous') for t in range(H)]
+        below = [LpVariable(f"temp_dev_below_min_h{t}", lowBound=0) for t in range(H)]
+        above = [LpVariable(f"temp_dev_above_max_h{t}", lowBound=0) for t in range(H)]
+        cost_expr = lpSum(float(prices[t]) * energy[t] for t in range(H))
+        deviation_expr = lpSum(below[t] + above[t] for t in range(H))
+        prob += cost_weight * cost_expr + comfort_deviation_weight * deviation_expr, "Weighted_Cost_And_Comfort_Objective"
+        for t in range(H):
+            prob += temps[t] == (temps[t - 1] if t else coefficients['initial_temp']) + energy[t] * k
+            prob += below[t] >= coefficients['comfort_min'] - temps[t]
+            prob += above[t] >= temps[t] - coefficients['comfort_max']
+        solver = PULP_CBC_CMD(msg=False, timeLimit=time_limit_seconds, gapRel=mip_gap)
+        built = time.perf_counter()
+
+        prob.solve(solver)
+        solved = time.perf_counter()
+
+        status = LpStatus[prob.status]
+        if status == 'Optimal':
+            result = {
+                "status": status,
+                "schedule_kwh": [pulp_value(e) for e in energy],
+                "temperatures_celsius": [pulp_value(temp) for temp in temps],
+                "total_cost": pulp_value(cost_expr),
+                "total_comfort_deviation": pulp_value(deviation_expr),
+                "objective": pulp_value(prob.objective),
+            }
+        else:
+            result = {"status": status, "schedule_kwh": None}
+        result["timings"] = _timings(self.name, H, built - start, None, solved - built, time.perf_counter() - solved)
+        return result
+
+
+class ScipyHighsBackend:
+    """The matrix form solved by HiGHS through SciPy; the layout is rebuilt on every call."""
+
+    name = 'scipy_highs'
+
+    def _structure(self, horizon):
+        return HvacScheduleLp(horizon)
+
+    def solve(self, problem, time_limit_seconds=DEFAULT_TIME_LIMIT_SECONDS, mip_gap=DEFAULT_MIP_GAP):
+        start = time.perf_counter()
+        H, coefficients = _problem_coefficients(problem)
+        structure = self._structure(H)
+        structure.set_coefficients(**coefficients)
+        built = time.perf_counter()
+
+        constraints = LinearConstraint(structure.A, structure.lower, structure.upper)
+        bounds = Bounds(structure.variable_lower, structure.variable_upper)
+        options = {"time_limit": time_limit_seconds, "mip_rel_gap": mip_gap}
+        presolved = time.perf_counter()
+
+        solution = milp(structure.c, constraints=constraints, bounds=bounds, options=options) # No integrality: solved as an LP
+        solved = time.perf_counter()
+
+        if solution.status == 0:
+            result = structure.extract(solution.x, solution.fun)
+            result.update(schedule_kwh=result["schedule_kwh"].tolist(),
+                          temperatures_celsius=result["temperatures_celsius"].tolist())
+        else:
+            result = {"status": _STATUS_BY_MILP_CODE.get(solution.status, 'Undefined'), "schedule_kwh": None}
+        result["timings"] = _timings(self.name, H, built - start, presolved - built, solved - presolved,
+                                     time.perf_counter() - solved)
+        return result
+
+
+class FastPathBackend(ScipyHighsBackend):
+    """The matrix form with the layout cached per horizon (per process); only coefficients change per call."""
+
+    name = 'fast_path'
+
+    def _structure(self, horizon):
+        return _structure(horizon)
+
+
+BACKENDS = {backend.name: backend for backend in (PulpCbcBackend(), ScipyHighsBackend(), FastPathBackend())}
+
+
+def select_backend(horizon, backend_by_horizon=BACKEND_BY_HORIZON):
+    """Backend name for a horizon: SOLVER_BACKEND if set, else the first table entry covering it."""
+    override = os.environ.get('SOLVER_BACKEND')
+    if override:
+        return override
+    for max_horizon, backend in backend_by_horizon:
+        if horizon <= max_horizon:
+            return backend
+    return backend_by_horizon[-1][1]
+
+
+def solve_hvac_schedule(problem, backend='auto', time_limit_seconds=DEFAULT_TIME_LIMIT_SECONDS,
+                        mip_gap=DEFAULT_MIP_GAP, log_timings=True):
+    """
+    Solves the optimize_hvac_control_schedule LP with the chosen backend.
+
+    :param problem: Keyword arguments of optimize_hvac_control_schedule.
+    :param backend: One of SOLVER_BACKENDS, or 'auto' to pick by horizon (select_backend).
+    :param time_limit_seconds: Solver time limit; a solve that hits it returns status 'Not Solved'.
+    :param mip_gap: Relative MIP gap (no effect on the pure LP, applies once integer variables are added).
+    :param log_timings: Print the timings as one JSON line.
+    :return: Dict with the keys optimize_hvac_control_schedule returns, plus "objective" and
+             "timings" (backend, horizon, build_ms, presolve_ms, solve_ms, extract_ms, total_ms).
+    """
+    if backend == 'auto':
+        backend = select_backend(_problem_coefficients(problem)[0])
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown solver backend '{backend}'. Expected one of {SOLVER_BACKENDS} or 'auto'.")
+    result = BACKENDS[backend].solve(problem, time_limit_seconds=time_limit_seconds, mip_gap=mip_gap)
+    if log_timings:
+        print(json.dumps(dict({"event": "solver_timing", "status": result["status"]}, **result["timings"])))
+    return result
+
+
+def benchmark_backends(horizons=(6, 24, 96, 672), repeats=11, backends=SOLVER_BACKENDS):
+    """
+    Median phase timings of every backend per horizon on a representative problem.
+    :return: List of timing dicts (as in result["timings"], medians over `repeats` solves).
+    """
+    rows = []
+    for horizon in horizons:
+        problem = _benchmark_problem(horizon)
+        for backend in backends:
+            BACKENDS[backend].solve(problem) # Warm-up (imports, fast path layout)
+            runs = [BACKENDS[backend].solve(problem)["timings"] for _ in range(repeats)]
+            row = {"backend": backend, "horizon": horizon}
+            for phase in ("build_ms", "presolve_ms", "solve_ms", "extract_ms", "total_ms"):
+                values = [run[phase] for run in runs if run[phase] is not None]
+                row[phase] = round(float(np.median(values)), 3) if values else None
+            rows.append(row)
+    return rows
+
+
+def calibrate_backends(horizons=(6, 24, 96, 672), repeats=11, tie_tolerance=0.1):
+    """
+    Fastest backend per benchmarked horizon, as a BACKEND_BY_HORIZON table (adjacent equal entries merged).
+    Backends within `tie_tolerance` of the fastest total count as tied (the HiGHS backends run the same
+    solve), and the tie goes to the one with the least build + presolve time.
+    """
+    rows = benchmark_backends(horizons, repeats)
+    table = []
+    for horizon in horizons:
+        candidates = [row for row in rows if row["horizon"] == horizon]
+        fastest_ms = min(row["total_ms"] for row in candidates)
+        tied = [row for row in candidates if row["total_ms"] <= fastest_ms * (1 + tie_tolerance)]
+        fastest = min(tied, key=lambda row: row["build_ms"] + (row["presolve_ms"] or 0.0))["backend"]
+        if table and table[-1][1] == fastest:
+            table.pop()
+        table.append((horizon, fastest))
+    table[-1] = (np.inf, table[-1][1])
+    return tuple(table), rows
+
+
+def _benchmark_problem(horizon):
+    """Template problem over `horizon` hourly steps with a daily price cycle, starting below the comfort band."""
+    t = np.arange(horizon)
+    return {
+        'energy_prices': (0.15 + 0.05 * np.sin(2 * np.pi * t / 24)).tolist(),
+        'comfort_min': 20.0,
+        'comfort_max': 24.0,
+        'initial_temp': 16.5,
+        'optimization_horizon_hours': horizon,
+        'hvac_max_capacity_kw': 5.0,
+        'temp_change_per_kwh': 0.8,
+        'cost_weight': 0.6,
+        'comfort_deviation_weight': 0.4,
+    }
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- HVAC Schedule Solver Backends ---")
+    demo_problem = dict(_benchmark_problem(6), energy_prices=[0.10, 0.12, 0.15, 0.20, 0.18, 0.11])
+    for name in SOLVER_BACKENDS:
+        demo_result = solve_hvac_schedule(demo_problem, backend=name)
+        print(f"  {name}: {demo_result['status']}, objective {demo_result['objective']:.4f}, "
+              f"cost ${demo_result['total_cost']:.2f}")
+
+    if "--calibrate" in sys.argv:
+        calibrated_table, _ = calibrate_backends()
+        print(f"BACKEND_BY_HORIZON = {calibrated_table}")
+
+    if "--benchmark" in sys.argv:
+        regressions = []
+        print(f"{'backend':>12} {'steps':>6} {'build':>8} {'presolve':>9} {'solve':>8} {'extract':>8} {'total':>8}  (median ms)")
+        for row in benchmark_backends(horizons=sorted(SOLVE_TIME_THRESHOLDS_MS)):
+            presolve = '-' if row['presolve_ms'] is None else f"{row['presolve_ms']:.2f}"
+            print(f"{row['backend']:>12} {row['horizon']:>6} {row['build_ms']:>8.2f} {presolve:>9} {row['solve_ms']:>8.2f} "
+                  f"{row['extract_ms']:>8.2f} {row['total_ms']:>8.2f}")
+            threshold_ms = SOLVE_TIME_THRESHOLDS_MS[row['horizon']]
+            if row['backend'] == select_backend(row['horizon']) and row['total_ms'] > threshold_ms:
+                regressions.append(f"{row['backend']} at {row['horizon']} steps: {row['total_ms']:.1f} ms (threshold {threshold_ms} ms)")
+        if regressions:
+            print("Solve-time regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No solve-time regressions.")
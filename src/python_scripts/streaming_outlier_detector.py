@@ -0,0 +1,330 @@
+import json
+import math
+import os
+import tempfile
+
+# This module provides an online, per-sensor outlier detector for the preprocessing Lambda.
+# The 3-sigma filter in s3_data_processor_template.preprocess_timeseries_data needs the whole
+# file's mean/std, so it cannot filter a stream or late-arriving data consistently, and a single
+# extreme value inflates the std it is judged against. Here each sensor keeps a small state
+# (location, scale, effective count) that is updated in O(1) per reading with an exponential
+# forgetting factor, and persisted between invocations, so every new file is judged against
+# the sensor's history rather than against itself.
+#
+# Two estimators are available:
+#   - 'robust' (default): an exponentially weighted Huber location (a streaming median
+#     approximation) with a clipped mean-absolute-deviation scale, seeded from the exact
+#     median/MAD of the first `min_history` readings. Extreme values move it by a bounded amount.
+#   - 'welford': exponentially weighted Welford mean/variance. Flagged readings are excluded
+#     from the update so they cannot skew it.
+
+# --- AWS Client Initialization (shared per container, see aws_clients.py) ---
+# from aws_clients import get_client # Needed by the commented-out get_client(...) calls below
+
+DEFAULT_FORGETTING_FACTOR = 0.995 # Effective memory of ~1 / (1 - 0.995) = 200 readings
+DEFAULT_THRESHOLD = 4.0           # Robust z-score above which a reading is an outlier
+DEFAULT_MIN_HISTORY = 10          # Readings collected before anything is flagged
+DEFAULT_MIN_SCALE = 0.05          # Scale floor (sensor units), so flat signals don't flag noise
+DEFAULT_MAX_CONSECUTIVE_OUTLIERS = 20 # After this many in a row, treat it as a level shift and re-seed
+HUBER_CLIP = 2.0                  # Residuals are clipped to +/- this many scales in the robust update
+ABS_DEV_TO_SIGMA = math.sqrt(math.pi / 2) # Mean absolute deviation -> std for normal data
+MAD_TO_SIGMA = 1.4826
+
+# Local stand-in for the state object in S3 (IDE simulation)
+OUTLIER_STATE_LOCAL_DIR = os.environ.get('OUTLIER_STATE_LOCAL_DIR', tempfile.gettempdir())
+
+
+class SensorOutlierState:
+    """Streaming statistics for one sensor. `warmup` holds readings until the state is seeded."""
+    __slots__ = ("location", "scale", "count", "last_timestamp", "consecutive_outliers", "warmup")
+
+    def __init__(self):
+        self.location = 0.0
+        self.scale = 0.0 # 'robust': mean absolute deviation; 'welford': variance
+        self.count = 0
+        self.last_timestamp = None
+        self.consecutive_outliers = 0
+        self.warmup = []
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        for slot in cls.__slots__:
+            if slot in data:
+                setattr(state, slot, data[slot])
+        return state
+
+
+class StreamingOutlierDetector:
+    """
+    Per-sensor online outlier detector with exponential forgetting.
+
+    :param method: 'robust' (Huber location / absolute-deviation scale) or 'welford' (mean/variance).
+    :param forgetting_factor: Weight kept by the history on each update (0 < f < 1).
+    :param threshold: Readings further than `threshold` scales from the location are outliers.
+    :param min_history: Readings per sensor used to seed the state; none of them are flagged.
+    :param min_scale: Floor on the scale (as a standard deviation, in sensor units).
+    :param max_consecutive_outliers: Consecutive flags after which the state is re-seeded (level shift).
+    """
+
+    def __init__(self, method='robust', forgetting_factor=DEFAULT_FORGETTING_FACTOR, threshold=DEFAULT_THRESHOLD,
+                 min_history=DEFAULT_MIN_HISTORY, min_scale=DEFAULT_MIN_SCALE,
+                 max_consecutive_outliers=DEFAULT_MAX_CONSECUTIVE_OUTLIERS):
+        if method not in ('robust', 'welford'):
+            raise ValueError(f"Unknown outlier detection method: {method}")
+        if not 0 < forgetting_factor < 1:
+            raise ValueError("forgetting_factor must be between 0 and 1.")
+        self.method = method
+        self.forgetting_factor = forgetting_factor
+        self.threshold = threshold
+        self.min_history = max(1, min_history)
+        self.min_scale = min_scale
+        self.max_consecutive_outliers = max_consecutive_outliers
+        self.sensors = {} # sensor_id -> SensorOutlierState
+
+    def _seed(self, state):
+        """Initializes location/scale from the warm-up readings (exact median/MAD or mean/variance)."""
+        values = sorted(state.warmup)
+        n = len(values)
+        if self.method == 'robust':
+            median = (values[(n - 1) // 2] + values[n // 2]) / 2
+            deviations = sorted(abs(v - median) for v in values)
+            mad = (deviations[(n - 1) // 2] + deviations[n // 2]) / 2
+            state.location = median
+            state.scale = mad * MAD_TO_SIGMA / ABS_DEV_TO_SIGMA # Stored as a mean absolute deviation
+        else:
+            mean = sum(values) / n
+            state.location = mean
+            state.scale = sum((v - mean) ** 2 for v in values) / n
+        state.count = n
+        state.consecutive_outliers = 0
+        state.warmup = []
+
+    def _process(self, state, timestamps, values, flags):
+        """Scores (and, for in-order readings, absorbs) one sensor's readings. Appends to `flags`."""
+        alpha = 1.0 - self.forgetting_factor
+        threshold, min_scale, robust = self.threshold, self.min_scale, self.method == 'robust'
+        for timestamp, value in zip(timestamps, values):
+            if value != value: # NaN readings are neither flagged nor absorbed
+                flags.append(False)
+                continue
+            late = state.last_timestamp is not None and timestamp < state.last_timestamp
+            if state.warmup or state.count == 0:
+                flags.append(False)
+                if not late:
+                    state.warmup.append(value)
+                    state.last_timestamp = timestamp
+                    if len(state.warmup) >= self.min_history:
+                        self._seed(state)
+                continue
+
+            if robust:
+                sigma = max(state.scale * ABS_DEV_TO_SIGMA, min_scale)
+            else:
+                sigma = max(math.sqrt(state.scale), min_scale)
+            residual = value - state.location
+            is_outlier = abs(residual) > threshold * sigma
+            flags.append(is_outlier)
+            if late:
+                continue # Late data is judged against the current state but does not rewrite history
+            state.last_timestamp = timestamp
+
+            if is_outlier:
+                state.consecutive_outliers += 1
+                if state.consecutive_outliers >= self.max_consecutive_outliers:
+                    # Sustained deviation: the signal moved, so start over from the latest readings
+                    state.warmup = [value]
+                    state.count = 0
+                    if self.min_history == 1:
+                        self._seed(state)
+                continue
+            state.consecutive_outliers = 0
+
+            # Early on, weight by 1/n so the state converges like a plain average
+            weight = max(alpha, 1.0 / (state.count + 1))
+            if robust:
+                limit = HUBER_CLIP * sigma
+                clipped = min(max(residual, -limit), limit)
+                state.location += weight * clipped
+                state.scale += weight * (min(abs(residual), limit) - state.scale)
+            else:
+                increment = weight * residual
+                state.location += increment
+                state.scale = (1.0 - weight) * (state.scale + residual * increment)
+            state.count += 1
+        return flags
+
+    def score(self, sensor_id, timestamp, value):
+        """Scores and absorbs a single reading. Returns True if it is an outlier."""
+        state = self.sensors.get(sensor_id)
+        if state is None:
+            state = self.sensors[sensor_id] = SensorOutlierState()
+        return self._process(state, (timestamp,), (value,), [])[0]
+
+    def outlier_mask(self, sensor_ids, timestamps, values):
+        """
+        Scores a batch of readings in order (per sensor). O(1) per reading.
+
+        :param sensor_ids: Sequence of sensor ids (or None for a single-sensor batch).
+        :param timestamps: Sequence of epoch milliseconds, ascending per sensor for in-order data.
+        :param values: Sequence of floats.
+        :return: List of booleans, True where the reading is an outlier.
+        """
+        values = list(values)
+        timestamps = list(timestamps)
+        if sensor_ids is None:
+            sensor_ids = [None] * len(values)
+        positions = {}
+        for position, sensor_id in enumerate(sensor_ids):
+            positions.setdefault(sensor_id, []).append(position)
+
+        mask = [False] * len(values)
+        for sensor_id, sensor_positions in positions.items():
+            state = self.sensors.get(sensor_id)
+            if state is None:
+                state = self.sensors[sensor_id] = SensorOutlierState()
+            flags = self._process(state, [timestamps[p] for p in sensor_positions],
+                                  [values[p] for p in sensor_positions], [])
+            for position, flag in zip(sensor_positions, flags):
+                mask[position] = flag
+        return mask
+
+    def filter_dataframe(self, df, value_column='value_interpolated', sensor_column='sensor_id', timestamp_column=None):
+        """
+        Drops outlier rows from a DataFrame, updating the per-sensor state.
+
+        :param timestamp_column: Column with the reading times; defaults to the (DatetimeIndex) index.
+        :return: The DataFrame without outlier rows.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if df.empty:
+            return df
+        times = df.index if timestamp_column is None else df[timestamp_column]
+        timestamps = (pd.DatetimeIndex(times).asi8 // 1_000_000).tolist() # epoch ms
+        sensor_ids = df[sensor_column].tolist() if sensor_column in df.columns else None
+        mask = np.asarray(self.outlier_mask(sensor_ids, timestamps, df[value_column].to_numpy(dtype=float).tolist()))
+        if mask.any():
+            print(f"Streaming outlier filter removed {int(mask.sum())} of {len(df)} rows.")
+        return df[~mask]
+
+    def to_dict(self):
+        return {
+            "method": self.method,
+            "forgetting_factor": self.forgetting_factor,
+            "threshold": self.threshold,
+            "min_history": self.min_history,
+            "min_scale": self.min_scale,
+            "max_consecutive_outliers": self.max_consecutive_outliers,
+            # [id, state] pairs rather than an object, so int and None ids survive the JSON round trip
+            "sensors": [[sensor_id, state.to_dict()] for sensor_id, state in self.sensors.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        detector = cls(method=data.get("method", 'robust'),
+                       forgetting_factor=data.get("forgetting_factor", DEFAULT_FORGETTING_FACTOR),
+                       threshold=data.get("threshold", DEFAULT_THRESHOLD),
+                       min_history=data.get("min_history", DEFAULT_MIN_HISTORY),
+                       min_scale=data.get("min_scale", DEFAULT_MIN_SCALE),
+                       max_consecutive_outliers=data.get("max_consecutive_outliers", DEFAULT_MAX_CONSECUTIVE_OUTLIERS))
+        sensors = data.get("sensors", [])
+        if isinstance(sensors, dict): # Older state files keyed by str(sensor_id)
+            sensors = sensors.items()
+        detector.sensors = {sensor_id: SensorOutlierState.from_dict(state) for sensor_id, state in sensors}
+        return detector
+
+
+def _local_state_path(bucket, key):
+    return os.path.join(OUTLIER_STATE_LOCAL_DIR, f"{bucket}__{key.replace('/', '__')}")
+
+
+def load_outlier_detector(bucket, key, **detector_kwargs):
+    """
+    Loads the persisted detector state from S3 (a new detector if none exists yet).
+    `detector_kwargs` configure a new detector; a persisted detector keeps its own settings.
+    """
+    # try:
+    #     obj = get_client('s3').get_object(Bucket=bucket, Key=key)
+    #     return StreamingOutlierDetector.from_dict(json.loads(obj['Body'].read()))
+    # except get_client('s3').exceptions.NoSuchKey:
+    #     return StreamingOutlierDetector(**detector_kwargs)
+
+    # Local stand-in for IDE simulation: state is kept in a JSON file
+    path = _local_state_path(bucket, key)
+    if not os.path.exists(path):
+        print(f"No outlier state at s3://{bucket}/{key}; starting fresh.")
+        return StreamingOutlierDetector(**detector_kwargs)
+    with open(path) as f:
+        detector = StreamingOutlierDetector.from_dict(json.load(f))
+    print(f"Loaded outlier state for {len(detector.sensors)} sensors from s3://{bucket}/{key}")
+    return detector
+
+
+def save_outlier_detector(detector, bucket, key):
+    """Persists the detector state to S3 so the next invocation continues from it."""
+    body = json.dumps(detector.to_dict())
+    # get_client('s3').put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+    path = _local_state_path(bucket, key)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    print(f"Saved outlier state for {len(detector.sensors)} sensors to s3://{bucket}/{key} ({len(body)} bytes)")
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    import random
+    import time
+
+    print("--- Streaming Outlier Detection Simulation ---")
+    rng = random.Random(42)
+    n_readings = 2000
+    base_ms = 1672531200000
+    readings = []
+    for i in range(n_readings):
+        value = 22.0 + 1.5 * math.sin(i / 120) + rng.gauss(0, 0.2)
+        if i % 400 == 137:
+            value += 150.0 # Stuck/garbage reading
+        elif i % 100 == 61:
+            value += rng.choice([-1, 1]) * rng.uniform(4, 8) # Moderate spikes
+        readings.append((base_ms + i * 60000, value))
+    injected = {i for i in range(n_readings) if i % 400 == 137 or i % 100 == 61}
+
+    for method in ('robust', 'welford'):
+        detector = StreamingOutlierDetector(method=method)
+        # Split the stream into "files" processed by successive invocations, persisting state in between
+        flagged = set()
+        for file_index, start in enumerate(range(0, n_readings, 400)):
+            if file_index:
+                detector = StreamingOutlierDetector.from_dict(json.loads(json.dumps(detector.to_dict())))
+            chunk = readings[start:start + 400]
+            mask = detector.outlier_mask(None, [t for t, _ in chunk], [v for _, v in chunk])
+            flagged.update(start + i for i, is_outlier in enumerate(mask) if is_outlier)
+        print(f"{method}: flagged {len(flagged)}, caught {len(flagged & injected)}/{len(injected)} spikes, "
+              f"false positives {len(flagged - injected)}")
+
+    # Per-file 3-sigma for comparison: a single large spike inflates the file's std
+    caught = 0
+    for start in range(0, n_readings, 400):
+        values = [v for _, v in readings[start:start + 400]]
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+        caught += sum(1 for i, v in enumerate(values) if abs(v - mean) > 3 * std and start + i in injected)
+    print(f"per-file 3-sigma: caught {caught}/{len(injected)} spikes")
+
+    # Throughput: 100 sensors x 10,000 readings
+    detector = StreamingOutlierDetector()
+    sensor_ids = [f"temp_{i % 100:03d}" for i in range(1_000_000)]
+    timestamps = [base_ms + (i // 100) * 60000 for i in range(1_000_000)]
+    values = [22.0 + rng.gauss(0, 0.3) for _ in range(1_000_000)]
+    start = time.perf_counter()
+    detector.outlier_mask(sensor_ids, timestamps, values)
+    elapsed = time.perf_counter() - start
+    print(f"1,000,000 readings across 100 sensors in {elapsed:.2f}s ({1_000_000 / elapsed:,.0f} readings/sec)")
+    print(f"Persisted state size: {len(json.dumps(detector.to_dict()))} bytes")
@@ -0,0 +1,275 @@
+import sys
+import time
+
+import numpy as np
+from scipy.linalg import expm
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix
+
+from optimization_sweep import HvacScheduleLp, _normalized_weights
+
+# Linear RC thermal models for the HVAC schedule optimizer.
+# optimize_hvac_control_schedule moves the indoor temperature by `temp_change_per_kwh` per kWh and
+# nothing else: no outdoor temperature, no losses, no difference between heating and cooling.
+# ThermalModel is a 1R1C (air) or 2R2C (air + building envelope) resistance-capacitance network.
+# Its continuous dynamics are discretized exactly for the step length (zero-order hold, one matrix
+# exponential), so the step-to-step transition is x_t = A x_{t-1} + b * Q_t + e * T_out_t with
+# constant A, b and e. The schedule LP stays linear: separate heating and cooling electric energy
+# variables, converted to heat by a per-step COP, plus soft comfort bounds on the air temperature.
+# ThermalScheduleLp lays out the sparsity pattern once per (model, horizon); each solve fills the
+# coefficient and bound arrays with whole-horizon NumPy expressions and calls HiGHS.
+
+DEFAULT_DT_HOURS = 1.0
+
+
+class ThermalModel:
+    """
+    RC network of one zone. Resistances in °C/kW, capacitances in kWh/°C.
+
+    1R1C: `r_kw` between air and outdoor, `c_kwh` the zone's capacitance.
+    2R2C: air (`c_air_kwh`) coupled to the envelope (`c_env_kwh`) through `r_air_env`, the envelope to
+          outdoor through `r_env_out`, and optionally air to outdoor (infiltration) through `r_air_out`.
+    HVAC heat and internal gains enter the air node.
+    """
+
+    def __init__(self, kind='1R1C', dt_hours=DEFAULT_DT_HOURS, r_kw=2.0, c_kwh=3.0, c_air_kwh=0.5, c_env_kwh=8.0,
+                 r_air_env=0.5, r_env_out=2.5, r_air_out=None):
+        if kind not in ('1R1C', '2R2C'):
+            raise ValueError(f"Unknown thermal model: {kind}")
+        self.kind = kind
+        self.dt_hours = dt_hours
+        if kind == '1R1C':
+            a_c = np.array([[-1.0 / (r_kw * c_kwh)]])
+            b_c = np.array([1.0 / c_kwh])
+            e_c = np.array([1.0 / (r_kw * c_kwh)])
+        else:
+            infiltration = 0.0 if r_air_out is None else 1.0 / r_air_out
+            a_c = np.array([
+                [-(1.0 / r_air_env + infiltration) / c_air_kwh, 1.0 / (r_air_env * c_air_kwh)],
+                [1.0 / (r_air_env * c_env_kwh), -(1.0 / r_air_env + 1.0 / r_env_out) / c_env_kwh],
+            ])
+            b_c = np.array([1.0 / c_air_kwh, 0.0])
+            e_c = np.array([infiltration / c_air_kwh, 1.0 / (r_env_out * c_env_kwh)])
+        # Zero-order hold: expm([[A, B, E], [0, 0, 0]] * dt) holds A_d, b_d and e_d in its top rows
+        n = len(b_c)
+        augmented = np.zeros((n + 2, n + 2))
+        augmented[:n, :n], augmented[:n, n], augmented[:n, n + 1] = a_c, b_c, e_c
+        discrete = expm(augmented * dt_hours)
+        self.A = discrete[:n, :n]
+        self.b = discrete[:n, n] # °C per kW of heat held over the step
+        self.e = discrete[:n, n + 1] # Weight of the outdoor temperature
+        self.n_states = n
+
+    def simulate(self, initial_state, outdoor_temps, heat_kw, gains_kw=0.0):
+        """Forward simulation: returns the states after each step (horizon x n_states)."""
+        outdoor_temps = np.asarray(outdoor_temps, dtype=float)
+        heat_kw = np.broadcast_to(np.asarray(heat_kw, dtype=float) + gains_kw, outdoor_temps.shape)
+        state = np.broadcast_to(np.asarray(initial_state, dtype=float), (self.n_states,)).copy()
+        states = np.empty((len(outdoor_temps), self.n_states))
+        for t in range(len(outdoor_temps)):
+            state = self.A @ state + self.b * heat_kw[t] + self.e * outdoor_temps[t]
+            states[t] = state
+        return states
+
+
+class ThermalScheduleLp:
+    """
+    Schedule LP over `horizon` steps of `model`.
+    Variables: [heat_kwh(H), cool_kwh(H), node 0 temps(H), ..., node n-1 temps(H), below(H), above(H)],
+    where heat_kwh / cool_kwh are electric energy per step.
+    """
+
+    def __init__(self, model, horizon):
+        self.model, self.horizon = model, horizon
+        H, n_states = horizon, model.n_states
+        self.heat, self.cool = slice(0, H), slice(H, 2 * H)
+        self.state_offset = 2 * H
+        self.below = slice((2 + n_states) * H, (3 + n_states) * H)
+        self.above = slice((3 + n_states) * H, (4 + n_states) * H)
+        self.n_vars = (4 + n_states) * H
+        t = np.arange(H)
+        air = self.state_offset + t
+
+        # Transition rows (node i, step t): x_i,t - sum_j A_ij x_j,t-1 - b_i q_heat,t heat_t + b_i q_cool,t cool_t = rhs
+        rows, cols, self._parts = [], [], []
+        for i in range(n_states):
+            row = i * H + t
+            rows += [row, row, row]
+            cols += [t, H + t, self.state_offset + i * H + t]
+            self._parts += [('heat', i), ('cool', i), ('self', i)]
+            for j in range(n_states):
+                rows.append(row[1:])
+                cols.append(self.state_offset + j * H + t[1:] - 1)
+                self._parts.append(('prev', i, j))
+        # Comfort rows: air_t + below_t >= comfort_min ; air_t - above_t <= comfort_max
+        comfort_low, comfort_high = n_states * H + t, (n_states + 1) * H + t
+        rows += [comfort_low, comfort_low, comfort_high, comfort_high]
+        cols += [air, self.below.start + t, air, self.above.start + t]
+        self._parts += [('one',), ('one',), ('one',), ('minus_one',)]
+        self._rows, self._cols = np.concatenate(rows), np.concatenate(cols)
+        self.n_rows = (n_states + 2) * H
+
+    def _data(self, heat_per_kwh, cool_per_kwh):
+        A, b, H = self.model.A, self.model.b, self.horizon
+        pieces = []
+        for part in self._parts:
+            if part[0] == 'heat':
+                pieces.append(-b[part[1]] * heat_per_kwh)
+            elif part[0] == 'cool':
+                pieces.append(b[part[1]] * cool_per_kwh)
+            elif part[0] == 'self' or part[0] == 'one':
+                pieces.append(np.ones(H))
+            elif part[0] == 'prev':
+                pieces.append(np.full(H - 1, -A[part[1], part[2]]))
+            else:
+                pieces.append(-np.ones(H))
+        return np.concatenate(pieces)
+
+    def build(self, energy_prices, outdoor_temps, comfort_min, comfort_max, initial_state, heating_capacity_kw,
+              cooling_capacity_kw, cop_heating=3.0, cop_cooling=3.5, internal_gains_kw=0.0, cost_weight=0.5,
+              comfort_deviation_weight=0.5, coupling_prices=None):
+        """
+        Fills the LP arrays for one solve (arguments as in `solve`).
+        :param coupling_prices: Optional per-step objective terms per kWh of electric energy that are not
+                                energy cost (e.g. multipliers of a building-wide constraint).
+        :return: Dict with c, matrix, lower, upper, variable_lower, variable_upper and prices.
+        """
+        model, H = self.model, self.horizon
+        prices = np.asarray(energy_prices, dtype=float)[:H]
+        outdoor = np.asarray(outdoor_temps, dtype=float)[:H]
+        step = np.ones(H)
+        cost_weight, comfort_deviation_weight = _normalized_weights(cost_weight, comfort_deviation_weight)
+
+        # Electric kWh per step -> average heat in kW over the step
+        heat_per_kwh = np.asarray(cop_heating, dtype=float) * step / model.dt_hours
+        cool_per_kwh = np.asarray(cop_cooling, dtype=float) * step / model.dt_hours
+        gains = np.asarray(internal_gains_kw, dtype=float) * step
+        matrix = coo_matrix((self._data(heat_per_kwh, cool_per_kwh), (self._rows, self._cols)),
+                            shape=(self.n_rows, self.n_vars)).tocsr()
+
+        # Transition right-hand sides: e_i * T_out,t + b_i * gains_t (+ A x_initial at t = 0)
+        initial = np.broadcast_to(np.asarray(initial_state, dtype=float), (model.n_states,))
+        rhs = model.e[:, None] * outdoor[None, :] + model.b[:, None] * gains[None, :]
+        rhs[:, 0] += model.A @ initial
+        lower = np.concatenate((rhs.ravel(), np.asarray(comfort_min, dtype=float) * step, np.full(H, -np.inf)))
+        upper = np.concatenate((rhs.ravel(), np.full(H, np.inf), np.asarray(comfort_max, dtype=float) * step))
+
+        c = np.zeros(self.n_vars)
+        c[self.heat] = c[self.cool] = cost_weight * prices
+        if coupling_prices is not None:
+            c[self.heat] += coupling_prices
+            c[self.cool] += coupling_prices
+        c[self.below] = c[self.above] = comfort_deviation_weight
+        variable_lower = np.zeros(self.n_vars)
+        variable_upper = np.full(self.n_vars, np.inf)
+        variable_upper[self.heat] = heating_capacity_kw * model.dt_hours
+        variable_upper[self.cool] = cooling_capacity_kw * model.dt_hours
+        variable_lower[self.state_offset:self.below.start] = -np.inf
+        return {"c": c, "matrix": matrix, "lower": lower, "upper": upper, "variable_lower": variable_lower,
+                "variable_upper": variable_upper, "prices": prices}
+
+    def extract(self, x, prices, objective=None):
+        """Result dict from a solution vector."""
+        heating, cooling = x[self.heat], x[self.cool]
+        return {
+            "status": "Optimal",
+            "heating_kwh": heating,
+            "cooling_kwh": cooling,
+            "schedule_kwh": heating + cooling,
+            "temperatures_celsius": x[self.state_offset:self.state_offset + self.horizon],
+            "total_cost": float(prices @ (heating + cooling)),
+            "total_comfort_deviation": float(x[self.below].sum() + x[self.above].sum()),
+            "objective": objective,
+        }
+
+    def solve(self, energy_prices, outdoor_temps, comfort_min, comfort_max, initial_state, heating_capacity_kw,
+              cooling_capacity_kw, cop_heating=3.0, cop_cooling=3.5, internal_gains_kw=0.0, cost_weight=0.5,
+              comfort_deviation_weight=0.5, coupling_prices=None):
+        """
+        :param energy_prices, outdoor_temps: Per-step arrays ($/kWh, °C).
+        :param comfort_min, comfort_max: Scalars or per-step arrays (e.g. night setbacks).
+        :param initial_state: Air temperature, or [air, envelope] for 2R2C (a scalar sets both).
+        :param cop_heating, cop_cooling: Scalars or per-step arrays (e.g. cooling COP falling with outdoor temperature).
+        :return: Result dict like optimize_hvac_control_schedule's, with heating_kwh / cooling_kwh and
+                 schedule_kwh = their sum.
+        """
+        problem = self.build(energy_prices, outdoor_temps, comfort_min, comfort_max, initial_state, heating_capacity_kw,
+                             cooling_capacity_kw, cop_heating, cop_cooling, internal_gains_kw, cost_weight,
+                             comfort_deviation_weight, coupling_prices)
+        result = milp(problem["c"], constraints=LinearConstraint(problem["matrix"], problem["lower"], problem["upper"]),
+                      bounds=Bounds(problem["variable_lower"], problem["variable_upper"]))
+        if result.status != 0:
+            return {"status": result.message, "schedule_kwh": None}
+        return self.extract(result.x, problem["prices"], float(result.fun))
+
+
+_structures = {} # (model id, horizon) -> ThermalScheduleLp
+
+
+def optimize_hvac_schedule_thermal(model, energy_prices, outdoor_temps, comfort_min, comfort_max, initial_state,
+                                   heating_capacity_kw, cooling_capacity_kw, **kwargs):
+    """
+    optimize_hvac_control_schedule with a ThermalModel; the LP structure is reused across calls
+    with the same model and horizon (e.g. in a warm Lambda container). See ThermalScheduleLp.solve.
+    """
+    key = (id(model), len(energy_prices))
+    structure = _structures.get(key)
+    if structure is None or structure.model is not model:
+        structure = _structures[key] = ThermalScheduleLp(model, len(energy_prices))
+    return structure.solve(energy_prices, outdoor_temps, comfort_min, comfort_max, initial_state,
+                           heating_capacity_kw, cooling_capacity_kw, **kwargs)
+
+
+def _benchmark_inputs(horizon, dt_hours):
+    """Daily price and outdoor temperature cycles, comfort band with a night setback."""
+    hours = np.arange(horizon) * dt_hours % 24
+    prices = 0.12 + 0.08 * np.exp(-((hours - 18) / 3.0) ** 2)
+    outdoor = 19.0 + 11.0 * np.sin((hours - 9) / 24 * 2 * np.pi)
+    occupied = (hours >= 7) & (hours < 19)
+    comfort_min = np.where(occupied, 20.0, 16.0)
+    comfort_max = np.where(occupied, 24.0, 28.0)
+    cop_cooling = np.clip(4.5 - 0.08 * (outdoor - 20.0), 2.0, 6.0)
+    return prices, outdoor, comfort_min, comfort_max, cop_cooling
+
+
+# --- For local testing or IDE simulation ---
+if __name__ == "__main__":
+    print("--- Thermal Model Optimization ---")
+    dt_hours = 0.25
+    models = {kind: ThermalModel(kind, dt_hours=dt_hours) for kind in ('1R1C', '2R2C')}
+    prices, outdoor, comfort_min, comfort_max, cop_cooling = _benchmark_inputs(96, dt_hours)
+    for kind, model in models.items():
+        result = optimize_hvac_schedule_thermal(model, prices, outdoor, comfort_min, comfort_max, 18.0, 6.0, 6.0,
+                                                cop_cooling=cop_cooling, internal_gains_kw=0.5, cost_weight=0.3,
+                                                comfort_deviation_weight=0.7)
+        heat_kw = (3.0 * result["heating_kwh"] - cop_cooling * result["cooling_kwh"]) / dt_hours
+        simulated = model.simulate(18.0, outdoor, heat_kw, gains_kw=0.5)[:, 0]
+        print(f"{kind}: cost ${result['total_cost']:.2f}, heating {result['heating_kwh'].sum():.1f} kWh, "
+              f"cooling {result['cooling_kwh'].sum():.1f} kWh, comfort deviation {result['total_comfort_deviation']:.2f}, "
+              f"max |LP - simulation| {np.abs(simulated - result['temperatures_celsius']).max():.1e} °C")
+
+    if "--benchmark" in sys.argv:
+        import contextlib
+        import io
+        from optimization_control_template import optimize_hvac_control_schedule
+
+        def timed(solve, repeats):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                solve()
+            return (time.perf_counter() - start) / repeats * 1000
+
+        print(f"{'horizon':>8} {'current (PuLP)':>15} {'current (HiGHS)':>16} {'1R1C':>8} {'2R2C':>8}   (ms per solve)")
+        for horizon in (24, 96, 672):
+            prices, outdoor, comfort_min, comfort_max, cop_cooling = _benchmark_inputs(horizon, dt_hours)
+            repeats = 3 if horizon == 672 else 10
+            with contextlib.redirect_stdout(io.StringIO()):
+                pulp_ms = timed(lambda: optimize_hvac_control_schedule(prices.tolist(), 20.0, 24.0, 18.0, horizon, 6.0, 0.5, 0.3, 0.7), repeats)
+            current = HvacScheduleLp(horizon)
+            current_ms = timed(lambda: current.solve(energy_prices=prices, comfort_min=20.0, comfort_max=24.0, initial_temp=18.0,
+                                                     hvac_max_capacity_kw=6.0, temp_change_per_kwh=0.5, cost_weight=0.3,
+                                                     comfort_deviation_weight=0.7), repeats)
+            thermal_ms = {kind: timed(lambda: optimize_hvac_schedule_thermal(
+                model, prices, outdoor, comfort_min, comfort_max, 18.0, 6.0, 6.0, cop_cooling=cop_cooling,
+                internal_gains_kw=0.5, cost_weight=0.3, comfort_deviation_weight=0.7), repeats) for kind, model in models.items()}
+            print(f"{horizon:>8} {pulp_ms:>15.1f} {current_ms:>16.1f} {thermal_ms['1R1C']:>8.1f} {thermal_ms['2R2C']:>8.1f}")